@@ -1,25 +1,85 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory, g, abort
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
-import json
 import sys
+import atexit
+
+from utils.models import Record
+
+# 让 jsonify 可以直接序列化数据仓库中的紧凑记录
+class RecordJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 # 初始化Flask应用
 app = Flask(__name__, static_folder=None)  # 不使用默认的static_folder
+app.json = RecordJSONProvider(app)
 CORS(app)  # 启用CORS，允许前端调用API
 
 # 导入路由模块
 from routes.dishes import dishes_bp
 from routes.orders import orders_bp
 from routes.reviews import reviews_bp
+from routes.exports import exports_bp
+from routes.uploads import uploads_bp
+from routes.debug import debug_bp
+from routes.sync import sync_bp
 
 # 导入工具函数
 from create_default_images import create_default_images
+from utils.response_cache import cached_response, response_cache
+from utils.image_cache import image_cache, serve_image
+from utils.image_pool import image_pool
+from utils.qr_code import qr_cache
+from utils.jobs import job_queue
+from utils.profiling import install_profiling
+from utils.rate_limit import install_rate_limits, rate_limiter
+from utils.data_store import get_store, tenant_registry, tenant_exists, valid_tenant_id, save_all_states, start_state_saver
 
 # 注册蓝图
-app.register_blueprint(dishes_bp, url_prefix='/api/dishes')
-app.register_blueprint(orders_bp, url_prefix='/api/orders')
-app.register_blueprint(reviews_bp, url_prefix='/api/reviews')
+# /api/dishes 等路径使用默认家庭的数据；
+# /api/households/<tenant_id>/dishes 等路径使用对应家庭独立的数据目录
+blueprints = (
+    (dishes_bp, '/dishes'),
+    (orders_bp, '/orders'),
+    (reviews_bp, '/reviews'),
+    (exports_bp, ''),  # /api/export/<集合> 和 /api/import/<集合>
+    (uploads_bp, '/uploads'),
+    (sync_bp, '/sync')  # 增量同步
+)
+for blueprint, path in blueprints:
+    app.register_blueprint(blueprint, url_prefix=f'/api{path}')
+    app.register_blueprint(blueprint, url_prefix=f'/api/households/<tenant_id>{path}',
+                           name=f'household_{blueprint.name}')
+
+# 性能分析接口（需要 DEBUG_TOKEN，不区分家庭）和按需开启的请求钩子
+app.register_blueprint(debug_bp, url_prefix='/api/debug')
+install_profiling(app)
+
+# 按客户端和请求类别（读、写、图片上传）限流，超出时返回429
+install_rate_limits(app)
+
+# 确保本进程的后台任务线程和定期写入启动快照的线程已启动（重启后继续执行未完成的任务）
+@app.before_request
+def start_job_workers():
+    job_queue.start()
+    start_state_saver()
+
+# 从URL中取出家庭ID，供 get_store() 使用
+@app.url_value_preprocessor
+def pull_tenant_id(endpoint, values):
+    if values and 'tenant_id' in values:
+        tenant_id = values.pop('tenant_id')
+        if not valid_tenant_id(tenant_id):
+            abort(404)
+        # 读请求不为不存在的家庭创建数据目录（家庭在第一次写入时创建）
+        if request.method in ('GET', 'HEAD') and not tenant_exists(tenant_id):
+            abort(404)
+        g.tenant_id = tenant_id
 
 # 获取项目根目录
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -57,13 +117,46 @@ def serve_static(path):
     static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
     return send_from_directory(static_dir, path)
 
+# 提供菜品和评价图片（带缓存头、Range支持和内存缓存）
+@app.route('/static/images/<path:path>')
+def serve_images(path):
+    images_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images')
+    return serve_image(images_dir, path)
+
 # 健康检查路由
 @app.route('/api/health')
 def health_check():
-    return jsonify({"status": "healthy"})
+    return jsonify({
+        "status": "healthy",
+        "response_cache": response_cache.stats(),
+        "image_cache": image_cache.stats(),
+        "image_pool": image_pool.stats(),
+        "qr_cache": qr_cache.stats(),
+        "jobs": job_queue.stats(failures=0)["counts"],
+        "tenants": tenant_registry.stats(),
+        "rate_limit": rate_limiter.stats()
+    })
+
+# 后台任务状态：各状态数量、重试中的任务和最近的失败
+@app.route('/api/jobs')
+def jobs_status():
+    try:
+        return jsonify(job_queue.stats())
+    except Exception as e:
+        print(f"获取任务状态错误: {str(e)}")
+        return jsonify({"error": f"获取任务状态错误: {str(e)}"}), 500
+
+# 查询单个后台任务
+@app.route('/api/jobs/<path:job_id>')
+def job_detail(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务未找到"}), 404
+    return jsonify(job)
 
 # 获取菜品分类
 @app.route('/api/categories')
+@cached_response()
 def get_categories():
     categories = [
         { "id": "hot", "name": "热菜" },
@@ -86,34 +179,19 @@ def initialize_app():
     # 创建默认图片
     create_default_images()
     
-    # 初始化JSON数据文件
-    data_files = {
-        'dishes.json': [],
-        'orders.json': [],
-        'reviews.json': []
-    }
-    
-    for filename, default_data in data_files.items():
-        file_path = os.path.join(static_dir, 'data', filename)
-        if not os.path.exists(file_path):
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False)
-            print(f"已创建数据文件: {filename}")
-        else:
-            # 验证JSON文件内容
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    json.load(f)
-                print(f"已验证数据文件: {filename}")
-            except json.JSONDecodeError:
-                print(f"警告: {filename} 包含无效的JSON格式，正在重置...")
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(default_data, f, ensure_ascii=False)
+    # 从启动快照恢复与JSON文件一致的集合，其余集合预加载时解析（文件不存在或损坏时重置为空集合）
+    store = get_store()
+    for name in store.load_state():
+        print(f"已从启动快照恢复: {name}.json")
+    store.preload()
 
 if __name__ == '__main__':
     print("初始化应用...")
     initialize_app()
     
+    # 退出时写入启动快照，下次启动直接载入
+    atexit.register(save_all_states)
+    
     print("启动应用服务器...")
     # 设置调试模式以显示详细错误
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
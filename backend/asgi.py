@@ -0,0 +1,502 @@
+"""
+ASGI 启动入口（适合大量空闲连接、轮询客户端和慢速上传）
+
+    python asgi.py --port 5000
+
+也可以使用任意 ASGI 服务器：
+
+    uvicorn asgi:application --port 5000
+
+与 server.py 的区别：
+1. 连接由事件循环管理，空闲的长连接和正在上传的请求不占用线程，一个进程可以保持数千个连接；
+2. 请求体在事件循环中读取完毕后才交给线程池，慢速上传不会占住工作线程；
+3. 接口本身仍是同步代码，全部在线程池（ASGI_THREADS）中执行：菜品、订单和评价的部分读接口
+   （routes/async_routes.py）直接调用与 Flask 蓝图共用的实现，其他接口（菜单列表、写入、图片、导入导出等）
+   经由 WSGI 转换交给 Flask 应用；与 server.py 共用同一个数据仓库、缓存和后台任务队列。
+
+本地服务器只使用标准库（asyncio），支持 HTTP/1.1 长连接、分块传输和 Expect: 100-continue，
+没有实现 HTTP/2 和 WebSocket；生产环境需要这些功能时可改用 uvicorn 等服务器。
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from app import app, initialize_app
+from routes.async_routes import call_view, match_route, run_blocking
+from utils.data_store import save_all_states, start_state_saver
+from utils.jobs import job_queue
+
+# 请求体大小上限（字节）
+ASGI_MAX_BODY = int(os.environ.get('ASGI_MAX_BODY', 32 * 1024 * 1024))
+
+# 长连接空闲多久后关闭（秒），同时也是读取请求时两次收到数据之间的最长间隔
+ASGI_KEEPALIVE = float(os.environ.get('ASGI_KEEPALIVE', 75))
+
+# 请求行和请求头的大小上限（字节）
+MAX_HEADER_BYTES = 64 * 1024
+
+# 每次从连接读取的请求体大小，以及 Flask 响应在线程池中一次收集的最大字节数
+READ_CHUNK = 64 * 1024
+
+DEFAULT_HOST = os.environ.get('WEB_HOST', '0.0.0.0')
+DEFAULT_PORT = int(os.environ.get('WEB_PORT', 5000))
+
+
+class RequestTooLarge(Exception):
+    """请求体超过 ASGI_MAX_BODY"""
+
+
+class ClientDisconnected(Exception):
+    """读取请求体时客户端断开"""
+
+
+# 初始化数据文件、预加载集合并启动后台任务线程和定期写入启动快照的线程
+def prepare_app():
+    initialize_app()
+    job_queue.start()
+    start_state_saver()
+
+
+# 由 ASGI 请求构造 WSGI environ
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name in ('content-length', 'transfer-encoding'):  # 请求体已完整读取
+            continue
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+# 在线程池中调用 WSGI 应用，返回 (状态码, 响应头, 已收集的响应体, 未读完的迭代器)
+def start_wsgi(wsgi_app, environ):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return chunks.append
+
+    chunks = []
+    result = wsgi_app(environ, start_response)
+    iterator = iter(result)
+    size = 0
+    try:
+        for chunk in iterator:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= READ_CHUNK:
+                return started['status'], started['headers'], chunks, (iterator, result)
+    except BaseException:
+        close_wsgi(result)
+        raise
+    close_wsgi(result)
+    return started['status'], started['headers'], chunks, None
+
+
+def close_wsgi(result):
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+
+
+# 流式响应（导出、大图片）的下一批数据，读完时返回None
+def next_chunks(iterator):
+    chunks = []
+    size = 0
+    for chunk in iterator:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= READ_CHUNK:
+            return chunks
+    return chunks or None
+
+
+class ASGIApp:
+    """
+    把 Flask 应用包装为 ASGI 应用
+
+    请求体在事件循环中读取，之后交给线程池：有异步模式的读接口直接返回完整的响应，其余请求经 WSGI 交给 Flask 应用。
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.url_adapter = flask_app.url_map.bind('localhost')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1000})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await run_blocking(prepare_app)
+                    await send({'type': 'lifespan.startup.complete'})
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+            elif message['type'] == 'lifespan.shutdown':
+                await run_blocking(save_all_states)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            body = message.get('body', b'')
+            size += len(body)
+            if size > ASGI_MAX_BODY:
+                raise RequestTooLarge()
+            chunks.append(body)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def http(self, scope, receive, send):
+        try:
+            body = await self.read_body(receive)
+        except ClientDisconnected:
+            return
+        except RequestTooLarge:
+            await self.send_json(send, {"error": "请求体过大"}, 413, scope)
+            return
+
+        endpoint = match_route(self.url_adapter, 'GET', scope['path']) if scope['method'] == 'GET' else None
+        if endpoint is not None:
+            status, response_headers, response_body = await run_blocking(
+                call_view, self.flask_app, build_environ(scope, body), endpoint)
+            await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': response_body})
+            return
+
+        status, response_headers, chunks, rest = await run_blocking(
+            start_wsgi, self.flask_app, build_environ(scope, body))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        if rest is None:
+            await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+            return
+        iterator, result = rest
+        try:
+            while chunks is not None:
+                await send({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': True})
+                chunks = await run_blocking(next_chunks, iterator)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await run_blocking(close_wsgi, result)
+
+    async def send_json(self, send, data, status, scope):
+        """发送不经过 Flask 应用的错误响应（与 jsonify 格式相同，包括 CORS 响应头）"""
+        response = self.flask_app.json.response(data)
+        response.status_code = status
+        origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin-1')
+        if origin:
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Vary'] = 'Origin'
+        else:
+            response.headers['Access-Control-Allow-Origin'] = '*'
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+# ASGI 应用（uvicorn asgi:application）
+application = ASGIApp(app)
+
+
+# ---- 标准库实现的 HTTP/1.1 服务器 ----
+
+class BadRequest(Exception):
+    """无法解析的请求"""
+
+
+# 解析请求行和请求头
+def parse_head(head):
+    lines = head[:-4].split(b'\r\n')
+    parts = lines[0].decode('latin-1').split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        raise BadRequest()
+    headers = []
+    for line in lines[1:]:
+        name, sep, value = line.partition(b':')
+        if not sep or not name.strip():
+            raise BadRequest()
+        headers.append((name.strip().lower(), value.strip()))
+    return parts[0], parts[1], parts[2], headers
+
+
+# 发送不经过应用的简单错误响应
+async def write_error(writer, status):
+    phrase = HTTPStatus(status).phrase
+    body = phrase.encode('latin-1')
+    writer.write(f'HTTP/1.1 {status} {phrase}\r\nContent-Type: text/plain\r\n'
+                 f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+
+
+class HTTPConnection:
+    """一个客户端连接：依次读取请求、调用 ASGI 应用并写回响应"""
+
+    def __init__(self, asgi_app, reader, writer):
+        self.asgi_app = asgi_app
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername') or ('', 0)
+        self.sockname = writer.get_extra_info('sockname') or ('', 0)
+
+    async def read(self, coro):
+        return await asyncio.wait_for(coro, ASGI_KEEPALIVE)
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    head = await self.read(self.reader.readuntil(b'\r\n\r\n'))
+                except asyncio.LimitOverrunError:
+                    await write_error(self.writer, 431)
+                    return
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                try:
+                    request = parse_head(head)
+                except (BadRequest, UnicodeDecodeError):
+                    await write_error(self.writer, 400)
+                    return
+                if not await self.handle(*request):
+                    return
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def handle(self, method, target, version, headers):
+        """处理一个请求，返回连接是否可以继续使用"""
+        header_map = {name: value for name, value in headers}
+        connection = header_map.get(b'connection', b'').lower()
+        keep_alive = (connection != b'close') if version == 'HTTP/1.1' else (connection == b'keep-alive')
+
+        chunked = b'chunked' in header_map.get(b'transfer-encoding', b'').lower()
+        try:
+            remaining = 0 if chunked else int(header_map.get(b'content-length', b'0'))
+        except ValueError:
+            await write_error(self.writer, 400)
+            return False
+        if remaining < 0:
+            await write_error(self.writer, 400)
+            return False
+        if remaining > ASGI_MAX_BODY:
+            await write_error(self.writer, 413)
+            return False
+
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0', 'spec_version': '2.3'},
+            'http_version': version[5:],
+            'method': method.upper(),
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'client': tuple(self.peer[:2]),
+            'server': tuple(self.sockname[:2])
+        }
+
+        body_done = not chunked and remaining == 0
+        body_sent = False
+        expect_continue = header_map.get(b'expect', b'').lower() == b'100-continue'
+        response_done = asyncio.Event()
+        state = {'started': False, 'chunked': False, 'status': 500, 'headers': []}
+
+        async def read_chunk():
+            nonlocal remaining, body_done
+            if chunked:
+                size_line = await self.read(self.reader.readuntil(b'\r\n'))
+                size = int(size_line.split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    while await self.read(self.reader.readuntil(b'\r\n')) != b'\r\n':
+                        pass
+                    body_done = True
+                    return b''
+                data = await self.read(self.reader.readexactly(size))
+                await self.read(self.reader.readexactly(2))
+                return data
+            data = await self.read(self.reader.read(min(remaining, READ_CHUNK)))
+            if not data:
+                raise ConnectionError()
+            remaining -= len(data)
+            body_done = remaining == 0
+            return data
+
+        async def receive():
+            nonlocal expect_continue, body_sent
+            if body_sent:
+                await response_done.wait()
+                return {'type': 'http.disconnect'}
+            if body_done:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            if expect_continue:
+                expect_continue = False
+                self.writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            try:
+                data = await read_chunk()
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+                return {'type': 'http.disconnect'}
+            body_sent = body_done
+            return {'type': 'http.request', 'body': data, 'more_body': not body_done}
+
+        async def send(message):
+            nonlocal keep_alive
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+                state['headers'] = list(message.get('headers', []))
+                return
+            if message['type'] != 'http.response.body':
+                return
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if not state['started']:
+                state['started'] = True
+                names = {name.lower() for name, _ in state['headers']}
+                response_headers = list(state['headers'])
+                if b'content-length' not in names:
+                    if not more_body:
+                        response_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+                    elif version == 'HTTP/1.1':
+                        state['chunked'] = True
+                        response_headers.append((b'transfer-encoding', b'chunked'))
+                    else:
+                        keep_alive = False
+                if not body_done:
+                    # 应用没有读取完请求体，剩余数据无法跳过，响应后关闭连接
+                    keep_alive = False
+                response_headers.append((b'date', formatdate(usegmt=True).encode('latin-1')))
+                if not keep_alive:
+                    response_headers.append((b'connection', b'close'))
+                elif version != 'HTTP/1.1':
+                    response_headers.append((b'connection', b'keep-alive'))
+                status = state['status']
+                try:
+                    phrase = HTTPStatus(status).phrase
+                except ValueError:
+                    phrase = ''
+                head = [f'HTTP/1.1 {status} {phrase}\r\n'.encode('latin-1')]
+                head.extend(name + b': ' + value + b'\r\n' for name, value in response_headers)
+                head.append(b'\r\n')
+                self.writer.write(b''.join(head))
+            if method.upper() != 'HEAD':
+                if state['chunked']:
+                    if body:
+                        self.writer.write(b'%x\r\n%s\r\n' % (len(body), body))
+                    if not more_body:
+                        self.writer.write(b'0\r\n\r\n')
+                elif body:
+                    self.writer.write(body)
+            await self.writer.drain()
+
+        try:
+            await self.asgi_app(scope, receive, send)
+        except Exception as e:
+            print(f"处理请求错误: {method} {target}: {str(e)}")
+            if state['started']:
+                return False
+            await write_error(self.writer, 500)
+            return False
+        finally:
+            response_done.set()
+        if not state['started']:
+            await write_error(self.writer, 500)
+            return False
+        return keep_alive
+
+
+# 提高进程可打开的文件数（每个连接占用一个文件描述符）
+def raise_open_file_limit():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = 65536 if hard == resource.RLIM_INFINITY else hard
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, asgi_app=application):
+    """启动本地 ASGI 服务器并一直运行"""
+    async def on_connection(reader, writer):
+        await HTTPConnection(asgi_app, reader, writer).run()
+
+    server = await asyncio.start_server(on_connection, host, port, limit=MAX_HEADER_BYTES,
+                                        backlog=2048, reuse_address=True)
+    print(f"服务已启动: http://{host}:{port} （asyncio）")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='家庭点餐系统 ASGI 服务器')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    print("初始化应用...")
+    prepare_app()
+    raise_open_file_limit()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    save_all_states()
+    print("服务已停止")
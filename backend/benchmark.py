@@ -0,0 +1,293 @@
+"""
+热点函数的微基准测试
+
+    python benchmark.py                 # 运行全部基准并与 benchmark_baselines.json 比较
+    python benchmark.py rating_join     # 只运行指定的基准
+    python benchmark.py --update        # 重新记录基线（确认性能变化符合预期后执行并提交）
+
+每个基准在几种输入规模下计时，检查两项：
+1. 增长阶数：用最大的两个规模的耗时拟合 耗时 ∝ 规模^k（小规模时固定开销占比大，不参与拟合），
+   k 超过预期阶数 + SCALING_TOLERANCE 时失败，例如本应线性的函数变成了平方级；
+2. 退化：最大规模的耗时超过基线的 (1 + --threshold) 倍时失败（小规模只显示与基线的差异，
+   微秒级的耗时受计时噪声影响较大）。
+   基线同时记录了当时机器上一段固定Python代码的耗时，比较前按两台机器的速度比例换算基线，
+   在不同机器上运行也能得到大致可比的结果。
+
+有失败时退出码为1，可以在提交前或CI中运行。
+"""
+import argparse
+import base64
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+import uuid
+
+from flask import Flask
+
+from routes.dishes import build_dish_listing
+from routes.orders import price_order_items
+from utils.data_store import DataStore
+from utils.file_handlers import save_base64_image
+from utils.models import Dish, Review
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+
+# 增长阶数允许超出预期的幅度（计时噪声和缓存效应）
+SCALING_TOLERANCE = 0.35
+
+# 默认的退化阈值：比基线慢50%以上视为退化
+REGRESSION_THRESHOLD = 0.5
+
+# 已注册的基准: 名称 -> (准备函数, 规模列表, 预期阶数, 说明)，预期阶数为None时只显示增长阶数不检查
+BENCHMARKS = {}
+
+CATEGORIES = ('hot', 'cold', 'staple', 'drink', 'coffee', 'dessert')
+
+
+def benchmark(name, sizes, order, description):
+    """
+    注册基准的装饰器
+
+    被装饰的函数接收规模 n 和临时目录，完成准备工作后返回要计时的无参函数（准备工作不计时）。
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, sizes, order, description)
+        return setup
+    return decorator
+
+
+# 生成测试菜品和评价（固定随机种子，每次运行数据相同）
+def make_dishes(n, rng):
+    return [Dish.from_dict({
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'name': f'菜品{i}',
+        'category': rng.choice(CATEGORIES),
+        'price': rng.randint(5, 120),
+        'description': '传统经典菜肴，肥而不腻，口感醇厚',
+        'image_path': '/static/images/dishes/default-hot.jpg',
+        'timestamp': f'2025-03-{i % 28 + 1:02d}T12:00:00'
+    }) for i in range(n)]
+
+
+def make_reviews(n, dishes, rng):
+    return [Review.from_dict({
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'dish_id': rng.choice(dishes)['id'],
+        'rating': rng.randint(1, 5),
+        'comment': '做得非常好吃，肥而不腻，肉质鲜嫩，味道非常棒！' * rng.randint(1, 3),
+        'image_paths': ['/static/images/reviews/default-review.jpg'] if rng.random() < 0.3 else [],
+        'timestamp': f'2025-03-{i % 28 + 1:02d}T{i % 24:02d}:00:00',
+        'user_name': '张三'
+    }) for i in range(n)]
+
+
+@benchmark('rating_join', (200, 800, 3200), 1, 'get_all_dishes 中菜品与评价的评分汇总（n 个菜品，5n 条评价）')
+def bench_rating_join(n, tmp_dir):
+    rng = random.Random(n)
+    dishes = make_dishes(n, rng)
+    reviews = make_reviews(5 * n, dishes, rng)
+    return lambda: build_dish_listing(dishes, reviews)
+
+
+@benchmark('order_pricing', (10, 100, 1000), 1, 'create_order 中按菜品价格计算订单项（n 个订单项）')
+def bench_order_pricing(n, tmp_dir):
+    rng = random.Random(n)
+    dishes = {dish['id']: dish for dish in make_dishes(200, rng)}
+    ids = list(dishes)
+    items = [{'dish_id': rng.choice(ids), 'quantity': rng.randint(1, 3)} for _ in range(n)]
+    return lambda: price_order_items(items, dishes.get)
+
+
+# 生成与 orders.json 格式相同的订单字典
+def make_orders(n, rng):
+    return [{
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'items': [{
+            'dish_id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'dish_name': '红烧肉',
+            'quantity': rng.randint(1, 3),
+            'price': 48,
+            'total': 48,
+            'image_path': '/static/images/dishes/default-hot.jpg'
+        } for _ in range(3)],
+        'total_price': 144,
+        'status': rng.choice(('pending', 'cooking', 'completed')),
+        'timestamp': f'2025-03-{i % 28 + 1:02d}T12:00:00',
+        'note': '要好吃'
+    } for i in range(n)]
+
+
+# 在临时目录中创建只有 n 个订单的数据仓库
+def make_store(n, tmp_dir):
+    store = DataStore(tempfile.mkdtemp(prefix=f'store-{n}-', dir=tmp_dir))
+    store.replace('orders', make_orders(n, random.Random(n)))
+    return store
+
+
+@benchmark('store_read', (100, 1000, 10000), 1, 'DataStore._read 加载 n 个订单（解析JSON并转换为紧凑记录）')
+def bench_store_read(n, tmp_dir):
+    store = make_store(n, tmp_dir)
+    return lambda: store._read('orders')
+
+
+@benchmark('store_write', (100, 1000, 10000), 1, 'DataStore._write 写入 n 个订单（临时文件、fsync、原子替换）')
+def bench_store_write(n, tmp_dir):
+    store = make_store(n, tmp_dir)
+    records = store.load('orders')
+    return lambda: store._write('orders', records)
+
+
+@benchmark('store_commit', (100, 1000, 10000), 1, '修改 n 个订单中的一个（写入线程的 _commit_batch：写盘、发布快照、记入修改日志）')
+def bench_store_commit(n, tmp_dir):
+    store = make_store(n, tmp_dir)
+    order_id = store.load('orders')[0]['id']
+    notes = itertools.cycle(('要好吃', '少放辣'))
+    return lambda: store.update('orders', order_id, {'note': next(notes)})
+
+
+@benchmark('save_base64_image', (32, 256, 2048), 1, 'save_base64_image 保存 n KB 的 data URL 图片')
+def bench_save_base64_image(n, tmp_dir):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(random.Random(n).randbytes(n * 1024)).decode('ascii')
+    return lambda: save_base64_image(data_url, tmp_dir, 'bench.jpg')
+
+
+# 占位图的耗时主要是加载字体，与像素数几乎无关，只检查退化
+@benchmark('create_dish_image', (30000, 120000, 480000), None, 'create_dish_image 生成 n 像素的占位图')
+def bench_create_dish_image(n, tmp_dir):
+    try:
+        from create_default_images import create_dish_image
+    except ImportError as e:  # 未安装 Pillow 或 requests
+        print(f"  跳过: {str(e)}")
+        return None
+    width = int(math.sqrt(n * 4 / 3))
+    size = (width, n // width)
+    return lambda: create_dish_image('hot', (200, 80, 60), size)
+
+
+def measure(func, repeat=5):
+    """单次调用的耗时（秒）：自动选择循环次数使每轮至少0.2秒，取各轮的最小值"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+# 固定的纯Python工作量，用于换算不同机器的速度
+def _calibration_workload():
+    data = {str(i): i for i in range(2000)}
+    return sorted((v * 7 % 13, k) for k, v in data.items())
+
+
+def calibrate():
+    return measure(_calibration_workload)
+
+
+# 由最大的两个规模的耗时估算增长阶数
+def growth_order(sizes, times):
+    return math.log(times[-1] / times[-2]) / math.log(sizes[-1] / sizes[-2])
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f'{seconds:.2f}s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f}ms'
+    return f'{seconds * 1e6:.1f}µs'
+
+
+def load_baselines():
+    try:
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'calibration': None, 'benchmarks': {}}
+
+
+def run(names, threshold, update):
+    baselines = load_baselines()
+    calibration = calibrate()
+    speed = calibration / baselines['calibration'] if baselines.get('calibration') else 1.0
+    print(f"校准耗时 {format_time(calibration)}（相对基线机器 {speed:.2f}x）")
+
+    failures = []
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix='benchmark-')
+    app = Flask(__name__)
+    try:
+        # build_dish_listing 读取请求参数，在请求上下文中运行
+        with app.test_request_context('/api/dishes/'):
+            for name in names:
+                setup, sizes, order, description = BENCHMARKS[name]
+                print(f"\n{name}: {description}")
+                times = []
+                for n in sizes:
+                    func = setup(n, tmp_dir)
+                    if func is None:
+                        break
+                    func()  # 预热
+                    seconds = measure(func)
+                    times.append(seconds)
+
+                    line = f"  n={n:<8} {format_time(seconds):>10}"
+                    baseline = baselines['benchmarks'].get(name, {}).get(str(n))
+                    if baseline:
+                        expected = baseline * speed
+                        change = seconds / expected - 1
+                        line += f"   基线 {format_time(expected):>10}  {change:+.0%}"
+                        if change > threshold and n == sizes[-1]:
+                            line += "  ← 退化"
+                            failures.append(f"{name} n={n} 比基线慢 {change:.0%}")
+                    print(line)
+                if len(times) != len(sizes):
+                    continue
+
+                results[name] = {str(n): round(t, 9) for n, t in zip(sizes, times)}
+                k = growth_order(sizes, times)
+                if order is None:
+                    print(f"  增长阶数 {k:.2f}（不检查）")
+                    continue
+                limit = order + SCALING_TOLERANCE
+                status = "正常" if k <= limit else "← 增长过快"
+                print(f"  增长阶数 {k:.2f}（预期 ≤ {limit:.2f}）{status}")
+                if k > limit:
+                    failures.append(f"{name} 增长阶数 {k:.2f} 超过预期的 {order}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if update:
+        baselines['calibration'] = round(calibration, 9)
+        baselines['benchmarks'] = {name: values for name, values in baselines['benchmarks'].items()
+                                   if name in BENCHMARKS}
+        baselines['benchmarks'].update(results)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=4, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+        print(f"\n已更新基线: {BASELINE_FILE}")
+        return 0
+
+    if failures:
+        print("\n失败:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\n全部通过")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='家庭点餐系统微基准测试')
+    parser.add_argument('names', nargs='*', help=f"要运行的基准（默认全部）: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--update', action='store_true', help='把本次结果记录为新的基线')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='比基线慢多少视为退化（0.5 表示50%%）')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+    sys.exit(run(args.names or list(BENCHMARKS), args.threshold, args.update))
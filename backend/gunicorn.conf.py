@@ -0,0 +1,29 @@
+# gunicorn 配置
+# 用法: gunicorn -c gunicorn.conf.py "server:create_app()"
+import os
+
+bind = f"{os.environ.get('WEB_HOST', '0.0.0.0')}:{os.environ.get('WEB_PORT', '5000')}"
+
+# 工作进程数与每个进程的线程数
+workers = int(os.environ.get('WEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# 在主进程中加载应用并预热数据，工作进程以写时复制方式共享
+preload_app = True
+
+timeout = 30
+keepalive = 5
+accesslog = None
+errorlog = '-'
+
+
+# 告知工作进程共有几个进程（调试接口在多进程时不可用）
+def post_fork(server, worker):
+    os.environ['WEB_WORKER_PROCESSES'] = str(server.cfg.workers)
+
+
+# 工作进程退出前写入启动快照
+def worker_exit(server, worker):
+    from utils.data_store import save_all_states
+    save_all_states()
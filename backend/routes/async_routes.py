@@ -0,0 +1,87 @@
+"""
+ASGI 模式下菜品、订单和评价读接口的线程池调用（供 asgi.py 使用）
+
+这些接口并不是协程：实现与 Flask 蓝图共用（routes/orders.py、reviews.py、dishes.py 中返回 (数据, 状态码) 的同步函数），
+查询、过滤和序列化都在线程池中、在 Flask 请求上下文内执行，请求钩子（限流、性能分析、家庭ID、CORS 等）与同步模式相同。
+与经由 WSGI 转换的接口相比只省去了 WSGI environ/迭代器这一层，线程占用相同；
+事件循环的收益来自连接和请求体的管理（见 asgi.py），而不是接口本身。
+菜单列表、写接口和其他接口仍经由 WSGI 转换在同一个线程池中处理。
+"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request
+
+from routes.dishes import dish_detail
+from routes.orders import find_order, list_orders, order_summary
+from routes.reviews import list_reviews, reviews_for_dish, reviews_for_order
+
+# 执行阻塞操作（文件读写、图片处理、Flask 接口）的线程数
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))
+
+_executor = None
+
+# 有异步模式的接口: Flask 接口名（不含家庭前缀） -> 共用的实现，参数为 (查询参数, 路径参数)
+ASYNC_VIEWS = {
+    'orders.get_all_orders': lambda args, params: list_orders(args.get('status')),
+    'orders.get_order_summary': lambda args, params: order_summary(),
+    'orders.get_order_by_id': lambda args, params: find_order(params['order_id']),
+    'reviews.get_all_reviews': lambda args, params: list_reviews(),
+    'reviews.get_reviews_by_dish': lambda args, params: reviews_for_dish(params['dish_id']),
+    'reviews.get_reviews_by_order_id': lambda args, params: reviews_for_order(params['order_id']),
+    'dishes.get_dish_by_id': lambda args, params: dish_detail(params['dish_id'])
+}
+
+
+def blocking_executor():
+    """执行阻塞操作的线程池（首次使用时创建）"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-blocking')
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor(), functools.partial(func, *args, **kwargs))
+
+
+def match_route(url_adapter, method, path):
+    """
+    用 Flask 的路由表匹配请求，对应的接口有异步模式时返回接口名（不含家庭前缀），否则返回None
+
+    路由规则（静态路径优先、末尾斜杠重定向等）与 Flask 完全一致。
+    """
+    try:
+        endpoint, _ = url_adapter.match(path, method)
+    except Exception:  # 404、405、重定向等交给 Flask 处理
+        return None
+    if endpoint.startswith('household_'):
+        endpoint = endpoint[len('household_'):]
+    return endpoint if endpoint in ASYNC_VIEWS else None
+
+
+def call_view(flask_app, environ, endpoint):
+    """
+    在 Flask 请求上下文中执行读接口（在线程池中调用），返回 (状态码, 响应头, 响应体)
+
+    与 Flask 的请求处理相同：先执行 before_request 钩子（可能直接返回响应，例如429），
+    再调用共用的实现并序列化，最后执行 after_request 钩子，请求上下文退出时执行 teardown 钩子。
+    """
+    with flask_app.request_context(environ):
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                data, status = ASYNC_VIEWS[endpoint](request.args, request.view_args)
+                rv = flask_app.json.response(data)
+                rv.status_code = status
+        except Exception as e:
+            rv = flask_app.handle_user_exception(e)
+        response = flask_app.finalize_request(rv)
+        body = response.get_data()
+        response.close()
+        headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+        return response.status_code, headers, body
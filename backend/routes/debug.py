@@ -0,0 +1,139 @@
+from flask import Blueprint, jsonify, request, abort, Response
+import os
+
+from utils.profiling import profiler, debug_allowed, worker_processes
+
+debug_bp = Blueprint('debug', __name__)
+
+# 调试接口需要 X-Debug-Token 请求头与环境变量 DEBUG_TOKEN 一致，未配置或不一致时返回404
+# 分析会话和内存快照只保存在处理请求的进程中，多个工作进程时开始、查询和对比的请求
+# 会落到不同进程上，因此直接拒绝，需要时用 --workers 1 （或 WEB_WORKERS=1）启动单独的实例
+@debug_bp.before_request
+def require_debug_token():
+    if not debug_allowed():
+        abort(404)
+    if worker_processes() > 1:
+        return jsonify({
+            "error": "调试接口只能在单个工作进程时使用，请以 --workers 1 启动",
+            "workers": worker_processes(),
+            "pid": os.getpid()
+        }), 409
+
+# 响应头中返回处理请求的进程ID
+@debug_bp.after_request
+def add_pid_header(response):
+    response.headers['X-Worker-Pid'] = str(os.getpid())
+    return response
+
+# 读取正数参数，无效时返回None
+def positive_number(data, name, cast):
+    value = data.get(name)
+    if value is None:
+        return None
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 必须是数字")
+    if value <= 0:
+        raise ValueError(f"{name} 必须大于0")
+    return value
+
+# 开始分析接下来的请求
+# POST /api/debug/profile {"requests": 50, "seconds": 60, "endpoint": "dishes.get_all_dishes"}
+# requests 和 seconds 先达到的为准，都不传时分析接下来的 100 个请求
+@debug_bp.route('/profile', methods=['POST'])
+def start_profile():
+    try:
+        data = request.json or {}
+        requests_count = positive_number(data, 'requests', int)
+        seconds = positive_number(data, 'seconds', float)
+        if requests_count is None and seconds is None:
+            requests_count = 100
+        return jsonify(profiler.start(requests_count, seconds, data.get('endpoint') or None)), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"开始性能分析错误: {str(e)}")
+        return jsonify({"error": f"开始性能分析错误: {str(e)}"}), 500
+
+# 获取分析结果
+# GET /api/debug/profile?format=pstats&sort=cumulative&limit=50 返回 pstats 文本
+# GET /api/debug/profile?format=collapsed 返回折叠调用栈（可直接用于 flamegraph.pl / speedscope）
+# GET /api/debug/profile?format=json 返回会话状态
+@debug_bp.route('/profile', methods=['GET'])
+def get_profile():
+    try:
+        session = profiler.session
+        if session is None:
+            return jsonify({"error": "没有进行中的性能分析"}), 404
+        fmt = request.args.get('format', 'pstats')
+        if fmt == 'json':
+            return jsonify(session.info())
+        if fmt not in ('pstats', 'collapsed'):
+            return jsonify({"error": "format 必须是 pstats、collapsed 或 json"}), 400
+        sort = request.args.get('sort', 'cumulative')
+        limit = request.args.get('limit', 50, type=int)
+        try:
+            body = profiler.report(fmt, sort, limit)
+        except KeyError:
+            return jsonify({"error": f"无效的排序字段: {sort}"}), 400
+        return Response(body or '', mimetype='text/plain')
+    except Exception as e:
+        print(f"获取性能分析结果错误: {str(e)}")
+        return jsonify({"error": f"获取性能分析结果错误: {str(e)}"}), 500
+
+# 停止分析并丢弃结果
+@debug_bp.route('/profile', methods=['DELETE'])
+def stop_profile():
+    session = profiler.stop()
+    if session is None:
+        return jsonify({"error": "没有进行中的性能分析"}), 404
+    return jsonify(session)
+
+# 内存分配跟踪状态：当前和峰值内存、按接口统计的每请求内存增长
+@debug_bp.route('/tracemalloc', methods=['GET'])
+def tracemalloc_status():
+    return jsonify(profiler.tracing_info())
+
+# 开始跟踪内存分配
+# POST /api/debug/tracemalloc/start {"frames": 1}，frames 为每次分配记录的调用栈深度
+@debug_bp.route('/tracemalloc/start', methods=['POST'])
+def start_tracemalloc():
+    try:
+        frames = positive_number(request.json or {}, 'frames', int) or 1
+        profiler.start_tracing(min(frames, 25))
+        return jsonify(profiler.tracing_info())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"开始内存跟踪错误: {str(e)}")
+        return jsonify({"error": f"开始内存跟踪错误: {str(e)}"}), 500
+
+# 拍摄内存快照（保留最近两个，用于对比）
+@debug_bp.route('/tracemalloc/snapshot', methods=['POST'])
+def take_tracemalloc_snapshot():
+    if not profiler.tracing:
+        return jsonify({"error": "内存跟踪未开启"}), 409
+    try:
+        return jsonify({"snapshots": profiler.take_snapshot()}), 201
+    except Exception as e:
+        print(f"拍摄内存快照错误: {str(e)}")
+        return jsonify({"error": f"拍摄内存快照错误: {str(e)}"}), 500
+
+# 最近两个快照的差异，按内存增长排序
+# GET /api/debug/tracemalloc/diff?key=lineno&limit=20，key 可选 lineno、filename、traceback
+@debug_bp.route('/tracemalloc/diff', methods=['GET'])
+def tracemalloc_diff():
+    key = request.args.get('key', 'lineno')
+    if key not in ('lineno', 'filename', 'traceback'):
+        return jsonify({"error": "key 必须是 lineno、filename 或 traceback"}), 400
+    stats = profiler.snapshot_diff(key, request.args.get('limit', 20, type=int))
+    if stats is None:
+        return jsonify({"error": "还没有内存快照"}), 404
+    return jsonify(stats)
+
+# 停止跟踪内存分配
+@debug_bp.route('/tracemalloc/stop', methods=['POST'])
+def stop_tracemalloc():
+    profiler.stop_tracing()
+    return jsonify(profiler.tracing_info())
@@ -1,89 +1,251 @@
 from flask import Blueprint, jsonify, request
-import json
 import os
 import uuid
-import base64
 from datetime import datetime
 
+from utils.data_store import get_store
+from utils.image_pool import ImagePoolBusy, save_images, busy_response
+from utils.image_refs import image_location, unreferenced_images
+from utils.jobs import discard_images, shrink_images
+from utils.menu_facets import facet_search
+from utils.trending import sort_trending
+from utils.uploads import UploadError, upload_manager, upload_error_response
+from utils.response_cache import cached_response
+
 dishes_bp = Blueprint('dishes', __name__)
 
-# 读取JSON文件辅助函数
-def read_json_file(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"警告: {file_path} 无法读取或为空，返回空列表")
-        return []
+# 由评价聚合得到的字段
+RATING_FIELDS = ('avg_rating', 'latest_review', 'review_image')
+
+# 批量获取时最多的菜品数
+MAX_BATCH_IDS = 100
+
+# 菜品列表的排序方式（默认按添加顺序）
+LISTING_SORTS = ('trending',)
+
+# 一次遍历评价，按菜品汇总评分和最新评价
+def collect_review_stats(reviews):
+    stats = {}
+    for review in reviews:
+        entry = stats.get(review.get('dish_id'))
+        if entry is None:
+            entry = stats[review.get('dish_id')] = {'total': 0, 'count': 0, 'latest': review}
+        elif review.get('timestamp', '') > entry['latest'].get('timestamp', ''):
+            entry['latest'] = review
+        entry['total'] += review.get('rating', 0)
+        entry['count'] += 1
+    return stats
+
+# 计算菜品的评分字段
+def rating_fields(dish_id, stats):
+    entry = stats.get(dish_id)
+    if entry is None:
+        return {'avg_rating': None, 'latest_review': None, 'review_image': None}
+    
+    latest_review = entry['latest']
+    comment = latest_review.get('comment', '')
+    image_paths = latest_review.get('image_paths')
+    return {
+        'avg_rating': entry['total'] / entry['count'],
+        # 最新评价（超过50个字截断）
+        'latest_review': comment[:50] + '...' if len(comment) > 50 else comment,
+        # 最新评价的第一张图片（如果有的话）
+        'review_image': image_paths[0] if image_paths else None
+    }
+
+# 按请求参数生成菜品列表
+# view=summary 只返回菜单摘要；fields=a,b,c 只返回指定字段（id始终返回）
+# 已有评分汇总（stats）时不再遍历评价
+def build_dish_listing(dishes, reviews, stats=None):
+    fields = request.args.get('fields')
+    if fields:
+        fields = ['id'] + [f.strip() for f in fields.split(',') if f.strip() and f.strip() != 'id']
+        with_rating = any(f in RATING_FIELDS for f in fields)
+    else:
+        with_rating = True
+    # 菜单摘要由当前家庭数据仓库的 dish_summaries 索引维护
+    summaries = get_store().index('dish_summaries') if request.args.get('view') == 'summary' else None
+    
+    if stats is None:
+        stats = collect_review_stats(reviews) if with_rating else {}
+    result = []
+    for dish in dishes:
+        item = dict(summaries.summary(dish) if summaries is not None else dish)
+        if with_rating:
+            item.update(rating_fields(dish.get('id'), stats))
+        if fields:
+            item = {key: item[key] for key in fields if key in item}
+        result.append(item)
+    return result
+
+# 按热度排序时菜单还依赖订单
+def trending_collections():
+    return ('orders',) if request.args.get('sort') == 'trending' else ()
+
+# 检查排序参数，无效时返回错误响应
+def check_listing_sort():
+    sort = request.args.get('sort')
+    if sort is not None and sort not in LISTING_SORTS:
+        return jsonify({"error": f"无效的排序方式. 有效值: {', '.join(LISTING_SORTS)}"}), 400
+    return None
 
-# 写入JSON文件辅助函数
-def write_json_file(file_path, data):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+# 按请求参数排列菜品：sort=trending 按近期点单和评价的热度从高到低排列
+def sort_dish_listing(store, dishes):
+    if request.args.get('sort') == 'trending':
+        return sort_trending(store.index('dish_order_trend'), store.index('dish_review_trend'), dishes)
+    return dishes
 
 # 获取所有菜品
+# 支持 ?view=summary 和 ?fields=name,price 等参数减少返回的数据量，?sort=trending 按热度排序
 @dishes_bp.route('/', methods=['GET'])
+@cached_response('dishes', 'reviews', extra=trending_collections)
 def get_all_dishes():
     try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
+        error = check_listing_sort()
+        if error:
+            return error
         
-        dishes = read_json_file(dishes_path)
-        reviews = read_json_file(reviews_path)
+        store = get_store()
+        dishes = store.load('dishes')
         
         # 检查是否有菜品数据
         if not dishes:
             # 如果没有数据，添加示例数据
-            dishes = create_sample_dishes()
-            write_json_file(dishes_path, dishes)
-        
-        # 为每个菜品计算平均评分
-        for dish in dishes:
-            dish_reviews = [review for review in reviews if review.get('dish_id') == dish.get('id')]
-            if dish_reviews:
-                ratings = [review.get('rating', 0) for review in dish_reviews]
-                dish['avg_rating'] = sum(ratings) / len(ratings)
-                # 获取最新评价
-                latest_review = max(dish_reviews, key=lambda x: x.get('timestamp', ''))
-                dish['latest_review'] = latest_review.get('comment', '')[:50] + '...' if len(latest_review.get('comment', '')) > 50 else latest_review.get('comment', '')
-                
-                # 添加最新评价的图片路径（如果有的话）
-                if latest_review.get('image_paths') and len(latest_review.get('image_paths')) > 0:
-                    dish['review_image'] = latest_review.get('image_paths')[0]  # 使用第一张图片
-                else:
-                    dish['review_image'] = None
-            else:
-                dish['avg_rating'] = None
-                dish['latest_review'] = None
-                dish['review_image'] = None
+            store.replace('dishes', create_sample_dishes())
+            dishes = store.load('dishes')
+        
+        result = build_dish_listing(sort_dish_listing(store, dishes), store.load('reviews'))
         
-        print(f"返回菜品数据: {len(dishes)} 个菜品")
-        return jsonify(dishes)
+        print(f"返回菜品数据: {len(result)} 个菜品")
+        return jsonify(result)
     except Exception as e:
         print(f"获取菜品数据错误: {str(e)}")
         return jsonify({"error": f"获取菜品数据错误: {str(e)}"}), 500
 
-# 按ID获取菜品
-@dishes_bp.route('/<dish_id>', methods=['GET'])
-def get_dish_by_id(dish_id):
+# 解析可选的数值参数，格式错误时抛出 ValueError
+def float_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return float(value)
+
+# 组合条件过滤菜品（带分面计数）
+# GET /api/dishes/filter?category=hot,cold&min_price=10&max_price=50&min_rating=4&has_reviews=1&sort=price
+# sort 可选 price（默认）、-price、rating；view 和 fields 参数同获取所有菜品
+# 结果由价格和评分的有序索引得出，不遍历全部菜品和评价
+@dishes_bp.route('/filter', methods=['GET'])
+@cached_response('dishes', 'reviews')
+def filter_dishes():
     try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        dishes = read_json_file(dishes_path)
-        reviews = read_json_file(reviews_path)
-        
-        dish = next((d for d in dishes if d.get('id') == dish_id), None)
+        categories = [c.strip().lower() for c in request.args.get('category', '').split(',') if c.strip()]
+        try:
+            min_price = float_arg('min_price')
+            max_price = float_arg('max_price')
+            min_rating = float_arg('min_rating')
+        except ValueError:
+            return jsonify({"error": "价格和评分必须是数字"}), 400
+        
+        has_reviews = request.args.get('has_reviews')
+        if has_reviews is not None:
+            if has_reviews not in ('1', 'true', '0', 'false'):
+                return jsonify({"error": "has_reviews 必须是 1 或 0"}), 400
+            has_reviews = has_reviews in ('1', 'true')
+            # 有最低评分的菜品一定有评价，两个条件矛盾时返回400而不是空结果
+            if min_rating is not None and not has_reviews:
+                return jsonify({"error": "min_rating 不能与 has_reviews=0 同时使用"}), 400
+        
+        sort = request.args.get('sort', 'price')
+        if sort not in ('price', '-price', 'rating'):
+            return jsonify({"error": "无效的排序方式. 有效值: price, -price, rating"}), 400
+        
+        store = get_store()
+        ratings = store.index('dish_ratings')
+        ids, facets = facet_search(store.index('dish_prices'), ratings, categories, min_price, max_price,
+                                   min_rating, has_reviews)
+        
+        if sort == '-price':
+            ids.reverse()
+        elif sort == 'rating':
+            ids.sort(key=lambda dish_id: ratings.average(dish_id) or 0, reverse=True)
+        
+        dishes = [dish for dish in (store.get('dishes', dish_id) for dish_id in ids) if dish is not None]
+        result = build_dish_listing(dishes, (), ratings.stats(ids))
+        return jsonify({"dishes": result, "total": len(result), "facets": facets})
+    except Exception as e:
+        print(f"过滤菜品错误: {str(e)}")
+        return jsonify({"error": f"过滤菜品错误: {str(e)}"}), 500
+
+# 批量获取菜品
+# GET /api/dishes/batch?ids=a,b,c&ratings=1&order_id=xxx，或 POST 同名字段的JSON（ids为列表）
+# 通过ID索引取菜品，评价只遍历一次：ratings 时附带评分字段，order_id 时附带该订单下的评价
+@dishes_bp.route('/batch', methods=['GET', 'POST'])
+def get_dishes_batch():
+    try:
+        if request.method == 'POST':
+            # 请求体不是JSON对象（例如直接提交ID数组）时返回400
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({"error": "请求体必须是JSON对象，例如 {\"ids\": [...]}"}), 400
+            ids = data.get('ids')
+            with_rating = bool(data.get('ratings'))
+            order_id = data.get('order_id')
+        else:
+            ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+            with_rating = request.args.get('ratings') in ('1', 'true')
+            order_id = request.args.get('order_id')
+        
+        if not ids or not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+            return jsonify({"error": "缺少菜品ID列表"}), 400
+        if len(ids) > MAX_BATCH_IDS:
+            return jsonify({"error": f"一次最多获取 {MAX_BATCH_IDS} 个菜品"}), 400
+        
+        store = get_store()
+        dishes = {}
+        missing = []
+        for dish_id in dict.fromkeys(ids):  # 去重并保持请求的顺序
+            dish = store.get('dishes', dish_id)
+            if dish is None:
+                missing.append(dish_id)
+            else:
+                dishes[dish_id] = dish
+        
+        # 只保留所请求菜品的评价
+        stats = {}
+        order_reviews = {}
+        if with_rating or order_id:
+            reviews = [r for r in store.load('reviews') if r.get('dish_id') in dishes]
+            if with_rating:
+                stats = collect_review_stats(reviews)
+            if order_id:
+                for review in sorted(reviews, key=lambda r: r.get('timestamp', ''), reverse=True):
+                    if review.get('order_id') == order_id:
+                        order_reviews.setdefault(review.get('dish_id'), []).append(review)
+        
+        result = []
+        for dish_id, dish in dishes.items():
+            item = dict(dish)
+            if with_rating:
+                item.update(rating_fields(dish_id, stats))
+            if order_id:
+                item['order_reviews'] = order_reviews.get(dish_id, [])
+            result.append(item)
+        
+        return jsonify({"dishes": result, "missing": missing})
+    except Exception as e:
+        print(f"批量获取菜品错误: {str(e)}")
+        return jsonify({"error": f"批量获取菜品错误: {str(e)}"}), 500
+
+# 菜品详情（包含完整做法、食材和全部评价），返回 (数据, 状态码)，由蓝图接口和 asgi.py 的异步模式共用
+def dish_detail(dish_id):
+    try:
+        store = get_store()
+        dish = store.get('dishes', dish_id)
         if not dish:
-            return jsonify({"error": "菜品未找到"}), 404
+            return {"error": "菜品未找到"}, 404
+        dish = dict(dish)
         
         # 获取该菜品的所有评价
+        reviews = store.load('reviews')
         dish_reviews = [review for review in reviews if review.get('dish_id') == dish_id]
         dish['reviews'] = dish_reviews
         
@@ -94,29 +256,34 @@ def get_dish_by_id(dish_id):
         else:
             dish['avg_rating'] = None
         
-        return jsonify(dish)
+        return dish, 200
     except Exception as e:
         print(f"获取菜品详情错误: {str(e)}")
-        return jsonify({"error": f"获取菜品详情错误: {str(e)}"}), 500
+        return {"error": f"获取菜品详情错误: {str(e)}"}, 500
 
-# 按类别获取菜品
+# 按ID获取菜品（包含完整做法、食材和全部评价）
+@dishes_bp.route('/<dish_id>', methods=['GET'])
+def get_dish_by_id(dish_id):
+    data, status = dish_detail(dish_id)
+    return jsonify(data), status
+
+# 按类别获取菜品（参数同获取所有菜品）
 @dishes_bp.route('/category/<category>', methods=['GET'])
+@cached_response('dishes', 'reviews', extra=trending_collections)
 def get_dishes_by_category(category):
     try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
+        error = check_listing_sort()
+        if error:
+            return error
         
-        dishes = read_json_file(dishes_path)
-        reviews = read_json_file(reviews_path)
+        store = get_store()
+        dishes = store.load('dishes')
         
         # 检查是否有菜品数据
         if not dishes:
             # 如果没有数据，添加示例数据
-            dishes = create_sample_dishes()
-            write_json_file(dishes_path, dishes)
+            store.replace('dishes', create_sample_dishes())
+            dishes = store.load('dishes')
         
         # 按类别过滤菜品
         category_dishes = [d for d in dishes if d.get('category', '').lower() == category.lower()]
@@ -126,27 +293,7 @@ def get_dishes_by_category(category):
         if not category_dishes:
             print(f"所有可用类别: {set(d.get('category', '') for d in dishes)}")
         
-        # 为每个菜品计算平均评分
-        for dish in category_dishes:
-            dish_reviews = [review for review in reviews if review.get('dish_id') == dish.get('id')]
-            if dish_reviews:
-                ratings = [review.get('rating', 0) for review in dish_reviews]
-                dish['avg_rating'] = sum(ratings) / len(ratings)
-                # 获取最新评价
-                latest_review = max(dish_reviews, key=lambda x: x.get('timestamp', ''))
-                dish['latest_review'] = latest_review.get('comment', '')[:50] + '...' if len(latest_review.get('comment', '')) > 50 else latest_review.get('comment', '')
-                
-                # 添加最新评价的图片路径（如果有的话）
-                if latest_review.get('image_paths') and len(latest_review.get('image_paths')) > 0:
-                    dish['review_image'] = latest_review.get('image_paths')[0]  # 使用第一张图片
-                else:
-                    dish['review_image'] = None
-            else:
-                dish['avg_rating'] = None
-                dish['latest_review'] = None
-                dish['review_image'] = None
-        
-        return jsonify(category_dishes)
+        return jsonify(build_dish_listing(sort_dish_listing(store, category_dishes), store.load('reviews')))
     except Exception as e:
         print(f"按类别获取菜品错误: {str(e)}")
         return jsonify({"error": f"按类别获取菜品错误: {str(e)}"}), 500
@@ -163,41 +310,27 @@ def add_dish():
             if field not in data:
                 return jsonify({"error": f"缺少必填字段: {field}"}), 400
         
-        # 获取当前目录的绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        
-        # 确保图片目录存在
-        images_dir = os.path.join(root_dir, 'static', 'images', 'dishes')
-        os.makedirs(images_dir, exist_ok=True)
+        # 当前家庭的菜品图片目录
+        images_dir, images_url = image_location('dishes')
         
         # 处理图片
         if 'image_data' in data and data['image_data']:
-            # 解码base64图片
+            # 在图片线程池中解码并保存
             try:
-                # 确保我们有一个base64编码的字符串
-                if ',' in data['image_data']:
-                    image_data = data['image_data'].split(',')[1]
-                else:
-                    image_data = data['image_data']
-                
-                image_binary = base64.b64decode(image_data)
-                
-                # 生成唯一文件名
-                filename = f"{uuid.uuid4()}.jpg"
-                file_path = os.path.join(images_dir, filename)
-                
-                # 打印调试信息
-                print(f"保存图片到: {file_path}")
-                
-                # 保存图片
-                with open(file_path, 'wb') as f:
-                    f.write(image_binary)
-                
-                image_path = f"/static/images/dishes/{filename}"
+                filename = save_images([data['image_data']], images_dir)[0]
+                print(f"保存图片到: {os.path.join(images_dir, filename)}")
+                image_path = f"{images_url}{filename}"
+            except ImagePoolBusy as e:
+                return busy_response(e)
             except Exception as e:
                 print(f"图片处理错误: {str(e)}")
                 return jsonify({"error": f"图片处理错误: {str(e)}"}), 400
+        elif data.get('upload_id'):
+            # 使用分块上传完成的图片
+            try:
+                image_path = f"{images_url}{upload_manager.claim(data['upload_id'], images_dir)}"
+            except UploadError as e:
+                return upload_error_response(e)
         else:
             # 使用随机图片
             image_path = f"/static/images/dishes/default-{data['category']}.jpg"
@@ -215,15 +348,16 @@ def add_dish():
             "timestamp": datetime.now().isoformat()
         }
         
-        # 读取现有菜品
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        dishes = read_json_file(dishes_path)
+        # 可选的制作时间（分钟），用于厨房队列估算等待时间
+        if data.get('prep_minutes'):
+            new_dish['prep_minutes'] = float(data['prep_minutes'])
         
-        # 添加新菜品
-        dishes.append(new_dish)
+        # 添加新菜品并写入
+        get_store().insert('dishes', new_dish)
         
-        # 写入更新的菜品列表
-        write_json_file(dishes_path, dishes)
+        # 后台缩小上传的大图
+        if image_path.startswith(images_url):
+            shrink_images([image_path])
         
         return jsonify(new_dish), 201
     except Exception as e:
@@ -361,58 +495,54 @@ def update_dish(dish_id):
     try:
         data = request.json
         
-        # 获取当前目录的绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        
-        # 读取现有菜品
-        dishes = read_json_file(dishes_path)
-        
         # 查找要更新的菜品
-        dish_index = next((i for i, d in enumerate(dishes) if d.get('id') == dish_id), None)
-        if dish_index is None:
+        store = get_store()
+        old_dish = store.get('dishes', dish_id)
+        if old_dish is None:
             return jsonify({"error": "菜品未找到"}), 404
         
         # 更新字段
+        changes = {}
         for key in data:
-            if key != 'id' and key != 'image_data':  # 不允许更改ID
-                dishes[dish_index][key] = data[key]
+            if key not in ('id', 'image_data', 'upload_id', 'image_path'):  # 不允许更改ID，图片路径只能由服务器设置
+                changes[key] = data[key]
         
-        # 处理图片（如果提供）
+        # 处理图片（如果提供），保存到当前家庭的菜品图片目录
+        images_dir, images_url = image_location('dishes')
         if 'image_data' in data and data['image_data']:
+            # 在图片线程池中解码并保存
             try:
-                # 确保我们有一个base64编码的字符串
-                if ',' in data['image_data']:
-                    image_data = data['image_data'].split(',')[1]
-                else:
-                    image_data = data['image_data']
-                
-                image_binary = base64.b64decode(image_data)
-                
-                # 生成唯一文件名
-                filename = f"{uuid.uuid4()}.jpg"
-                file_path = os.path.join(root_dir, 'static', 'images', 'dishes', filename)
-                
-                # 确保目录存在
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                
-                # 保存图片
-                with open(file_path, 'wb') as f:
-                    f.write(image_binary)
-                
-                dishes[dish_index]['image_path'] = f"/static/images/dishes/{filename}"
+                filename = save_images([data['image_data']], images_dir)[0]
+                changes['image_path'] = f"{images_url}{filename}"
+            except ImagePoolBusy as e:
+                return busy_response(e)
             except Exception as e:
                 print(f"图片处理错误: {str(e)}")
                 return jsonify({"error": f"图片处理错误: {str(e)}"}), 400
+        elif data.get('upload_id'):
+            # 使用分块上传完成的图片
+            try:
+                filename = upload_manager.claim(data['upload_id'], images_dir)
+                changes['image_path'] = f"{images_url}{filename}"
+            except UploadError as e:
+                return upload_error_response(e)
         
         # 更新时间戳
-        dishes[dish_index]['timestamp'] = datetime.now().isoformat()
+        changes['timestamp'] = datetime.now().isoformat()
         
-        # 写入更新的菜品列表
-        write_json_file(dishes_path, dishes)
+        # 写入更新的菜品
+        dish = store.update('dishes', dish_id, changes)
+        if dish is None:
+            return jsonify({"error": "菜品未找到"}), 404
         
-        return jsonify(dishes[dish_index])
+        # 更换了图片时后台缩小新图片并删除旧图片（历史订单仍引用的图片保留）
+        if 'image_path' in changes and changes['image_path'] != old_dish.get('image_path'):
+            shrink_images([changes['image_path']])
+            paths = unreferenced_images(store, [old_dish.get('image_path')])
+            if paths:
+                discard_images(paths)
+        
+        return jsonify(dish)
     except Exception as e:
         print(f"更新菜品错误: {str(e)}")
         return jsonify({"error": f"更新菜品错误: {str(e)}"}), 500
@@ -421,24 +551,16 @@ def update_dish(dish_id):
 @dishes_bp.route('/<dish_id>', methods=['DELETE'])
 def delete_dish(dish_id):
     try:
-        # 获取当前目录的绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        
-        # 读取现有菜品
-        dishes = read_json_file(dishes_path)
-        
-        # 查找要删除的菜品
-        dish = next((d for d in dishes if d.get('id') == dish_id), None)
+        # 移除菜品并写入
+        store = get_store()
+        dish = store.delete('dishes', dish_id)
         if not dish:
             return jsonify({"error": "菜品未找到"}), 404
         
-        # 移除菜品
-        dishes = [d for d in dishes if d.get('id') != dish_id]
-        
-        # 写入更新的菜品列表
-        write_json_file(dishes_path, dishes)
+        # 后台删除菜品图片（默认图片和历史订单仍引用的图片保留）
+        paths = unreferenced_images(store, [dish.get('image_path')])
+        if paths:
+            discard_images(paths, key=f'dish:{dish_id}')
         
         return jsonify({"message": "菜品删除成功"})
     except Exception as e:
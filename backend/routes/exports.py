@@ -0,0 +1,169 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import io
+import csv
+import json
+import uuid
+from datetime import datetime
+
+from utils.data_store import COLLECTIONS, get_store
+from utils.models import COLLECTION_MODELS, encode_record
+
+exports_bp = Blueprint('exports', __name__)
+
+# 导入结果中最多返回的错误条数
+MAX_REPORTED_ERRORS = 20
+
+# CSV中需要还原为数字的字段
+NUMERIC_FIELDS = {
+    'price': float,
+    'total_price': float,
+    'prep_minutes': float,
+    'rating': int,
+    'priority': int
+}
+
+# 按时间范围过滤记录（since/until 为ISO格式时间，与记录的timestamp比较）
+def filter_by_time(records, since, until):
+    for record in records:
+        timestamp = record.get('timestamp', '')
+        if since and timestamp < since:
+            continue
+        if until and timestamp >= until:
+            continue
+        yield record
+
+# 把值转换为CSV单元格：列表和字典编码为JSON
+def to_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=encode_record)
+    return value
+
+# 把CSV单元格还原为值
+def from_cell(field, value):
+    if value == '':
+        return None
+    if value[0] in '[{':
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    if field in NUMERIC_FIELDS:
+        return NUMERIC_FIELDS[field](value)
+    return value
+
+# 逐行生成NDJSON
+def generate_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, default=encode_record) + '\n'
+
+# 逐行生成CSV，第一行为表头
+def generate_csv(records, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([to_cell(record.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+# 逐条读取请求体中的记录
+def read_records(fmt):
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.reader(stream)
+        columns = next(reader, None)
+        if columns is None:
+            return
+        for row in reader:
+            try:
+                yield {column: from_cell(column, value) for column, value in zip(columns, row)
+                       if value != ''}
+            except ValueError as e:
+                yield ValueError(f"字段格式错误: {str(e)}")
+    else:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"JSON格式错误: {str(e)}")
+
+# 导出数据
+# GET /api/export/<collection>?format=ndjson|csv&since=2025-01-01&until=2025-02-01
+@exports_bp.route('/export/<collection>', methods=['GET'])
+def export_collection(collection):
+    try:
+        if collection not in COLLECTIONS:
+            return jsonify({"error": f"无效的数据集合. 有效集合: {', '.join(COLLECTIONS)}"}), 404
+
+        fmt = request.args.get('format', 'ndjson')
+        since = request.args.get('since')
+        until = request.args.get('until')
+
+        # 数据仓库的列表在写入时整体替换，遍历期间不会被修改
+        records = get_store().load(collection)
+        filename = f"{collection}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+        if fmt == 'csv':
+            # 表头为所有记录字段的并集（保持首次出现的顺序）
+            columns = {}
+            for record in filter_by_time(records, since, until):
+                columns.update(dict.fromkeys(record))
+            body = generate_csv(filter_by_time(records, since, until), list(columns))
+            response = Response(stream_with_context(body), mimetype='text/csv')
+            response.headers['Content-Disposition'] = f'attachment; filename={filename}.csv'
+        elif fmt == 'ndjson':
+            body = generate_ndjson(filter_by_time(records, since, until))
+            response = Response(stream_with_context(body), mimetype='application/x-ndjson')
+            response.headers['Content-Disposition'] = f'attachment; filename={filename}.ndjson'
+        else:
+            return jsonify({"error": "无效的格式. 有效格式: ndjson, csv"}), 400
+
+        return response
+    except Exception as e:
+        print(f"导出数据错误: {str(e)}")
+        return jsonify({"error": f"导出数据错误: {str(e)}"}), 500
+
+# 导入数据
+# POST /api/import/<collection>?format=ndjson|csv，请求体为NDJSON（每行一条记录）或带表头的CSV
+# 逐行读取并验证，全部记录在一次写入中提交；已存在的ID在写锁内跳过
+@exports_bp.route('/import/<collection>', methods=['POST'])
+def import_collection(collection):
+    try:
+        if collection not in COLLECTIONS:
+            return jsonify({"error": f"无效的数据集合. 有效集合: {', '.join(COLLECTIONS)}"}), 404
+
+        fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({"error": "无效的格式. 有效格式: ndjson, csv"}), 400
+
+        skipped = 0
+        errors = []
+        records = []
+
+        for line_no, record in enumerate(read_records(fmt), start=1):
+            error = str(record) if isinstance(record, ValueError) else COLLECTION_MODELS[collection].validate(record)
+            if error:
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_no, "error": error})
+                skipped += 1
+                continue
+
+            record.setdefault('id', str(uuid.uuid4()))
+            record.setdefault('timestamp', datetime.now().isoformat())
+            records.append(record)
+
+        # 重复ID的检查在写入线程中进行，与并发的导入和新增互不覆盖
+        inserted = get_store().insert_many(collection, records, skip_existing=True) if records else 0
+        skipped += len(records) - inserted
+
+        return jsonify({"inserted": inserted, "skipped": skipped, "errors": errors})
+    except Exception as e:
+        print(f"导入数据错误: {str(e)}")
+        return jsonify({"error": f"导入数据错误: {str(e)}"}), 500
@@ -1,76 +1,180 @@
-from flask import Blueprint, jsonify, request
-import json
-import os
+from flask import Blueprint, Response, jsonify, request
 import uuid
 from datetime import datetime
 
+from utils.data_store import get_store
+from utils.idempotency import idempotent
+from utils.image_pool import ImagePoolBusy, busy_response
+from utils.kitchen_queue import estimate_prep_minutes
+from utils.order_status import ORDER_STATUSES, InvalidTransition, check_transition
+from utils.qr_code import QR_FORMATS, order_payload, qr_key, render_qr
+
 orders_bp = Blueprint('orders', __name__)
 
-# 读取JSON文件辅助函数
-def read_json_file(file_path):
+# 以下读接口的实现返回 (数据, 状态码)，由蓝图中的接口和 asgi.py 的异步模式共用
+
+# 按状态过滤订单（通过状态索引获取，无需扫描全部订单），按时间倒序排列
+def list_orders(status_filter=None):
+    try:
+        store = get_store()
+        if status_filter:
+            statuses = [s.strip() for s in status_filter.split(',') if s.strip()]
+            invalid = [s for s in statuses if s not in ORDER_STATUSES]
+            if invalid:
+                return {"error": f"无效的状态. 有效状态: {', '.join(ORDER_STATUSES)}"}, 400
+            
+            status_index = store.index('order_status')
+            orders = []
+            for status in statuses:
+                for order_id in status_index.ids(status):
+                    order = store.get('orders', order_id)
+                    if order:
+                        orders.append(order)
+        else:
+            orders = store.load('orders')
+        
+        # 按时间倒序排列
+        return sorted(orders, key=lambda x: x.get('timestamp', ''), reverse=True), 200
+    except Exception as e:
+        print(f"获取订单错误: {str(e)}")
+        return {"error": f"获取订单错误: {str(e)}"}, 500
+
+# 各状态的订单数量
+def order_summary():
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"警告: {file_path} 无法读取或为空，返回空列表")
-        return []
-
-# 写入JSON文件辅助函数
-def write_json_file(file_path, data):
-    # 确保目录存在
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+        return get_store().index('order_status').counts(), 200
+    except Exception as e:
+        print(f"获取订单统计错误: {str(e)}")
+        return {"error": f"获取订单统计错误: {str(e)}"}, 500
+
+# 按ID查找订单
+def find_order(order_id):
+    try:
+        order = get_store().get('orders', order_id)
+        if not order:
+            return {"error": "订单未找到"}, 404
+        return order, 200
+    except Exception as e:
+        print(f"获取订单详情错误: {str(e)}")
+        return {"error": f"获取订单详情错误: {str(e)}"}, 500
 
 # 获取所有订单
+# 支持 ?status=cooking 或 ?status=pending,cooking 按状态过滤
 @orders_bp.route('/', methods=['GET'])
 def get_all_orders():
+    data, status = list_orders(request.args.get('status'))
+    return jsonify(data), status
+
+# 获取各状态的订单数量
+@orders_bp.route('/summary', methods=['GET'])
+def get_order_summary():
+    data, status = order_summary()
+    return jsonify(data), status
+
+# 获取厨房队列：未完成的订单按优先级和下单时间排列
+@orders_bp.route('/queue', methods=['GET'])
+def get_kitchen_queue():
     try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        orders_path = os.path.join(root_dir, 'static', 'data', 'orders.json')
-        
-        # 确保文件存在
-        if not os.path.exists(orders_path):
-            os.makedirs(os.path.dirname(orders_path), exist_ok=True)
-            with open(orders_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-            print(f"创建新的订单文件: {orders_path}")
-            return jsonify([])
+        store = get_store()
+        limit = request.args.get('limit', type=int)
+        queue = store.index('kitchen_queue')
+        
+        result = []
+        wait_minutes = 0
+        for order_id in queue.order_ids(limit):
+            order = store.get('orders', order_id)
+            if not order:
+                continue
+            prep_minutes = estimate_prep_minutes(order, lambda dish_id: store.get('dishes', dish_id))
             
-        orders = read_json_file(orders_path)
+            item = dict(order)
+            item['queue_position'] = len(result) + 1
+            item['estimated_prep_minutes'] = prep_minutes
+            item['estimated_wait_minutes'] = wait_minutes
+            wait_minutes += prep_minutes
+            result.append(item)
         
-        # 按时间倒序排列
-        orders.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        return jsonify(orders)
+        return jsonify(result)
     except Exception as e:
-        print(f"获取订单错误: {str(e)}")
-        return jsonify({"error": f"获取订单错误: {str(e)}"}), 500
+        print(f"获取厨房队列错误: {str(e)}")
+        return jsonify({"error": f"获取厨房队列错误: {str(e)}"}), 500
 
-# 按ID获取订单
+# 按ID获取订单（二维码通过 /api/orders/<id>/qr 单独获取）
 @orders_bp.route('/<order_id>', methods=['GET'])
 def get_order_by_id(order_id):
+    data, status = find_order(order_id)
+    return jsonify(data), status
+
+# 获取订单的支付二维码
+# GET /api/orders/<id>/qr?format=png|svg，内容为订单号和金额（或配置的支付链接）
+# 以内容哈希作为ETag，内容不变时浏览器直接使用缓存，服务端也只渲染一次
+@orders_bp.route('/<order_id>/qr', methods=['GET'])
+def get_order_qr(order_id):
     try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        orders_path = os.path.join(root_dir, 'static', 'data', 'orders.json')
-        
-        orders = read_json_file(orders_path)
-        order = next((o for o in orders if o.get('id') == order_id), None)
-        
+        order = get_store().get('orders', order_id)
         if not order:
             return jsonify({"error": "订单未找到"}), 404
         
-        # 不需要生成二维码，前端会使用静态图片
-        return jsonify(order)
+        fmt = request.args.get('format', 'png')
+        if fmt not in QR_FORMATS:
+            return jsonify({"error": f"无效的格式. 有效格式: {', '.join(QR_FORMATS)}"}), 400
+        
+        payload = order_payload(order)
+        etag = qr_key(payload, fmt)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            etag, body = render_qr(payload, fmt)
+            if body is None:
+                return jsonify({"error": "服务器未安装二维码组件"}), 501
+            response = Response(body, mimetype=QR_FORMATS[fmt])
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, max-age=300'
+        return response
+    except ImagePoolBusy as e:
+        return busy_response(e)
     except Exception as e:
-        print(f"获取订单详情错误: {str(e)}")
-        return jsonify({"error": f"获取订单详情错误: {str(e)}"}), 500
+        print(f"获取订单二维码错误: {str(e)}")
+        return jsonify({"error": f"获取订单二维码错误: {str(e)}"}), 500
+
+# 订单中的菜品不存在
+class UnknownDish(Exception):
+    pass
+
+# 按菜品当前价格生成订单项并计算总价，返回 (订单项, 总价)
+# get_dish 按ID查找菜品，菜品不存在时抛出 UnknownDish
+def price_order_items(items, get_dish):
+    order_items = []
+    total_price = 0
+    
+    for item in items:
+        dish_id = item['dish_id']
+        quantity = item['quantity']
+        
+        # 查找菜品
+        dish = get_dish(dish_id)
+        if not dish:
+            raise UnknownDish(f"菜品ID {dish_id} 未找到")
+        
+        # 计算项目价格
+        item_price = dish.get('price', 0) * quantity
+        total_price += item_price
+        
+        # 添加订单项
+        order_items.append({
+            "dish_id": dish_id,
+            "dish_name": dish.get('name', '未知菜品'),
+            "quantity": quantity,
+            "price": dish.get('price', 0),
+            "total": item_price,
+            "image_path": dish.get('image_path', '')
+        })
+    
+    return order_items, total_price
 
 # 创建新订单
 @orders_bp.route('/', methods=['POST'])
+@idempotent('orders')
 def create_order():
     try:
         data = request.json
@@ -79,41 +183,19 @@ def create_order():
         if 'items' not in data or not data['items']:
             return jsonify({"error": "订单必须包含菜品"}), 400
         
-        # 获取绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        dishes_path = os.path.join(root_dir, 'static', 'data', 'dishes.json')
-        orders_path = os.path.join(root_dir, 'static', 'data', 'orders.json')
+        # 可选的优先级，数字越大越优先
+        try:
+            priority = int(data.get('priority') or 0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "优先级必须是整数"}), 400
         
-        # 读取菜品信息来计算总价
-        dishes = read_json_file(dishes_path)
+        store = get_store()
         
         # 创建订单项并计算总价
-        order_items = []
-        total_price = 0
-        
-        for item in data['items']:
-            dish_id = item['dish_id']
-            quantity = item['quantity']
-            
-            # 查找菜品
-            dish = next((d for d in dishes if d.get('id') == dish_id), None)
-            if not dish:
-                return jsonify({"error": f"菜品ID {dish_id} 未找到"}), 400
-            
-            # 计算项目价格
-            item_price = dish.get('price', 0) * quantity
-            total_price += item_price
-            
-            # 添加订单项
-            order_items.append({
-                "dish_id": dish_id,
-                "dish_name": dish.get('name', '未知菜品'),
-                "quantity": quantity,
-                "price": dish.get('price', 0),
-                "total": item_price,
-                "image_path": dish.get('image_path', '')
-            })
+        try:
+            order_items, total_price = price_order_items(data['items'], lambda dish_id: store.get('dishes', dish_id))
+        except UnknownDish as e:
+            return jsonify({"error": str(e)}), 400
         
         # 创建新订单
         new_order = {
@@ -122,17 +204,12 @@ def create_order():
             "total_price": total_price,
             "status": "pending",  # 初始状态为待处理
             "timestamp": datetime.now().isoformat(),
-            "note": data.get('note', '')
+            "note": data.get('note', ''),
+            "priority": priority
         }
         
-        # 读取现有订单
-        orders = read_json_file(orders_path)
-        
-        # 添加新订单
-        orders.append(new_order)
-        
-        # 写入更新的订单列表
-        write_json_file(orders_path, orders)
+        # 添加新订单并写入
+        store.insert('orders', new_order)
         
         return jsonify(new_order), 201
     except Exception as e:
@@ -149,32 +226,35 @@ def update_order_status(order_id):
             return jsonify({"error": "缺少状态字段"}), 400
         
         new_status = data['status']
-        valid_statuses = ['pending', 'cooking', 'ready', 'completed', 'cancelled']
-        
-        if new_status not in valid_statuses:
-            return jsonify({"error": f"无效的状态. 有效状态: {', '.join(valid_statuses)}"}), 400
         
-        # 获取绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        orders_path = os.path.join(root_dir, 'static', 'data', 'orders.json')
+        if new_status not in ORDER_STATUSES:
+            return jsonify({"error": f"无效的状态. 有效状态: {', '.join(ORDER_STATUSES)}"}), 400
         
-        # 读取现有订单
-        orders = read_json_file(orders_path)
-        
-        # 查找要更新的订单
-        order_index = next((i for i, o in enumerate(orders) if o.get('id') == order_id), None)
-        if order_index is None:
+        store = get_store()
+        order = store.get('orders', order_id)
+        if order is None:
             return jsonify({"error": "订单未找到"}), 404
         
-        # 更新订单状态
-        orders[order_index]['status'] = new_status
-        orders[order_index]['updated_at'] = datetime.now().isoformat()
+        # 状态未变化，无需写入
+        if order.get('status') == new_status:
+            return jsonify(order)
+        
+        # 在写锁内检查状态转换是否允许，再更新状态
+        def transition(current):
+            check_transition(current.get('status'), new_status)
+            return {
+                'status': new_status,
+                'updated_at': datetime.now().isoformat()
+            }
         
-        # 写入更新的订单列表
-        write_json_file(orders_path, orders)
+        try:
+            order = store.update('orders', order_id, transition)
+        except InvalidTransition as e:
+            return jsonify({"error": str(e), "allowed": list(e.allowed)}), 409
+        if order is None:
+            return jsonify({"error": "订单未找到"}), 404
         
-        return jsonify(orders[order_index])
+        return jsonify(order)
     except Exception as e:
         print(f"更新订单状态错误: {str(e)}")
         return jsonify({"error": f"更新订单状态错误: {str(e)}"}), 500
@@ -183,25 +263,11 @@ def update_order_status(order_id):
 @orders_bp.route('/<order_id>', methods=['DELETE'])
 def delete_order(order_id):
     try:
-        # 获取绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        orders_path = os.path.join(root_dir, 'static', 'data', 'orders.json')
-        
-        # 读取现有订单
-        orders = read_json_file(orders_path)
-        
-        # 查找要删除的订单
-        order = next((o for o in orders if o.get('id') == order_id), None)
+        # 移除订单并写入
+        order = get_store().delete('orders', order_id)
         if not order:
             return jsonify({"error": "订单未找到"}), 404
         
-        # 移除订单
-        orders = [o for o in orders if o.get('id') != order_id]
-        
-        # 写入更新的订单列表
-        write_json_file(orders_path, orders)
-        
         return jsonify({"message": "订单删除成功"})
     except Exception as e:
         print(f"删除订单错误: {str(e)}")
@@ -1,88 +1,65 @@
 from flask import Blueprint, jsonify, request
-import json
-import os
 import uuid
-import base64
 from datetime import datetime
 
+from utils.data_store import get_store
+from utils.idempotency import idempotent
+from utils.image_pool import ImagePoolBusy, save_images, busy_response
+from utils.image_refs import image_location, unreferenced_images
+from utils.jobs import discard_images, shrink_images
+from utils.uploads import UploadError, claim_uploads, upload_error_response
+
 reviews_bp = Blueprint('reviews', __name__)
 
-# 读取JSON文件辅助函数
-def read_json_file(file_path):
+# 以下读接口的实现返回 (数据, 状态码)，由蓝图中的接口和 asgi.py 的异步模式共用
+
+# 所有评价
+def list_reviews():
+    try:
+        return get_store().load('reviews'), 200
+    except Exception as e:
+        print(f"获取评价错误: {str(e)}")
+        return {"error": f"获取评价错误: {str(e)}"}, 500
+
+# 某个菜品的评价
+def reviews_for_dish(dish_id):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"警告: {file_path} 无法读取或为空，返回空列表")
-        return []
+        reviews = get_store().load('reviews')
+        return [r for r in reviews if r.get('dish_id') == dish_id], 200
+    except Exception as e:
+        print(f"获取菜品评价错误: {str(e)}")
+        return {"error": f"获取菜品评价错误: {str(e)}"}, 500
 
-# 写入JSON文件辅助函数
-def write_json_file(file_path, data):
-    # 确保目录存在
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+# 某个订单的评价（兼容旧数据）
+def reviews_for_order(order_id):
+    try:
+        reviews = get_store().load('reviews')
+        return [review for review in reviews if review.get('order_id') == order_id], 200
+    except Exception as e:
+        print(f"获取订单评价错误: {str(e)}")
+        return {"error": f"获取订单评价错误: {str(e)}"}, 500
 
 # 获取所有评价
 @reviews_bp.route('/', methods=['GET'])
 def get_all_reviews():
-    try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        # 确保文件存在
-        if not os.path.exists(reviews_path):
-            os.makedirs(os.path.dirname(reviews_path), exist_ok=True)
-            with open(reviews_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-            print(f"创建新的评价文件: {reviews_path}")
-            return jsonify([])
-            
-        reviews = read_json_file(reviews_path)
-        return jsonify(reviews)
-    except Exception as e:
-        print(f"获取评价错误: {str(e)}")
-        return jsonify({"error": f"获取评价错误: {str(e)}"}), 500
+    data, status = list_reviews()
+    return jsonify(data), status
 
 # 按菜品ID获取评价
 @reviews_bp.route('/dish/<dish_id>', methods=['GET'])
 def get_reviews_by_dish(dish_id):
-    try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        reviews = read_json_file(reviews_path)
-        dish_reviews = [r for r in reviews if r.get('dish_id') == dish_id]
-        return jsonify(dish_reviews)
-    except Exception as e:
-        print(f"获取菜品评价错误: {str(e)}")
-        return jsonify({"error": f"获取菜品评价错误: {str(e)}"}), 500
+    data, status = reviews_for_dish(dish_id)
+    return jsonify(data), status
 
 # 按订单ID获取评价
 @reviews_bp.route('/order/<order_id>', methods=['GET'])
 def get_reviews_by_order_id(order_id):
-    try:
-        # 使用绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        reviews = read_json_file(reviews_path)
-        
-        # 过滤出特定订单的评价（兼容旧数据）
-        order_reviews = [review for review in reviews if review.get('order_id') == order_id]
-        
-        return jsonify(order_reviews)
-    except Exception as e:
-        print(f"获取订单评价错误: {str(e)}")
-        return jsonify({"error": f"获取订单评价错误: {str(e)}"}), 500
+    data, status = reviews_for_order(order_id)
+    return jsonify(data), status
 
 # 添加新评价
 @reviews_bp.route('/', methods=['POST'])
+@idempotent('reviews')
 def add_review():
     try:
         data = request.json
@@ -97,37 +74,27 @@ def add_review():
         if not (1 <= data['rating'] <= 5):
             return jsonify({"error": "评分必须在1-5之间"}), 400
         
-        # 获取绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        # 处理评价图片
+        # 处理评价图片（保存到当前家庭的评价图片目录）
         image_paths = []
+        reviews_img_dir, reviews_img_url = image_location('reviews')
         if 'images' in data and data['images']:
-            reviews_img_dir = os.path.join(root_dir, 'static', 'images', 'reviews')
-            os.makedirs(reviews_img_dir, exist_ok=True)
-            
-            for img_data in data['images']:
-                try:
-                    # 解码base64图片
-                    if ',' in img_data:
-                        img_data = img_data.split(',')[1]
-                    
-                    image_binary = base64.b64decode(img_data)
-                    
-                    # 生成唯一文件名
-                    filename = f"{uuid.uuid4()}.jpg"
-                    file_path = os.path.join(reviews_img_dir, filename)
-                    
-                    # 保存图片
-                    with open(file_path, 'wb') as f:
-                        f.write(image_binary)
-                    
-                    image_paths.append(f"/static/images/reviews/{filename}")
-                except Exception as e:
-                    print(f"图片处理错误: {str(e)}")
-                    return jsonify({"error": f"图片处理错误: {str(e)}"}), 400
+            # 在图片线程池中解码并保存
+            try:
+                filenames = save_images(data['images'], reviews_img_dir)
+            except ImagePoolBusy as e:
+                return busy_response(e)
+            except Exception as e:
+                print(f"图片处理错误: {str(e)}")
+                return jsonify({"error": f"图片处理错误: {str(e)}"}), 400
+            image_paths.extend(f"{reviews_img_url}{filename}" for filename in filenames)
+        
+        # 使用分块上传完成的图片
+        if data.get('upload_ids'):
+            try:
+                filenames = claim_uploads(data['upload_ids'], reviews_img_dir)
+            except UploadError as e:
+                return upload_error_response(e)
+            image_paths.extend(f"{reviews_img_url}{filename}" for filename in filenames)
         
         # 创建新评价对象
         new_review = {
@@ -141,14 +108,11 @@ def add_review():
             "user_name": data.get('user_name', '匿名用户')  # 如果未提供用户名，则使用"匿名用户"
         }
         
-        # 读取现有评价
-        reviews = read_json_file(reviews_path)
-        
-        # 添加新评价
-        reviews.append(new_review)
+        # 添加新评价并写入
+        get_store().insert('reviews', new_review)
         
-        # 写入更新的评价列表
-        write_json_file(reviews_path, reviews)
+        # 后台缩小上传的大图
+        shrink_images(image_paths)
         
         return jsonify(new_review), 201
     except Exception as e:
@@ -159,33 +123,16 @@ def add_review():
 @reviews_bp.route('/<review_id>', methods=['DELETE'])
 def delete_review(review_id):
     try:
-        # 获取绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        # 读取现有评价
-        reviews = read_json_file(reviews_path)
-        
-        # 查找要删除的评价
-        review = next((r for r in reviews if r.get('id') == review_id), None)
+        # 移除评价并写入
+        store = get_store()
+        review = store.delete('reviews', review_id)
         if not review:
             return jsonify({"error": "评价未找到"}), 404
         
-        # 删除评价关联的图片
-        for img_path in review.get('image_paths', []):
-            try:
-                full_path = os.path.join(root_dir, img_path.lstrip('/'))
-                if os.path.exists(full_path):
-                    os.remove(full_path)
-            except Exception as e:
-                print(f"删除图片时出错: {str(e)}")
-        
-        # 移除评价
-        reviews = [r for r in reviews if r.get('id') != review_id]
-        
-        # 写入更新的评价列表
-        write_json_file(reviews_path, reviews)
+        # 后台删除评价关联的图片（仍被引用的图片保留）
+        paths = unreferenced_images(store, review.get('image_paths') or [])
+        if paths:
+            discard_images(paths, key=f'review:{review_id}')
         
         return jsonify({"message": "评价删除成功"})
     except Exception as e:
@@ -198,17 +145,10 @@ def update_review(review_id):
     try:
         data = request.json
         
-        # 获取绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reviews_path = os.path.join(root_dir, 'static', 'data', 'reviews.json')
-        
-        # 读取现有评价
-        reviews = read_json_file(reviews_path)
-        
         # 查找要更新的评价
-        review_index = next((i for i, r in enumerate(reviews) if r.get('id') == review_id), None)
-        if review_index is None:
+        store = get_store()
+        review = store.get('reviews', review_id)
+        if review is None:
             return jsonify({"error": "评价未找到"}), 404
         
         # 验证评分在有效范围内
@@ -216,49 +156,49 @@ def update_review(review_id):
             return jsonify({"error": "评分必须在1-5之间"}), 400
         
         # 更新评价字段
+        changes = {}
         for key in data:
-            if key != 'id' and key != 'dish_id' and key != 'images':  # 不允许更改ID和菜品ID
-                reviews[review_index][key] = data[key]
+            if key not in ('id', 'dish_id', 'images', 'upload_ids', 'image_paths'):  # 不允许更改ID和菜品ID，图片路径只能由服务器设置
+                changes[key] = data[key]
         
-        # 处理新添加的评价图片
-        if 'images' in data and data['images']:
+        # 处理新添加的评价图片（base64图片或分块上传完成的图片）
+        if data.get('images') or data.get('upload_ids'):
             # 获取现有图片路径
-            image_paths = reviews[review_index].get('image_paths', [])
+            image_paths = list(review.get('image_paths') or [])
             
-            # 处理每个新图片
-            reviews_img_dir = os.path.join(root_dir, 'static', 'images', 'reviews')
-            os.makedirs(reviews_img_dir, exist_ok=True)
-            
-            for img_data in data['images']:
-                try:
-                    # 解码base64图片
-                    if ',' in img_data:
-                        img_data = img_data.split(',')[1]
-                    
-                    image_binary = base64.b64decode(img_data)
-                    
-                    # 生成唯一文件名
-                    filename = f"{uuid.uuid4()}.jpg"
-                    file_path = os.path.join(reviews_img_dir, filename)
-                    
-                    # 保存图片
-                    with open(file_path, 'wb') as f:
-                        f.write(image_binary)
-                    
-                    image_paths.append(f"/static/images/reviews/{filename}")
-                except Exception as e:
-                    print(f"图片处理错误: {str(e)}")
-                    return jsonify({"error": f"图片处理错误: {str(e)}"}), 400
+            # 在图片线程池中解码并保存新图片
+            reviews_img_dir, reviews_img_url = image_location('reviews')
+            try:
+                filenames = save_images(data.get('images') or [], reviews_img_dir)
+                filenames += claim_uploads(data.get('upload_ids') or [], reviews_img_dir)
+            except ImagePoolBusy as e:
+                return busy_response(e)
+            except UploadError as e:
+                return upload_error_response(e)
+            except Exception as e:
+                print(f"图片处理错误: {str(e)}")
+                return jsonify({"error": f"图片处理错误: {str(e)}"}), 400
+            image_paths.extend(f"{reviews_img_url}{filename}" for filename in filenames)
             
-            reviews[review_index]['image_paths'] = image_paths
+            changes['image_paths'] = image_paths
         
         # 更新时间戳
-        reviews[review_index]['updated_at'] = datetime.now().isoformat()
+        changes['updated_at'] = datetime.now().isoformat()
+        
+        # 写入更新的评价
+        old_paths = list(review.get('image_paths') or [])
+        review = store.update('reviews', review_id, changes)
+        if review is None:
+            return jsonify({"error": "评价未找到"}), 404
         
-        # 写入更新的评价列表
-        write_json_file(reviews_path, reviews)
+        # 后台缩小新图片，删除不再使用的图片
+        new_paths = list(review.get('image_paths') or [])
+        shrink_images([path for path in new_paths if path not in old_paths])
+        removed = unreferenced_images(store, [path for path in old_paths if path not in new_paths])
+        if removed:
+            discard_images(removed)
         
-        return jsonify(reviews[review_index])
+        return jsonify(review)
     except Exception as e:
         print(f"更新评价错误: {str(e)}")
         return jsonify({"error": f"更新评价错误: {str(e)}"}), 500
\ No newline at end of file
@@ -0,0 +1,62 @@
+from flask import Blueprint, Response, jsonify, request
+import json
+
+from utils.data_store import COLLECTIONS, get_store
+
+sync_bp = Blueprint('sync', __name__)
+
+# 每次同步默认和最多返回的修改数
+DEFAULT_SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+
+# 解析非负整数参数，格式错误时抛出 ValueError
+def int_arg(name, default):
+    value = request.args.get(name, '')
+    if value == '':
+        return default
+    value = int(value)
+    if value < 0:
+        raise ValueError(name)
+    return value
+
+# 增量同步
+# GET /api/sync?since=<上次返回的version>&limit=1000
+# 返回 {"version", "reset", "more", "changes": {集合: [记录]}, "deleted": {集合: [记录ID]}}
+# 首次同步（since=0）或 reset 为 true 时返回全部记录，客户端应先清空本地数据；
+# 增量修改按 limit 分页，more 为 true 时用新的 version 继续请求
+@sync_bp.route('', methods=['GET'])
+def sync_changes():
+    try:
+        try:
+            since = int_arg('since', 0)
+            limit = min(int_arg('limit', DEFAULT_SYNC_LIMIT), MAX_SYNC_LIMIT)
+        except ValueError:
+            return jsonify({"error": "since 和 limit 必须是非负整数"}), 400
+        if limit == 0:
+            return jsonify({"error": "limit 必须大于0"}), 400
+
+        reset, version, more, rows = get_store().changes_since(since, limit)
+
+        # 日志中保存的是记录的JSON，直接拼接，不再解析和重新序列化
+        changes = {name: [] for name in COLLECTIONS}
+        deleted = {name: [] for name in COLLECTIONS}
+        for collection, record_id, is_deleted, data in rows:
+            if collection not in changes:
+                continue
+            if is_deleted:
+                deleted[collection].append(record_id)
+            else:
+                changes[collection].append(data)
+
+        body = ''.join((
+            '{"version":', str(version),
+            ',"reset":', json.dumps(reset),
+            ',"more":', json.dumps(more),
+            ',"changes":{', ','.join(f'"{name}":[{",".join(changes[name])}]' for name in COLLECTIONS),
+            '},"deleted":', json.dumps(deleted, ensure_ascii=False),
+            '}'
+        ))
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        print(f"同步错误: {str(e)}")
+        return jsonify({"error": f"同步错误: {str(e)}"}), 500
@@ -0,0 +1,68 @@
+from flask import Blueprint, jsonify, request
+
+from utils.uploads import UploadError, upload_manager, upload_error_response
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# 创建上传会话
+# POST /api/uploads {"size": 文件字节数, "content_type": "image/jpeg"}
+@uploads_bp.route('', methods=['POST'])
+def create_upload():
+    try:
+        data = request.json or {}
+        return jsonify(upload_manager.create(data.get('size'), data.get('content_type'))), 201
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"创建上传错误: {str(e)}")
+        return jsonify({"error": f"创建上传错误: {str(e)}"}), 500
+
+# 查询上传进度，网络中断后从返回的 offset 继续上传
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    try:
+        return jsonify(upload_manager.status(upload_id))
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"查询上传错误: {str(e)}")
+        return jsonify({"error": f"查询上传错误: {str(e)}"}), 500
+
+# 上传分块
+# PUT /api/uploads/<id>?offset=N，请求体为该位置开始的原始字节
+@uploads_bp.route('/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None or offset < 0:
+            return jsonify({"error": "缺少或无效的offset参数"}), 400
+        return jsonify(upload_manager.write_chunk(upload_id, offset, request.get_data(cache=False)))
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"上传分块错误: {str(e)}")
+        return jsonify({"error": f"上传分块错误: {str(e)}"}), 500
+
+# 完成上传，之后可以在添加/修改菜品和评价时通过 upload_id 引用
+@uploads_bp.route('/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    try:
+        return jsonify(upload_manager.finalize(upload_id))
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"完成上传错误: {str(e)}")
+        return jsonify({"error": f"完成上传错误: {str(e)}"}), 500
+
+# 取消上传
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    try:
+        upload_manager.status(upload_id)
+        upload_manager.cancel(upload_id)
+        return jsonify({"message": "上传已取消"})
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"取消上传错误: {str(e)}")
+        return jsonify({"error": f"取消上传错误: {str(e)}"}), 500
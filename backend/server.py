@@ -0,0 +1,170 @@
+"""
+生产环境启动入口
+
+    python server.py --workers 4 --threads 8 --port 5000
+
+启动流程：
+1. 主进程执行 initialize_app()，从启动快照（static/data/.state.snapshot）恢复集合和索引，
+   快照过期时预加载三个数据集合并建立索引，把默认占位图读入图片缓存；
+2. 冻结垃圾回收器中已有的对象（gc.freeze），减少fork后的写时复制；
+3. 主进程监听端口后fork出多个工作进程，每个工作进程用固定大小的线程池处理请求，
+   工作进程意外退出时主进程会重新拉起；启动快照由持有快照锁的一个工作进程每 STATE_SAVE_INTERVAL 秒
+   和退出时写入，其他工作进程不重复写入。
+
+也可以使用 gunicorn（配置见 gunicorn.conf.py）：
+
+    gunicorn -c gunicorn.conf.py "server:create_app()"
+
+工作进程数和线程数可以通过命令行参数或环境变量 WEB_WORKERS / WEB_THREADS 调整。
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+from app import app, initialize_app
+from utils.data_store import save_all_states
+from utils.image_cache import image_cache
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+DEFAULT_WORKERS = int(os.environ.get('WEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+DEFAULT_THREADS = int(os.environ.get('WEB_THREADS', 4))
+DEFAULT_HOST = os.environ.get('WEB_HOST', '0.0.0.0')
+DEFAULT_PORT = int(os.environ.get('WEB_PORT', 5000))
+
+
+# 创建并预热应用（fork之前调用）
+def create_app():
+    print("初始化应用...")
+    initialize_app()
+    image_cache.preload(os.path.join(STATIC_DIR, 'images', '*', 'default-*.jpg'))
+    print("数据和默认图片已预加载")
+    # 之后fork出的工作进程不会再去扫描这些对象，共享内存页保持不变
+    gc.freeze()
+    return app
+
+
+class QuietHandler(WSGIRequestHandler):
+    """只记录错误，不逐条打印访问日志"""
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """使用共享的监听socket和固定大小线程池的WSGI服务器"""
+
+    def __init__(self, listen_socket, threads):
+        super().__init__(listen_socket.getsockname(), QuietHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listen_socket
+        host, port = listen_socket.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        self._pool.shutdown(wait=True)
+        super().server_close()
+
+
+# 工作进程主循环
+def run_worker(listen_socket, wsgi_app, threads):
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = PooledWSGIServer(listen_socket, threads)
+    server.set_app(wsgi_app)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        # 退出前写入启动快照（工作进程以 os._exit 退出，不会执行 atexit）
+        save_all_states()
+
+
+# 主进程：fork并看护工作进程
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS):
+    wsgi_app = create_app()
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((host, port))
+    listen_socket.listen(1024)
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(listen_socket, wsgi_app, threads)
+            except SystemExit as e:
+                code = e.code or 0
+            except Exception as e:
+                print(f"工作进程异常退出: {str(e)}")
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # 告知工作进程共有几个进程（调试接口在多进程时不可用）
+    os.environ['WEB_WORKER_PROCESSES'] = str(workers)
+    for _ in range(workers):
+        spawn()
+    print(f"服务已启动: http://{host}:{port} （{workers} 个工作进程 × {threads} 个线程）")
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"工作进程 {pid} 已退出，重新启动")
+            spawn()
+
+    listen_socket.close()
+    print("服务已停止")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='家庭点餐系统生产服务器')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='每个工作进程的线程数')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads)
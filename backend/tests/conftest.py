@@ -0,0 +1,68 @@
+import os
+import sys
+
+# 测试不限流、不启动定期写入启动快照的线程
+os.environ.setdefault('RATE_LIMIT', '0')
+os.environ.setdefault('STATE_SAVE_INTERVAL', '0')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import pytest
+
+from app import app as flask_app
+from utils import data_store, image_refs, jobs, uploads
+from utils.response_cache import response_cache
+
+
+@pytest.fixture
+def tmp_backend(tmp_path, monkeypatch):
+    """把数据目录、图片目录和上传暂存目录都指向临时目录，测试之间互不影响"""
+    data_dir = tmp_path / 'static' / 'data'
+    images_dir = tmp_path / 'static' / 'images'
+    monkeypatch.setattr(data_store, 'DATA_DIR', str(data_dir))
+    monkeypatch.setattr(data_store, 'TENANTS_DIR', str(data_dir / 'tenants'))
+    monkeypatch.setattr(data_store, 'tenant_registry', data_store.TenantRegistry())
+    monkeypatch.setattr(image_refs, 'IMAGES_DIR', str(images_dir))
+    monkeypatch.setattr(jobs, 'IMAGES_DIR', str(images_dir))
+    monkeypatch.setattr(jobs, 'BACKEND_DIR', str(tmp_path))
+    monkeypatch.setattr(uploads.upload_manager, 'directory', str(tmp_path / 'uploads'))
+    response_cache.clear()
+    return tmp_path
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """记录提交的后台任务而不执行: [(任务类型, 参数, 任务ID)]"""
+    calls = []
+
+    def enqueue(job_type, payload, job_id=None, delay=0):
+        calls.append((job_type, payload, job_id))
+        return job_id
+
+    monkeypatch.setattr(jobs.job_queue, 'enqueue', enqueue)
+    return calls
+
+
+@pytest.fixture
+def client(tmp_backend, enqueued):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def add_dish(client):
+    """添加菜品并返回响应中的菜品，prefix 为家庭路径前缀（如 /api/households/a）"""
+    def add(prefix='/api', **fields):
+        dish = {
+            'name': '测试菜品',
+            'category': 'hot',
+            'price': 10,
+            'description': '描述',
+            'ingredients': ['盐'],
+            'steps': ['炒']
+        }
+        dish.update(fields)
+        response = client.post(f'{prefix}/dishes/', json=dish)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()
+    return add
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+
+import pytest
+
+from utils.data_store import STATE_FILE, DataStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DataStore(str(tmp_path))
+
+
+def rewrite(store, name, records):
+    """模拟其他进程改写数据文件（保证文件戳变化）"""
+    path = store._path(name)
+    st = os.stat(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_reader_keeps_old_snapshot_while_another_thread_reparses(store):
+    store.insert('notes', {'id': 'a'})
+    old = store.snapshot('notes')
+    rewrite(store, 'notes', [{'id': 'a'}, {'id': 'b'}])
+
+    # 另一个线程正在重新解析（持有发布锁）时，读者直接使用旧快照而不等待
+    with store._publish_lock:
+        assert store.snapshot('notes') is old
+
+    assert [record['id'] for record in store.load('notes')] == ['a', 'b']
+
+
+def test_first_load_waits_for_the_file(store):
+    store.insert('notes', {'id': 'a'})
+    fresh = DataStore(store.data_dir)
+    assert [record['id'] for record in fresh.load('notes')] == ['a']
+
+
+def test_readers_do_not_wait_for_writers(store):
+    store.insert('notes', {'id': 'a'})
+    holding = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with store._lock:
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    holding.wait(5)
+    try:
+        assert store.get('notes', 'a') == {'id': 'a'}
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_snapshot_is_immutable_for_readers(store):
+    store.insert('notes', {'id': 'a'})
+    before = store.load('notes')
+    store.insert('notes', {'id': 'b'})
+    assert len(before) == 1
+    assert len(store.load('notes')) == 2
+
+
+def test_startup_state_restores_unchanged_collections(store):
+    store.insert('notes', {'id': 'a'})
+    assert store.save_state()
+
+    fresh = DataStore(store.data_dir)
+    assert fresh.load_state() == ['notes']
+    assert [record['id'] for record in fresh.load('notes')] == ['a']
+
+
+def test_startup_state_falls_back_when_file_changed(store):
+    store.insert('notes', {'id': 'a'})
+    store.save_state()
+    rewrite(store, 'notes', [{'id': 'a'}, {'id': 'b'}])
+
+    fresh = DataStore(store.data_dir)
+    assert fresh.load_state() == []
+    assert [record['id'] for record in fresh.load('notes')] == ['a', 'b']
+
+
+def test_corrupt_startup_state_is_ignored(store):
+    store.insert('notes', {'id': 'a'})
+    store.save_state()
+    path = os.path.join(store.data_dir, STATE_FILE)
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    fresh = DataStore(store.data_dir)
+    assert fresh.load_state() == []
+    assert [record['id'] for record in fresh.load('notes')] == ['a']
+
+
+def test_preload_creates_missing_and_resets_invalid_files(store):
+    with open(store._path('orders'), 'w', encoding='utf-8') as f:
+        f.write('{invalid')
+
+    store.preload()
+
+    for name in ('dishes', 'orders', 'reviews'):
+        with open(store._path(name), 'r', encoding='utf-8') as f:
+            assert json.load(f) == []
+    assert store.load('orders') == ()
+
+
+def test_failing_index_hook_does_not_fail_the_write(store, monkeypatch):
+    from utils import data_store
+
+    class FlakyIndex(data_store.CollectionIndex):
+        collection = 'notes'
+        rebuild_fails = False
+
+        def rebuild(self, records):
+            if FlakyIndex.rebuild_fails:
+                raise RuntimeError('重建失败')
+            self.ids = [record['id'] for record in records]
+
+        def on_insert(self, record):
+            raise RuntimeError('增量更新失败')
+
+    monkeypatch.setitem(data_store.INDEX_TYPES, 'flaky_notes', FlakyIndex)
+    store.index('flaky_notes')
+
+    # 增量更新失败时退回重建，写入照常成功并记入修改日志
+    store.insert('notes', {'id': 'a'})
+    assert store.index('flaky_notes').ids == ['a']
+
+    # 重建也失败时丢弃索引，下次使用时重新创建
+    FlakyIndex.rebuild_fails = True
+    store.insert('notes', {'id': 'b'})
+    assert 'flaky_notes' not in store._indexes
+    FlakyIndex.rebuild_fails = False
+    assert store.index('flaky_notes').ids == ['a', 'b']
+
+    *_, changes = store.changes_since(0, 100)
+    assert [change[1] for change in changes] == ['a', 'b']
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.data_store import get_store
+from utils.idempotency_cache import IdempotencyCache
+
+
+@pytest.fixture
+def dish(add_dish):
+    return add_dish()
+
+
+def create_order(client, dish, key, quantity=1):
+    return client.post('/api/orders/', json={'items': [{'dish_id': dish['id'], 'quantity': quantity}]},
+                       headers={'Idempotency-Key': key})
+
+
+def test_retry_replays_first_response(client, dish):
+    first = create_order(client, dish, 'key-1')
+    retry = create_order(client, dish, 'key-1')
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert len(get_store().load('orders')) == 1
+
+
+def test_different_body_with_same_key_is_rejected(client, dish):
+    assert create_order(client, dish, 'key-1').status_code == 201
+
+    response = create_order(client, dish, 'key-1', quantity=2)
+    assert response.status_code == 422
+    assert len(get_store().load('orders')) == 1
+
+
+def test_requests_without_key_are_not_deduplicated(client, dish):
+    body = {'items': [{'dish_id': dish['id'], 'quantity': 1}]}
+    client.post('/api/orders/', json=body)
+    client.post('/api/orders/', json=body)
+    assert len(get_store().load('orders')) == 2
+
+
+def test_client_errors_are_replayed(client):
+    first = client.post('/api/orders/', json={'items': []}, headers={'Idempotency-Key': 'bad'})
+    retry = client.post('/api/orders/', json={'items': []}, headers={'Idempotency-Key': 'bad'})
+    assert first.status_code == retry.status_code == 400
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_review_scope_is_separate_from_orders(client, dish):
+    assert create_order(client, dish, 'shared').status_code == 201
+    response = client.post('/api/reviews/', json={'dish_id': dish['id'], 'rating': 5, 'comment': '好吃'},
+                           headers={'Idempotency-Key': 'shared'})
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+
+
+def test_journal_survives_restart(tmp_path):
+    path = str(tmp_path / 'idempotency.jsonl')
+    IdempotencyCache(path).put('orders:k', 'fp', 201, '{"id": "1"}')
+
+    entry = IdempotencyCache(path).get('orders:k')
+    assert entry['fingerprint'] == 'fp'
+    assert entry['status'] == 201
+    assert entry['body'] == '{"id": "1"}'
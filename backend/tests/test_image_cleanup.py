@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from utils import jobs
+
+
+@pytest.fixture
+def upload(client):
+    """完成一个分块上传，返回上传ID"""
+    def create(prefix='/api'):
+        upload_id = client.post(f'{prefix}/uploads', json={'size': 3}).get_json()['upload_id']
+        client.put(f'{prefix}/uploads/{upload_id}?offset=0', data=b'jpg')
+        client.post(f'{prefix}/uploads/{upload_id}/finalize')
+        return upload_id
+    return create
+
+
+def delete_jobs(enqueued):
+    return [(payload, job_id) for job_type, payload, job_id in enqueued if job_type == 'delete_images']
+
+
+def image_file(tmp_backend, web_path):
+    return os.path.join(str(tmp_backend), web_path.lstrip('/'))
+
+
+def test_deleting_review_deletes_its_images(client, add_dish, upload, enqueued, tmp_backend):
+    dish = add_dish()
+    review = client.post('/api/reviews/', json={'dish_id': dish['id'], 'rating': 5, 'comment': '好',
+                                                'upload_ids': [upload()]}).get_json()
+    path = review['image_paths'][0]
+    assert os.path.exists(image_file(tmp_backend, path))
+
+    assert client.delete(f"/api/reviews/{review['id']}").status_code == 200
+    [(payload, job_id)] = delete_jobs(enqueued)
+    assert payload == {'paths': [path], 'tenant': 'default'}
+    assert job_id == f"delete_images:default:review:{review['id']}"
+
+    jobs.delete_images(payload)
+    assert not os.path.exists(image_file(tmp_backend, path))
+
+
+def test_client_cannot_point_review_at_other_images(client, add_dish, upload, enqueued, tmp_backend):
+    victim = add_dish(upload_id=upload())
+    review = client.post('/api/reviews/', json={'dish_id': victim['id'], 'rating': 4, 'comment': '一般'}).get_json()
+
+    response = client.put(f"/api/reviews/{review['id']}", json={'image_paths': [victim['image_path']]})
+    assert response.get_json()['image_paths'] == []
+
+    client.delete(f"/api/reviews/{review['id']}")
+    assert delete_jobs(enqueued) == []
+    updated = client.put(f"/api/dishes/{victim['id']}", json={'image_path': '/static/images/x.jpg'}).get_json()
+    assert updated['image_path'] == victim['image_path']
+
+
+def test_image_still_used_by_an_order_is_kept(client, add_dish, upload, enqueued):
+    dish = add_dish(upload_id=upload())
+    client.post('/api/orders/', json={'items': [{'dish_id': dish['id'], 'quantity': 1}]})
+
+    client.delete(f"/api/dishes/{dish['id']}")
+    assert delete_jobs(enqueued) == []
+
+
+def test_replaced_dish_image_is_deleted(client, add_dish, upload, enqueued):
+    dish = add_dish(upload_id=upload())
+    updated = client.put(f"/api/dishes/{dish['id']}", json={'upload_id': upload()}).get_json()
+    assert updated['image_path'] != dish['image_path']
+
+    [(payload, _)] = delete_jobs(enqueued)
+    assert payload['paths'] == [dish['image_path']]
+
+
+def test_default_images_are_never_queued(client, add_dish, enqueued):
+    dish = add_dish()
+    assert dish['image_path'] == '/static/images/dishes/default-hot.jpg'
+    client.delete(f"/api/dishes/{dish['id']}")
+    assert delete_jobs(enqueued) == []
+
+
+def test_delete_job_only_touches_its_households_images(client, add_dish, upload, tmp_backend):
+    dish = add_dish('/api/households/a', upload_id=upload('/api/households/a'))
+    path = image_file(tmp_backend, dish['image_path'])
+
+    # 其他家庭（包括默认家庭）的任务不会删除该家庭的图片
+    jobs.delete_images({'paths': [dish['image_path']], 'tenant': 'b'})
+    jobs.delete_images({'paths': [dish['image_path']]})
+    assert os.path.exists(path)
+
+    jobs.delete_images({'paths': [dish['image_path']], 'tenant': 'a'})
+    assert not os.path.exists(path)
+
+
+def test_delete_job_ignores_paths_outside_image_dirs(tmp_backend):
+    default_image = os.path.join(str(tmp_backend), 'static', 'images', 'dishes', 'default-hot.jpg')
+    os.makedirs(os.path.dirname(default_image))
+    with open(default_image, 'wb') as f:
+        f.write(b'jpg')
+
+    jobs.delete_images({'paths': ['/static/images/dishes/default-hot.jpg',
+                                  '/static/images/dishes/../../data/dishes.json',
+                                  '/etc/passwd']})
+    assert os.path.exists(default_image)
@@ -0,0 +1,69 @@
+import pytest
+
+
+@pytest.fixture
+def menu(client, add_dish):
+    """四道菜：两道有评价（平均5分和2分），两道没有评价"""
+    dishes = {
+        'soup': add_dish(name='汤', category='hot', price=12),
+        'steak': add_dish(name='牛排', category='hot', price=88),
+        'salad': add_dish(name='沙拉', category='cold', price=25),
+        'cake': add_dish(name='蛋糕', category='dessert', price=30)
+    }
+    for name, rating in (('soup', 5), ('salad', 2)):
+        response = client.post('/api/reviews/', json={'dish_id': dishes[name]['id'], 'rating': rating, 'comment': '评价'})
+        assert response.status_code == 201
+    return dishes
+
+
+def filter_names(client, query):
+    response = client.get(f'/api/dishes/filter?{query}')
+    assert response.status_code == 200, response.get_json()
+    return [dish['name'] for dish in response.get_json()['dishes']]
+
+
+def test_category_and_price_range(client, menu):
+    assert filter_names(client, 'category=hot') == ['汤', '牛排']
+    assert filter_names(client, 'category=hot,cold&max_price=50') == ['汤', '沙拉']
+    assert filter_names(client, 'min_price=20&max_price=50') == ['沙拉', '蛋糕']
+
+
+def test_rating_filters(client, menu):
+    assert filter_names(client, 'min_rating=4') == ['汤']
+    assert filter_names(client, 'has_reviews=1') == ['汤', '沙拉']
+    assert filter_names(client, 'has_reviews=0') == ['蛋糕', '牛排']
+
+
+def test_min_rating_and_has_reviews_combine(client, menu):
+    assert filter_names(client, 'min_rating=1&has_reviews=1') == ['汤', '沙拉']
+    response = client.get('/api/dishes/filter?min_rating=1&has_reviews=0')
+    assert response.status_code == 400
+
+
+def test_repeated_categories_count_once(client, menu):
+    once = client.get('/api/dishes/filter?category=hot').get_json()
+    repeated = client.get('/api/dishes/filter?category=hot,HOT,hot').get_json()
+    assert repeated['total'] == once['total'] == 2
+    assert repeated['facets'] == once['facets']
+
+
+def test_facet_counts_ignore_their_own_condition(client, menu):
+    facets = client.get('/api/dishes/filter?category=hot&max_price=50').get_json()['facets']
+    # 分类计数只受价格条件限制
+    assert facets['category']['hot'] == 1
+    assert facets['category']['cold'] == 1
+    assert facets['category']['dessert'] == 1
+    # 价格区间计数只受分类条件限制
+    counts = {bucket['min']: bucket['count'] for bucket in facets['price']}
+    assert counts == {0: 1, 20: 0, 50: 1, 100: 0}
+
+
+def test_sort_orders(client, menu):
+    assert filter_names(client, 'category=hot&sort=-price') == ['牛排', '汤']
+    assert filter_names(client, 'has_reviews=1&sort=rating') == ['汤', '沙拉']
+
+
+def test_invalid_arguments(client, menu):
+    assert client.get('/api/dishes/filter?min_price=abc').status_code == 400
+    assert client.get('/api/dishes/filter?has_reviews=maybe').status_code == 400
+    assert client.get('/api/dishes/filter?sort=name').status_code == 400
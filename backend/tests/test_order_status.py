@@ -0,0 +1,60 @@
+import pytest
+
+
+@pytest.fixture
+def order(client, add_dish):
+    dish = add_dish()
+    response = client.post('/api/orders/', json={'items': [{'dish_id': dish['id'], 'quantity': 1}]})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def set_status(client, order_id, status):
+    return client.put(f'/api/orders/{order_id}/status', json={'status': status})
+
+
+def test_allowed_transitions(client, order):
+    for status in ('cooking', 'ready', 'completed'):
+        response = set_status(client, order['id'], status)
+        assert response.status_code == 200
+        assert response.get_json()['status'] == status
+
+
+@pytest.mark.parametrize('final, target', [
+    ('completed', 'cooking'),
+    ('completed', 'pending'),
+    ('cancelled', 'pending'),
+    ('cancelled', 'completed')
+])
+def test_finished_order_cannot_change(client, order, final, target):
+    assert set_status(client, order['id'], final).status_code == 200
+
+    response = set_status(client, order['id'], target)
+    assert response.status_code == 409
+    assert response.get_json()['allowed'] == []
+    assert client.get(f"/api/orders/{order['id']}").get_json()['status'] == final
+
+
+def test_ready_cannot_go_back_to_pending(client, order):
+    assert set_status(client, order['id'], 'ready').status_code == 200
+
+    response = set_status(client, order['id'], 'pending')
+    assert response.status_code == 409
+    assert set(response.get_json()['allowed']) == {'cooking', 'completed', 'cancelled'}
+
+
+def test_same_status_is_not_a_transition(client, order):
+    assert set_status(client, order['id'], 'completed').status_code == 200
+    assert set_status(client, order['id'], 'completed').status_code == 200
+
+
+def test_invalid_status_and_unknown_order(client, order):
+    assert set_status(client, order['id'], 'eaten').status_code == 400
+    assert set_status(client, 'missing', 'cooking').status_code == 404
+
+
+def test_status_counts_follow_transitions(client, order):
+    set_status(client, order['id'], 'cancelled')
+    summary = client.get('/api/orders/summary').get_json()
+    assert summary['cancelled'] == 1
+    assert summary['pending'] == 0
@@ -0,0 +1,57 @@
+import os
+
+from utils import data_store
+
+
+def names(client, prefix):
+    return sorted(dish['name'] for dish in client.get(f'{prefix}/dishes/').get_json())
+
+
+def test_households_do_not_see_each_other(client, add_dish):
+    add_dish('/api/households/a', name='甲家的菜')
+    add_dish('/api/households/b', name='乙家的菜')
+
+    assert names(client, '/api/households/a') == ['甲家的菜']
+    assert names(client, '/api/households/b') == ['乙家的菜']
+    assert os.path.isdir(os.path.join(data_store.TENANTS_DIR, 'a'))
+    assert os.path.isdir(os.path.join(data_store.TENANTS_DIR, 'b'))
+
+
+def test_default_household_is_separate(client, add_dish):
+    dish = add_dish('/api/households/a', name='甲家的菜')
+    assert client.get(f"/api/dishes/{dish['id']}").status_code == 404
+    assert client.get(f"/api/households/a/dishes/{dish['id']}").status_code == 200
+
+
+def test_unknown_household_reads_404_without_creating_it(client):
+    assert client.get('/api/households/nobody/dishes/').status_code == 404
+    assert client.get('/api/households/nobody/orders/').status_code == 404
+    assert not os.path.exists(os.path.join(data_store.TENANTS_DIR, 'nobody'))
+
+
+def test_invalid_household_id(client):
+    assert client.post('/api/households/bad.id/dishes/', json={}).status_code == 404
+
+
+def test_idempotency_keys_are_per_household(client, add_dish):
+    for household in ('a', 'b'):
+        dish = add_dish(f'/api/households/{household}')
+        response = client.post(f'/api/households/{household}/orders/',
+                               json={'items': [{'dish_id': dish['id'], 'quantity': 1}]},
+                               headers={'Idempotency-Key': 'same-key'})
+        assert response.status_code == 201
+        assert 'Idempotent-Replayed' not in response.headers
+
+    for household in ('a', 'b'):
+        assert len(client.get(f'/api/households/{household}/orders/').get_json()) == 1
+
+
+def test_uploaded_images_are_stored_per_household(client, add_dish, tmp_backend):
+    upload = client.post('/api/households/a/uploads', json={'size': 3}).get_json()
+    url = f"/api/households/a/uploads/{upload['upload_id']}"
+    client.put(f'{url}?offset=0', data=b'abc')
+    client.post(f'{url}/finalize')
+
+    dish = add_dish('/api/households/a', upload_id=upload['upload_id'])
+    assert dish['image_path'].startswith('/static/images/households/a/dishes/')
+    assert os.path.exists(os.path.join(str(tmp_backend), dish['image_path'].lstrip('/')))
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from utils import uploads
+from utils.uploads import UploadError, UploadManager, claim_uploads
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return UploadManager(str(tmp_path / 'staging'))
+
+
+def test_resume_from_reported_offset(manager):
+    data = os.urandom(1000)
+    upload_id = manager.create(len(data))['upload_id']
+    manager.write_chunk(upload_id, 0, data[:400])
+
+    # 连接中断后查询进度，从返回的偏移量继续
+    offset = manager.status(upload_id)['offset']
+    assert offset == 400
+    state = manager.write_chunk(upload_id, offset, data[offset:])
+    assert state['offset'] == 1000
+
+    assert manager.finalize(upload_id)['complete']
+    target = manager.directory + '-out'
+    filename = manager.claim(upload_id, target)
+    with open(os.path.join(target, filename), 'rb') as f:
+        assert f.read() == data
+
+
+def test_retried_chunk_is_not_appended_twice(manager):
+    upload_id = manager.create(10)['upload_id']
+    manager.write_chunk(upload_id, 0, b'abcdef')
+    # 重发的分块与已接收的部分重叠，只追加新数据
+    assert manager.write_chunk(upload_id, 0, b'abcdef')['offset'] == 6
+    assert manager.write_chunk(upload_id, 4, b'efghij')['offset'] == 10
+    with open(os.path.join(manager.directory, f'{upload_id}.part'), 'rb') as f:
+        assert f.read() == b'abcdefghij'
+
+
+def test_gap_reports_current_offset(manager):
+    upload_id = manager.create(10)['upload_id']
+    manager.write_chunk(upload_id, 0, b'abc')
+    with pytest.raises(UploadError) as e:
+        manager.write_chunk(upload_id, 5, b'fgh')
+    assert e.value.status == 409
+    assert e.value.offset == 3
+
+
+def test_finalize_requires_all_bytes(manager):
+    upload_id = manager.create(10)['upload_id']
+    manager.write_chunk(upload_id, 0, b'abc')
+    with pytest.raises(UploadError) as e:
+        manager.finalize(upload_id)
+    assert e.value.status == 409
+    assert e.value.offset == 3
+
+
+def test_oversized_chunk_is_rejected(manager):
+    upload_id = manager.create(5)['upload_id']
+    with pytest.raises(UploadError) as e:
+        manager.write_chunk(upload_id, 0, b'abcdef')
+    assert e.value.status == 413
+
+
+def test_unknown_session(manager):
+    with pytest.raises(UploadError) as e:
+        manager.write_chunk('not-a-uuid', 0, b'x')
+    assert e.value.status == 404
+    with pytest.raises(UploadError):
+        manager.status('6b0d4f0e-7d6f-4b3a-9c47-1f7f0a7c2f55')
+
+
+def test_sweep_removes_expired_sessions(tmp_path):
+    manager = UploadManager(str(tmp_path / 'staging'), ttl=-1)
+    manager.create(10)
+    assert manager.sweep(force=True) == 1
+    assert os.listdir(manager.directory) == []
+
+
+def test_failed_claim_restores_earlier_uploads(manager, monkeypatch):
+    monkeypatch.setattr(uploads, 'upload_manager', manager)
+    ids = []
+    for _ in range(2):
+        upload_id = manager.create(3)['upload_id']
+        manager.write_chunk(upload_id, 0, b'abc')
+        manager.finalize(upload_id)
+        ids.append(upload_id)
+
+    claim = manager.claim
+
+    def failing_claim(upload_id, directory, filename=None):
+        if upload_id == ids[1]:
+            raise OSError('磁盘已满')
+        return claim(upload_id, directory, filename)
+
+    monkeypatch.setattr(manager, 'claim', failing_claim)
+    target = manager.directory + '-out'
+    with pytest.raises(OSError):
+        claim_uploads(ids, target)
+
+    assert os.listdir(target) == []
+    assert all(manager.status(upload_id)['complete'] for upload_id in ids)
+
+
+def test_chunked_upload_over_http(client):
+    data = os.urandom(3000)
+    upload = client.post('/api/uploads', json={'size': len(data)}).get_json()
+    url = f"/api/uploads/{upload['upload_id']}"
+
+    assert client.put(f'{url}?offset=0', data=data[:1000]).get_json()['offset'] == 1000
+    response = client.put(f'{url}?offset=2000', data=data[2000:])
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 1000
+
+    offset = client.get(url).get_json()['offset']
+    assert client.put(f'{url}?offset={offset}', data=data[offset:]).get_json()['offset'] == len(data)
+    assert client.post(f'{url}/finalize').get_json()['complete']
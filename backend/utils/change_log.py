@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from .models import encode_record
+
+# 删除记录（墓碑）的保留时间（秒），更早删除的记录不再单独同步，落后太多的客户端需要全量同步
+TOMBSTONE_RETENTION_SECONDS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 30)) * 24 * 3600
+
+# 清理墓碑的最短间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+class ChangeLog:
+    """
+    数据修改日志（数据目录下的SQLite表，多个工作进程共享）
+
+    每条记录只保留最新的一行：集合、记录ID、版本号、是否已删除和当时的记录内容（JSON）。
+    每次修改分配一个递增的版本号，客户端保存上次同步到的版本号，之后只取版本号更大的行。
+    版本号低于 horizon 的客户端（日志重建过或所需的墓碑已被清理）需要丢弃本地数据重新全量同步。
+    写入由数据仓库在跨进程写锁内调用，版本号的分配顺序与文件的写入顺序一致。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0
+
+    def _connect(self):
+        # 每个线程一个连接；fork 后的子进程重新连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS changes (
+                    collection TEXT NOT NULL,
+                    record_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    deleted INTEGER NOT NULL,
+                    data TEXT,
+                    changed_at REAL NOT NULL,
+                    PRIMARY KEY (collection, record_id)
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS changes_version ON changes (version)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _meta(conn, key, default=0):
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _write(self, changes, seeding=False):
+        """
+        在一个事务中写入修改，返回最新的版本号
+
+        changes 为 (集合, 记录ID, 记录) 的列表，记录为None表示删除。
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = self._meta(conn, 'version')
+            for collection, record_id, record in changes:
+                version += 1
+                data = None if record is None else json.dumps(
+                    record, ensure_ascii=False, separators=(',', ':'), default=encode_record)
+                conn.execute('INSERT OR REPLACE INTO changes (collection, record_id, version, deleted, data, changed_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (collection, str(record_id), version, int(record is None), data, now))
+            self._set_meta(conn, 'version', version)
+            if seeding:
+                self._set_meta(conn, 'horizon', version)
+                self._set_meta(conn, 'seeded', 1)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return version
+
+    def record(self, changes):
+        """记录一批修改；写入失败时标记日志需要重建，客户端下次同步时全量同步"""
+        if not changes:
+            return
+        try:
+            self._write(changes)
+        except Exception as e:
+            print(f"写入修改日志失败，日志将被重建: {str(e)}")
+            try:
+                self._set_meta(self._connect(), 'seeded', 0)
+            except Exception:
+                pass
+
+    def seeded(self):
+        return bool(self._meta(self._connect(), 'seeded'))
+
+    def seed(self, collections):
+        """
+        用集合的当前内容重建日志（首次使用或写入失败后），在数据仓库的写锁内调用
+
+        之前的版本号都失效：日志中已不存在的记录写为墓碑，其余记录以新的版本号重新写入。
+        """
+        conn = self._connect()
+        changes = []
+        for collection, records in collections.items():
+            ids = {str(record.get('id')) for record in records if record.get('id') is not None}
+            for (record_id,) in conn.execute('SELECT record_id FROM changes WHERE collection = ? AND deleted = 0',
+                                             (collection,)):
+                if record_id not in ids:
+                    changes.append((collection, record_id, None))
+            changes.extend((collection, record.get('id'), record) for record in records
+                           if record.get('id') is not None)
+        self._write(changes, seeding=True)
+
+    def _purge(self):
+        """清理过期的墓碑，被清理的最大版本号之前的客户端需要全量同步"""
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cutoff = now - TOMBSTONE_RETENTION_SECONDS
+            purged = conn.execute('SELECT MAX(version) FROM changes WHERE deleted = 1 AND changed_at < ?',
+                                  (cutoff,)).fetchone()[0]
+            if purged is not None:
+                conn.execute('DELETE FROM changes WHERE deleted = 1 AND changed_at < ?', (cutoff,))
+                self._set_meta(conn, 'horizon', max(purged, self._meta(conn, 'horizon')))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def since(self, version, limit):
+        """
+        版本号大于 version 的修改，最多 limit 条（按版本号升序）
+
+        返回 (是否需要全量同步, 本页最后的版本号, 是否还有更多, 行列表)，
+        行为 (集合, 记录ID, 是否已删除, 记录JSON)。
+        需要全量同步时一次返回所有未删除的记录（不分页），版本号为当前最新版本。
+        """
+        self._purge()
+        conn = self._connect()
+        # 在一个读事务中读取，版本号和各行处于同一个时刻
+        conn.execute('BEGIN')
+        try:
+            latest = self._meta(conn, 'version')
+            reset = version <= 0 or version < self._meta(conn, 'horizon') or version > latest
+            if reset:
+                rows = conn.execute('SELECT collection, record_id, deleted, data, version FROM changes '
+                                    'WHERE deleted = 0 ORDER BY version').fetchall()
+                limit = len(rows)
+            else:
+                rows = conn.execute('SELECT collection, record_id, deleted, data, version FROM changes '
+                                    'WHERE version > ? ORDER BY version LIMIT ?', (version, limit + 1)).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1][4] if more else latest
+        return reset, last, more, [row[:4] for row in rows]
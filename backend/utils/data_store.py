@@ -0,0 +1,810 @@
+import os
+import re
+import json
+import mmap
+import queue
+import pickle
+import struct
+import time
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只做进程内的串行化
+    fcntl = None
+
+from flask import g, has_request_context
+
+from .models import COLLECTION_MODELS, decode_records, encode_record
+from .change_log import ChangeLog
+from .idempotency_cache import IdempotencyCache
+
+# 数据目录（backend/static/data）
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'data')
+
+# 各家庭的数据目录（static/data/tenants/<家庭ID>/）
+TENANTS_DIR = os.path.join(DATA_DIR, 'tenants')
+
+# 默认家庭直接使用 static/data，兼容单家庭部署
+DEFAULT_TENANT = 'default'
+
+# 家庭ID格式
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# 内存中最多保留的家庭数据量（按JSON文件大小估算）和家庭数
+TENANT_CACHE_BYTES = int(os.environ.get('TENANT_CACHE_BYTES', 256 * 1024 * 1024))
+TENANT_CACHE_MAX = int(os.environ.get('TENANT_CACHE_MAX', 256))
+
+# 解析后的Python对象大约是JSON文本大小的倍数，用于估算内存占用
+MEMORY_FACTOR = 4
+
+# 写入线程每批最多合并的修改数，以及空闲多久后退出（秒）
+MAX_BATCH = 256
+WRITER_IDLE_SECONDS = 5
+
+# 全进程唯一递增的版本号，家庭数据被淘汰后重新加载也不会与旧版本号重复
+_version_counter = itertools.count(1)
+
+# 系统管理的数据集合
+COLLECTIONS = ('dishes', 'orders', 'reviews')
+
+# 已注册的派生索引: 索引名 -> 索引类
+INDEX_TYPES = {}
+
+# 启动快照：已解析的集合和派生索引的二进制副本（数据目录下），启动时与JSON文件核对后直接载入
+STATE_FILE = '.state.snapshot'
+STATE_MAGIC = b'FOSSTATE'
+
+# 启动快照格式版本，记录模型或索引的结构变化时递增，旧版本的启动快照会被忽略
+STATE_FORMAT = 1
+
+# 文件头：魔数、格式版本、内容的SHA-256
+_STATE_HEADER = struct.Struct(f'>{len(STATE_MAGIC)}sI32s')
+
+# 修改日志（数据目录下，供增量同步使用）
+CHANGES_FILE = 'changes.sqlite3'
+
+# 幂等键日志（数据目录下，见 idempotency.py）
+IDEMPOTENCY_FILE = 'idempotency.jsonl'
+
+# 定期写入启动快照的间隔（秒），0 表示只在关闭时写入
+STATE_SAVE_INTERVAL = int(os.environ.get('STATE_SAVE_INTERVAL', 300))
+
+
+def register_index(name):
+    """注册派生索引的类装饰器，数据仓库会按需创建索引实例并保持同步"""
+    def decorator(cls):
+        INDEX_TYPES[name] = cls
+        return cls
+    return decorator
+
+
+class CollectionIndex:
+    """
+    派生索引基类
+
+    集合被整体加载（启动或其他进程改写了文件）时调用 rebuild；
+    本进程内的单条写入调用 on_insert / on_update / on_delete 做增量维护。
+    这些方法都在数据仓库的发布锁内调用，与新快照的发布同步进行。
+    """
+
+    # 索引所依赖的集合
+    collection = None
+
+    def rebuild(self, records):
+        raise NotImplementedError
+
+    def on_insert(self, record):
+        raise NotImplementedError
+
+    def on_update(self, old, new):
+        raise NotImplementedError
+
+    def on_delete(self, old):
+        raise NotImplementedError
+
+    # 写入启动快照时不保存锁，载入后重新创建
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class Snapshot:
+    """
+    集合在某个版本的不可变快照
+
+    记录为元组，按ID的索引在发布后不再修改。写入时生成新快照并整体替换引用，
+    读者拿到的快照在使用期间保持不变，不需要加锁。
+    """
+
+    __slots__ = ('records', 'by_id', 'stamp', 'version')
+
+    def __init__(self, records, stamp):
+        self.records = tuple(records)
+        self.by_id = {r.get('id'): r for r in self.records}
+        self.stamp = stamp  # 生成快照时文件的 (mtime_ns, size)
+        self.version = next(_version_counter)
+
+
+class _WorkingSet:
+    """一个写入批次内某个集合的工作副本，按顺序应用修改并记录索引事件"""
+
+    def __init__(self, name, records):
+        self.name = name
+        self.model = COLLECTION_MODELS.get(name)
+        self.records = list(records)
+        self.positions = {r.get('id'): i for i, r in enumerate(self.records)}
+        self.has_deletes = False
+        self.replaced = False
+        self.dirty = False
+        self.events = []  # (索引钩子, 参数)
+        self.removed_ids = set()  # 整体替换时被移除的记录ID
+
+    def insert(self, record):
+        if self.model is not None:
+            record = self.model.from_dict(record)
+        self.positions[record.get('id')] = len(self.records)
+        self.records.append(record)
+        self.events.append(('on_insert', (record,)))
+        self.dirty = True
+        return record
+
+    def insert_many(self, records, skip_existing=False):
+        inserted = 0
+        for record in records:
+            if skip_existing and record.get('id') in self.positions:
+                continue
+            self.insert(record)
+            inserted += 1
+        return inserted
+
+    def update(self, record_id, changes):
+        position = self.positions.get(record_id)
+        if position is None:
+            return None
+        old = self.records[position]
+        if callable(changes):
+            changes = changes(old)
+        updated = dict(old)
+        updated.update(changes)
+        if self.model is not None:
+            updated = self.model.from_dict(updated)
+        self.records[position] = updated
+        self.events.append(('on_update', (old, updated)))
+        self.dirty = True
+        return updated
+
+    def delete(self, record_id):
+        position = self.positions.pop(record_id, None)
+        if position is None:
+            return None
+        removed = self.records[position]
+        self.records[position] = None
+        self.has_deletes = True
+        self.events.append(('on_delete', (removed,)))
+        self.dirty = True
+        return removed
+
+    def replace(self, records):
+        # 替换前存在过的记录（包括本批次中已删除的）
+        old_ids = self.removed_ids | set(self.positions) | {args[-1].get('id') for _, args in self.events}
+        self.__init__(self.name, decode_records(self.name, records))
+        self.removed_ids = old_ids - set(self.positions)
+        self.replaced = True
+        self.dirty = True
+
+    def result(self):
+        if self.has_deletes:
+            return [r for r in self.records if r is not None]
+        return self.records
+
+    def changes(self):
+        """本批次修改过的记录: [(集合, 记录ID, 最新记录或None表示已删除)]，同一条记录只保留最后的状态"""
+        latest = {}
+        if self.replaced:
+            for record_id in self.removed_ids:
+                latest[record_id] = None
+            for record in self.result():
+                latest[record.get('id')] = record
+        for hook, args in self.events:
+            record = args[-1]
+            latest.pop(record.get('id'), None)
+            latest[record.get('id')] = None if hook == 'on_delete' else record
+        return [(self.name, record_id, record) for record_id, record in latest.items() if record_id is not None]
+
+
+class DataStore:
+    """
+    内存数据仓库
+
+    把 dishes/orders/reviews 三个JSON文件解析后以紧凑记录（见 models.py）缓存在内存中，并维护按ID的索引。
+    每次读取只做一次 os.stat 检查文件是否被其他进程改写，改写过才重新解析，
+    因此多个工作进程共享同一组文件时数据仍然一致。
+
+    每个集合以不可变快照（Snapshot）发布，读取只取当前快照的引用，不需要加锁，
+    也不会等待正在进行的写入；修改必须通过 insert/update/delete/replace 完成，
+    写入线程在副本上应用修改，写盘后原子地发布新快照（写时复制）。
+
+    修改采用组提交：请求线程把修改放入队列后等待结果，后台写入线程一次取出所有排队的修改，
+    按顺序应用后每个集合只写一次文件并 fsync，然后通知各请求完成。
+    并发写入越多，每次写盘合并的修改越多。跨进程的写入通过数据目录下的文件锁串行化。
+    每批修改写盘后同时记入修改日志（change_log.py），供增量同步接口使用。
+    幂等键缓存（idempotency_cache.py）同样按数据目录保存，随数据仓库一起淘汰。
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self._lock = threading.RLock()          # 写入锁，写入线程提交一批修改期间持有
+        self._publish_lock = threading.Lock()   # 发布快照和维护派生索引时持有，时间很短
+        self._snapshots = {}  # 集合名 -> 当前快照
+        self._invalid = set() # 最近一次解析时内容不是有效JSON的集合
+        self._indexes = {}    # 索引名 -> 索引实例
+        self._pending = queue.Queue()  # 待写入的修改
+        self._writer = None            # 后台写入线程
+        self._writer_lock = threading.Lock()
+        self._saved_versions = None    # 上次写入启动快照时各集合的版本号
+        self._state_owner = None       # (进程ID, 启动快照锁文件)：本进程负责写入该数据目录的启动快照
+        self.change_log = ChangeLog(os.path.join(data_dir, CHANGES_FILE))
+        self.idempotency = IdempotencyCache(os.path.join(data_dir, IDEMPOTENCY_FILE))
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, f'{name}.json')
+
+    def _stat(self, name):
+        try:
+            st = os.stat(self._path(name))
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _read(self, name):
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError:
+            print(f"警告: {name}.json 包含无效的JSON，返回空列表")
+            self._invalid.add(name)
+            return []
+        self._invalid.discard(name)
+        return decode_records(name, data) if isinstance(data, list) else []
+
+    def _collection_indexes(self, name):
+        return [(index_name, index) for index_name, index in self._indexes.items() if index.collection == name]
+
+    def _rebuild_index(self, index_name, index, name):
+        """重建索引；重建也失败时丢弃该索引，下次使用时重新创建"""
+        try:
+            index.rebuild(self._snapshots[name].records)
+        except Exception as e:
+            print(f"重建索引 {index_name} 失败，已丢弃: {str(e)}")
+            self._indexes.pop(index_name, None)
+
+    def _rebuild_indexes(self, name):
+        for index_name, index in self._collection_indexes(name):
+            self._rebuild_index(index_name, index, name)
+
+    def _notify(self, name, hook, *args):
+        """增量维护索引，出错时退回整体重建"""
+        for index_name, index in self._collection_indexes(name):
+            try:
+                getattr(index, hook)(*args)
+            except Exception as e:
+                print(f"索引 {index_name} 增量更新失败，重建索引: {str(e)}")
+                self._rebuild_index(index_name, index, name)
+
+    def _update_indexes(self, name, ws):
+        """按本次写入更新派生索引（不会抛出异常，出错的索引会被重建或丢弃）"""
+        if ws.replaced:
+            self._rebuild_indexes(name)
+        else:
+            for hook, args in ws.events:
+                self._notify(name, hook, *args)
+
+    def snapshot(self, name, wait=False):
+        """
+        获取集合的当前快照
+
+        文件被其他进程改写时重新解析。已有旧快照时只由一个线程解析，
+        其余读者继续使用旧快照而不等待；只有首次加载时才需要等待。
+        wait=True 时总是等待并返回与文件一致的快照（写入线程在跨进程写锁内使用）。
+        """
+        snap = self._snapshots.get(name)
+        if snap is not None and snap.stamp == self._stat(name):
+            return snap
+        if snap is None or wait:
+            self._publish_lock.acquire()
+        elif not self._publish_lock.acquire(blocking=False):
+            return snap
+        try:
+            snap = self._snapshots.get(name)
+            # 先取文件戳再读取，读取期间文件被替换时下次读取会再次发现变化
+            stamp = self._stat(name)
+            if snap is None or snap.stamp != stamp:
+                snap = self._snapshots[name] = Snapshot(self._read(name), stamp)
+                self._rebuild_indexes(name)
+            return snap
+        finally:
+            self._publish_lock.release()
+
+    def _write_temp(self, name, records):
+        """把记录写入临时文件并 fsync，返回临时文件路径（由 _install 替换正式文件）"""
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, indent=4, ensure_ascii=False, default=encode_record)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _install(self, name, tmp_path):
+        """用临时文件原子地替换正式文件，返回新的文件戳"""
+        os.replace(tmp_path, self._path(name))
+        return self._stat(name)
+
+    def _write(self, name, records):
+        """原子写入：先写临时文件并 fsync 再替换，避免读到写了一半或掉电丢失的文件，返回新的文件戳"""
+        stamp = self._install(name, self._write_temp(name, records))
+        _fsync_dir(self.data_dir)
+        return stamp
+
+    @contextmanager
+    def _process_lock(self):
+        """跨进程写锁"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(os.path.join(self.data_dir, '.write.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _submit(self, op, name, *args):
+        """把修改交给写入线程并等待其写盘完成，返回修改结果"""
+        future = Future()
+        with self._writer_lock:
+            self._pending.put((op, name, args, future))
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, name='data-store-writer', daemon=True)
+                self._writer.start()
+        return future.result()
+
+    def _writer_loop(self):
+        while True:
+            try:
+                batch = [self._pending.get(timeout=WRITER_IDLE_SECONDS)]
+            except queue.Empty:
+                with self._writer_lock:
+                    if self._pending.empty():
+                        self._writer = None
+                        return
+                continue
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit_batch(self, batch):
+        """按顺序应用一批修改，每个集合写一次文件"""
+        outcomes = []
+        with self._lock, self._process_lock():
+            working = {}
+            for op, name, args, future in batch:
+                if name not in working:
+                    # 持有跨进程写锁时文件不会再变，等待刷新到文件的最新内容，避免覆盖其他进程刚写入的记录
+                    working[name] = _WorkingSet(name, self.snapshot(name, wait=True).records)
+                try:
+                    outcomes.append((future, name, getattr(working[name], op)(*args), None))
+                except Exception as e:
+                    outcomes.append((future, name, None, e))
+
+            failed = {}
+            changes = []
+            for name, ws in working.items():
+                if not ws.dirty:
+                    continue
+                try:
+                    records = ws.result()
+                    tmp_path = self._write_temp(name, records)
+                    # 替换文件、发布新快照和更新派生索引在发布锁内一起完成：
+                    # 读者在此期间看到新的文件戳也拿不到发布锁，不会重新解析文件后再被增量更新一次
+                    with self._publish_lock:
+                        stamp = self._install(name, tmp_path)
+                        self._snapshots[name] = Snapshot(records, stamp)
+                        # 文件已经替换，修改已生效：索引出错只影响索引本身，不能让这次写入失败
+                        self._update_indexes(name, ws)
+                    _fsync_dir(self.data_dir)
+                except Exception as e:
+                    print(f"写入 {name}.json 失败: {str(e)}")
+                    failed[name] = e
+                    continue
+                changes.extend(ws.changes())
+
+            # 在跨进程写锁内记录修改日志，版本号的顺序与写入顺序一致
+            self.change_log.record(changes)
+
+        for future, name, result, error in outcomes:
+            error = error or failed.get(name)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def owns_state(self):
+        """
+        本进程是否负责写入启动快照
+
+        多个工作进程加载同一个数据目录时，第一个以非阻塞方式拿到 .state.snapshot.lock 的进程
+        一直持有该锁并负责写入，其他进程跳过；持有的进程退出后锁自动释放，由下一个尝试的进程接手。
+        """
+        if fcntl is None:
+            return True
+        if self._state_owner is not None and self._state_owner[0] == os.getpid():
+            return True
+        if not os.path.isdir(self.data_dir):
+            return False
+        f = open(os.path.join(self.data_dir, f'{STATE_FILE}.lock'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._state_owner = (os.getpid(), f)
+        return True
+
+    def save_state(self):
+        """
+        把已加载的集合和派生索引写入启动快照，返回是否写入（与上次写入相比没有变化时跳过）
+
+        同时记录每个JSON文件的文件戳和内容哈希，已被其他进程改写的集合不写入。
+        """
+        hashes = {}
+        for name in list(self._snapshots):
+            stamp = self._stat(name)
+            digest = _file_hash(self._path(name))
+            if digest is not None and self._stat(name) == stamp:
+                hashes[name] = (stamp, digest)
+
+        # 在发布锁内序列化，集合快照与派生索引处于同一版本
+        with self._publish_lock:
+            snapshots = {name: snap for name, snap in self._snapshots.items()
+                         if name in hashes and hashes[name][0] == snap.stamp}
+            versions = {name: snap.version for name, snap in snapshots.items()}
+            if not snapshots or versions == self._saved_versions:
+                return False
+            payload = pickle.dumps({
+                'collections': {name: (snap.stamp, hashes[name][1], snap.records) for name, snap in snapshots.items()},
+                'indexes': {name: index for name, index in self._indexes.items() if index.collection in snapshots}
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+
+        path = os.path.join(self.data_dir, STATE_FILE)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_STATE_HEADER.pack(STATE_MAGIC, STATE_FORMAT, hashlib.sha256(payload).digest()))
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._saved_versions = versions
+        return True
+
+    def load_state(self):
+        """
+        从启动快照恢复集合和派生索引，返回恢复的集合名
+
+        JSON文件的文件戳（修改时间和大小）与快照记录一致，或内容哈希一致时才使用快照中的记录；
+        快照缺失、损坏、格式版本不同或文件已被改动的集合照常从JSON解析并重建索引。
+        """
+        path = os.path.join(self.data_dir, STATE_FILE)
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if len(m) < _STATE_HEADER.size:
+                    return []
+                magic, version, digest = _STATE_HEADER.unpack_from(m)
+                if magic != STATE_MAGIC or version != STATE_FORMAT:
+                    return []
+                with memoryview(m)[_STATE_HEADER.size:] as payload:
+                    if hashlib.sha256(payload).digest() != digest:
+                        print("警告: 启动快照校验失败，从JSON文件重新加载")
+                        return []
+                    state = pickle.loads(payload)
+        except (FileNotFoundError, ValueError):  # 文件不存在或为空
+            return []
+        except Exception as e:
+            print(f"读取启动快照失败，从JSON文件重新加载: {str(e)}")
+            return []
+
+        restored = []
+        with self._publish_lock:
+            for name, (stamp, digest, records) in state['collections'].items():
+                if name in self._snapshots:
+                    continue
+                current = self._stat(name)
+                if current != stamp:
+                    # 文件被复制或touch过，内容没变时仍可使用
+                    if current is None or _file_hash(self._path(name)) != digest:
+                        continue
+                    stamp = current
+                self._snapshots[name] = Snapshot(records, stamp)
+                restored.append(name)
+            for index_name, index in state['indexes'].items():
+                if (index.collection in restored and index_name not in self._indexes
+                        and type(index) is INDEX_TYPES.get(index_name)):
+                    self._indexes[index_name] = index
+            self._saved_versions = {name: self._snapshots[name].version for name in restored}
+        return restored
+
+    def changes_since(self, version, limit):
+        """
+        增量同步：版本号大于 version 的修改（见 ChangeLog.since）
+
+        日志首次使用或写入失败过时，先在写锁内用各集合的当前内容重建日志。
+        """
+        if not self.change_log.seeded():
+            with self._lock, self._process_lock():
+                if not self.change_log.seeded():
+                    self.change_log.seed({name: self._read(name) for name in COLLECTIONS})
+        return self.change_log.since(version, limit)
+
+    def preload(self):
+        """
+        预加载全部集合并建立索引（在fork工作进程之前调用）
+
+        启动时数据文件只在这里解析一次（已从启动快照恢复的集合不再解析）：
+        文件不存在时创建空集合，内容不是有效JSON时重置为空集合。
+        """
+        for name in COLLECTIONS:
+            snap = self.snapshot(name)
+            if snap.stamp is None or name in self._invalid:
+                self._reset(name, snap.stamp)
+
+    def _reset(self, name, stamp):
+        """把不存在或损坏的数据文件写成空集合；文件戳与 stamp 不同（已被其他进程写入）时跳过"""
+        with self._lock, self._process_lock():
+            if self._stat(name) != stamp:
+                return
+            if stamp is None:
+                print(f"已创建数据文件: {name}.json")
+            else:
+                print(f"警告: {name}.json 包含无效的JSON格式，正在重置...")
+            stamp = self._write(name, [])
+            with self._publish_lock:
+                self._snapshots[name] = Snapshot([], stamp)
+                self._invalid.discard(name)
+                self._rebuild_indexes(name)
+
+    def load(self, name):
+        """获取集合的全部记录（只读元组）"""
+        return self.snapshot(name).records
+
+    def get(self, name, record_id):
+        """按ID获取单条记录（只读），不存在时返回None"""
+        return self.snapshot(name).by_id.get(record_id)
+
+    def index(self, index_name):
+        """获取派生索引（首次使用时创建），返回前会同步其他进程的改动"""
+        index_type = INDEX_TYPES[index_name]
+        self.snapshot(index_type.collection)
+        index = self._indexes.get(index_name)
+        if index is None:
+            with self._publish_lock:
+                index = self._indexes.get(index_name)
+                if index is None:
+                    index = index_type()
+                    index.rebuild(self._snapshots[index_type.collection].records)
+                    self._indexes[index_name] = index
+        return index
+
+    def memory_estimate(self):
+        """估算已加载数据占用的内存（字节）"""
+        stamps = [snap.stamp for snap in list(self._snapshots.values())]
+        return sum(stamp[1] for stamp in stamps if stamp) * MEMORY_FACTOR
+
+    def busy(self):
+        """是否有写入正在进行或排队"""
+        if self._writer is not None:
+            return True
+        if self._lock.acquire(blocking=False):
+            self._lock.release()
+            return False
+        return True
+
+    def version(self, name):
+        """集合当前的版本号"""
+        return self.snapshot(name).version
+
+    def insert(self, name, record):
+        """追加一条记录并写盘"""
+        return self._submit('insert', name, record)
+
+    def insert_many(self, name, records, skip_existing=False):
+        """
+        批量追加记录，只写一次盘，返回追加的条数
+
+        skip_existing=True 时在写锁内跳过ID已存在的记录（包括同一批中重复的ID），
+        检查和写入之间不会有其他写入插入同一个ID。
+        """
+        return self._submit('insert_many', name, list(records), skip_existing)
+
+    def update(self, name, record_id, changes):
+        """
+        用 changes 更新指定记录并写盘，返回新记录；记录不存在时返回None
+
+        changes 也可以是函数：在写锁内以当前记录为参数调用，返回要更新的字段，
+        用于“检查后再修改”的原子操作（函数抛出的异常会直接传给调用方）。
+        """
+        return self._submit('update', name, record_id, changes)
+
+    def delete(self, name, record_id):
+        """删除指定记录并写盘，返回被删除的记录；记录不存在时返回None"""
+        return self._submit('delete', name, record_id)
+
+    def replace(self, name, records):
+        """整体替换集合内容并写盘"""
+        self._submit('replace', name, records)
+
+
+# 文件内容的SHA-256，文件不存在时返回None
+def _file_hash(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.digest()
+
+
+# 把目录项的变化（文件替换）刷到磁盘
+def _fsync_dir(directory):
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TenantRegistry:
+    """
+    已加载家庭数据的LRU
+
+    每个家庭一个独立的数据目录和 DataStore，互不影响。
+    加载新家庭时，若估算内存或家庭数超过上限，淘汰最久未使用的家庭（默认家庭和正在写入的家庭除外）。
+    """
+
+    def __init__(self, max_bytes=TENANT_CACHE_BYTES, max_tenants=TENANT_CACHE_MAX):
+        self.max_bytes = max_bytes
+        self.max_tenants = max_tenants
+        self._stores = OrderedDict()  # 家庭ID -> DataStore
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def data_dir(tenant_id):
+        if tenant_id == DEFAULT_TENANT:
+            return DATA_DIR
+        return os.path.join(TENANTS_DIR, tenant_id)
+
+    def get(self, tenant_id):
+        with self._lock:
+            store = self._stores.get(tenant_id)
+            if store is not None:
+                self._stores.move_to_end(tenant_id)
+                return store
+            store = self._stores[tenant_id] = DataStore(self.data_dir(tenant_id))
+            self._evict()
+            return store
+
+    def _evict(self):
+        total = sum(store.memory_estimate() for store in self._stores.values())
+        for tenant_id in list(self._stores):
+            if total <= self.max_bytes and len(self._stores) <= self.max_tenants:
+                break
+            store = self._stores[tenant_id]
+            if tenant_id == DEFAULT_TENANT or store.busy() or tenant_id == next(reversed(self._stores)):
+                continue
+            total -= store.memory_estimate()
+            del self._stores[tenant_id]
+
+    def stores(self):
+        """已加载的家庭数据仓库"""
+        with self._lock:
+            return list(self._stores.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': len(self._stores),
+                'estimated_bytes': sum(store.memory_estimate() for store in self._stores.values()),
+                'max_bytes': self.max_bytes,
+                'max_tenants': self.max_tenants
+            }
+
+
+# 全局家庭数据LRU
+tenant_registry = TenantRegistry()
+
+
+def valid_tenant_id(tenant_id):
+    """检查家庭ID格式"""
+    return bool(tenant_id and TENANT_ID_PATTERN.match(tenant_id))
+
+
+def tenant_exists(tenant_id):
+    """家庭是否已有数据目录（家庭在第一次写入时创建）"""
+    return tenant_id == DEFAULT_TENANT or os.path.isdir(TenantRegistry.data_dir(tenant_id))
+
+
+def current_tenant_id():
+    """当前请求所属的家庭ID（请求之外为默认家庭）"""
+    if has_request_context():
+        return g.get('tenant_id', DEFAULT_TENANT)
+    return DEFAULT_TENANT
+
+
+def get_store(tenant_id=None):
+    """获取数据仓库，默认为当前请求所属家庭的数据仓库"""
+    return tenant_registry.get(tenant_id or current_tenant_id())
+
+
+def save_all_states():
+    """为所有已加载且由本进程负责（见 DataStore.owns_state）的家庭写入启动快照（关闭前和定期调用）"""
+    for store in tenant_registry.stores():
+        try:
+            if store.owns_state():
+                store.save_state()
+        except Exception as e:
+            print(f"写入启动快照失败 ({store.data_dir}): {str(e)}")
+
+
+_state_saver_pid = None
+_state_saver_lock = threading.Lock()
+
+
+def start_state_saver(interval=STATE_SAVE_INTERVAL):
+    """
+    启动定期写入启动快照的线程（每个进程只启动一次）
+
+    每个工作进程都会启动该线程，但每个家庭的启动快照只由持有其快照锁的一个进程写入。
+    """
+    global _state_saver_pid
+    if interval <= 0 or _state_saver_pid == os.getpid():
+        return
+    with _state_saver_lock:
+        if _state_saver_pid == os.getpid():
+            return
+        _state_saver_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(interval)
+                save_all_states()
+
+        threading.Thread(target=run, name='state-saver', daemon=True).start()
@@ -7,8 +7,7 @@ from datetime import datetime
 # 确保目录存在
 def ensure_dir(directory):
     """确保指定的目录存在，如果不存在则创建"""
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    os.makedirs(directory, exist_ok=True)
 
 # 读取JSON文件
 def read_json_file(file_path):
@@ -0,0 +1,49 @@
+import hashlib
+from functools import wraps
+
+from flask import request, jsonify, make_response, Response
+
+from .data_store import get_store
+
+
+# 请求体指纹，用于发现同一个键被用于不同的请求
+def _fingerprint():
+    return hashlib.sha256(request.get_data()).hexdigest()
+
+
+def idempotent(scope):
+    """
+    幂等接口装饰器
+
+    请求带有 Idempotency-Key 请求头时，相同的键在有效期内只会执行一次，
+    之后的重试直接返回第一次的响应（响应头 Idempotent-Replayed: true）。
+    服务器错误（5xx）不会被缓存，客户端可以继续重试。
+    键记录在当前家庭的幂等键缓存中（idempotency_cache.py），不同家庭的键互不影响。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            client_key = request.headers.get('Idempotency-Key')
+            if not client_key:
+                return view(*args, **kwargs)
+
+            cache = get_store().idempotency
+            key = f"{scope}:{client_key}"
+            fingerprint = _fingerprint()
+            # 检查、执行和记录都在键锁内，其他工作进程的同一个键会等待并读到这里记录的响应
+            with cache.key_lock(key):
+                entry = cache.get(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code < 500:
+                        cache.put(key, fingerprint, response.status_code, response.get_data(as_text=True))
+                    return response
+
+            if entry['fingerprint'] != fingerprint:
+                return jsonify({"error": "Idempotency-Key 已被用于不同的请求"}), 422
+
+            response = Response(entry['body'], status=entry['status'], mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只做进程内的串行化
+    fcntl = None
+
+# 记录保留时间（秒）和最多保留的记录数
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+
+# 跨进程的键锁按键的哈希分成的锁文件数
+KEY_LOCK_STRIPES = 16
+
+
+@contextmanager
+def _flock(path):
+    """跨进程文件锁（与数据仓库的 .write.lock 相同的方式）"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class IdempotencyCache:
+    """
+    幂等键缓存
+
+    以 LRU 方式保存最近的 Idempotency-Key 及其对应的响应，超过TTL的记录自动淘汰。
+    记录以追加方式写入日志文件（每行一条JSON），重启后可以恢复；
+    日志行数超过上限的两倍时会压缩重写。每个家庭的数据目录一个日志（由数据仓库创建，见 DataStore.idempotency），
+    多个工作进程共享同一个日志文件：
+    同步、追加和压缩都在日志的文件锁（<日志>.lock）内进行，读取前会把其他进程追加的记录同步进来。
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # 键 -> 记录
+        self._offset = 0               # 日志文件已读取到的位置
+        self._head = None              # 日志文件的第一行，用于发现日志被其他进程压缩重写
+        self._lines = 0                # 日志文件中的行数
+        self._lock = threading.Lock()
+        self._key_locks = {}           # 正在处理中的键 -> [锁, 引用计数]
+
+    def _remember(self, entry):
+        key = entry['key']
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _evict_expired(self, now):
+        expired = [k for k, e in self._entries.items() if e['expires_at'] <= now]
+        for k in expired:
+            del self._entries[k]
+
+    def _journal_lock(self):
+        return _flock(f'{self.path}.lock')
+
+    def _sync(self):
+        """
+        读取日志中其他进程新追加的记录（在日志的文件锁内调用）
+
+        日志在压缩前只会追加，第一行不变；压缩后的日志以唯一的标记行开头，
+        第一行变化说明日志被其他进程压缩过，需要重新读取。
+        """
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            head = f.readline()
+            size = os.fstat(f.fileno()).st_size
+            if head != self._head or size < self._offset:
+                self._entries.clear()
+                self._offset = 0
+                self._lines = 0
+                self._head = head
+            if size == self._offset:
+                return
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # 写入中断留下的半行
+                self._offset += len(line.encode('utf-8'))
+                self._lines += 1
+                try:
+                    entry = json.loads(line)
+                    if 'compacted' not in entry:
+                        self._remember(entry)
+                except (json.JSONDecodeError, KeyError):
+                    print(f"警告: 幂等键日志中存在无效记录，已跳过")
+
+    def _compact(self):
+        """只保留仍然有效的记录重写日志（在日志的文件锁内调用，其他进程此时不会追加）"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        head = json.dumps({'compacted': uuid.uuid4().hex}) + '\n'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(head)
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        self._head = head
+        self._offset = os.path.getsize(self.path)
+        self._lines = len(self._entries)
+
+    def get(self, key):
+        """获取未过期的记录，不存在时返回None"""
+        with self._lock:
+            with self._journal_lock():
+                self._sync()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, fingerprint, status, body):
+        """保存一个响应并追加到日志"""
+        now = time.time()
+        entry = {
+            'key': key,
+            'fingerprint': fingerprint,
+            'status': status,
+            'body': body,
+            'expires_at': now + self.ttl
+        }
+        with self._lock, self._journal_lock():
+            self._sync()
+            self._remember(entry)
+            line = json.dumps(entry, ensure_ascii=False) + '\n'
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            if self._offset == 0:
+                self._head = line
+            self._offset = os.path.getsize(self.path)
+            self._lines += 1
+            if self._lines > self.max_entries * 2:
+                self._evict_expired(now)
+                self._compact()
+
+    @contextmanager
+    def key_lock(self, key):
+        """
+        键的处理锁：同一个键的并发请求（包括其他工作进程中的）串行处理，重试请求会等待首个请求完成
+
+        进程内按键加线程锁；跨进程时按键的哈希加其中一个锁文件（<日志>.locks/<n>.lock）的文件锁，
+        不同的键只在分到同一个锁文件时才会互相等待。
+        """
+        stripe = int(hashlib.sha256(key.encode('utf-8')).hexdigest()[:8], 16) % KEY_LOCK_STRIPES
+        self._acquire_key(key)
+        try:
+            with _flock(os.path.join(f'{self.path}.locks', f'{stripe}.lock')):
+                yield
+        finally:
+            self._release_key(key)
+
+    def _acquire_key(self, key):
+        with self._lock:
+            slot = self._key_locks.get(key)
+            if slot is None:
+                slot = self._key_locks[key] = [threading.Lock(), 0]
+            slot[1] += 1
+        slot[0].acquire()
+
+    def _release_key(self, key):
+        with self._lock:
+            slot = self._key_locks[key]
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self._key_locks[key]
+        slot[0].release()
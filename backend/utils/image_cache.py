@@ -0,0 +1,115 @@
+import os
+import glob
+import mimetypes
+import threading
+from collections import OrderedDict
+
+from flask import request, send_file, Response, abort
+from werkzeug.security import safe_join
+
+# 图片内存缓存总大小上限（字节）
+IMAGE_CACHE_BYTES = int(os.environ.get('IMAGE_CACHE_BYTES', 32 * 1024 * 1024))
+
+# 不超过该大小的图片才放入内存缓存，更大的图片直接用 sendfile 发送
+IMAGE_CACHE_MAX_ITEM = int(os.environ.get('IMAGE_CACHE_MAX_ITEM', 256 * 1024))
+
+# 浏览器缓存时间（秒）
+IMAGE_MAX_AGE = int(os.environ.get('IMAGE_MAX_AGE', 7 * 24 * 3600))
+
+
+class ImageCache:
+    """
+    热点小图片的LRU字节缓存
+
+    以文件路径为键，条目记录文件的 (mtime_ns, size)，文件被替换后自动重新读取。
+    """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES, max_item=IMAGE_CACHE_MAX_ITEM):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self._entries = OrderedDict()  # 路径 -> (文件标识, 字节)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, stamp):
+        """读取缓存，文件不在缓存或已变化时从磁盘读取并缓存"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.put(path, stamp, data)
+        return data
+
+    def put(self, path, stamp, data):
+        if len(data) > self.max_item:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[path] = (stamp, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def preload(self, pattern):
+        """预先读取匹配的图片（如默认占位图）"""
+        for path in glob.glob(pattern):
+            st = os.stat(path)
+            if st.st_size <= self.max_item:
+                self.get(path, (st.st_mtime_ns, st.st_size))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# 全局图片缓存
+image_cache = ImageCache()
+
+
+def serve_image(directory, filename):
+    """
+    发送图片文件
+
+    带 ETag / Last-Modified / Cache-Control 响应头，支持条件请求(304)和Range请求(206)。
+    小图片从内存缓存发送；大图片通过 send_file 发送，由服务器的 wsgi.file_wrapper 零拷贝传输。
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        abort(404)
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    etag = f'{st.st_mtime_ns:x}-{st.st_size:x}'
+
+    if st.st_size > image_cache.max_item:
+        return send_file(path, conditional=True, etag=etag, max_age=IMAGE_MAX_AGE)
+
+    data = image_cache.get(path, (st.st_mtime_ns, st.st_size))
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = st.st_mtime
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
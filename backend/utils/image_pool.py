@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+
+from .file_handlers import save_base64_image, delete_file
+
+# 图片处理线程数
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+# 除正在处理的任务外，最多排队的任务数；超过后直接拒绝
+IMAGE_QUEUE_SIZE = int(os.environ.get('IMAGE_QUEUE_SIZE', 8))
+
+# 拒绝时建议客户端等待的时间（秒）
+IMAGE_RETRY_AFTER = int(os.environ.get('IMAGE_RETRY_AFTER', 2))
+
+
+class ImagePoolBusy(Exception):
+    """图片处理队列已满"""
+
+    def __init__(self, retry_after=IMAGE_RETRY_AFTER):
+        self.retry_after = retry_after
+        super().__init__("图片处理繁忙，请稍后重试")
+
+
+class ImagePool:
+    """
+    有界的图片处理线程池
+
+    base64解码和写文件在固定数量的线程中执行，同时进行和排队的任务总数有上限，
+    队列已满时立即抛出 ImagePoolBusy，而不是让请求线程和内存无限堆积，
+    图片上传高峰因此不会拖慢点菜和下单等其他请求。
+    """
+
+    def __init__(self, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._wait_max = 0.0
+
+    def _get_executor(self):
+        # 延迟创建线程，预加载应用后 fork 出的工作进程各自拥有自己的线程
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-worker')
+        return self._executor
+
+    def _task(self, fn, args, submitted):
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._running -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._wait_total += started - submitted
+                self._run_total += finished - started
+                self._wait_max = max(self._wait_max, started - submitted)
+            self._slots.release()
+
+    def run(self, fn, *args):
+        """在线程池中执行 fn 并等待结果；队列已满时抛出 ImagePoolBusy"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ImagePoolBusy()
+        with self._lock:
+            self._queued += 1
+        try:
+            future = self._get_executor().submit(self._task, fn, args, time.monotonic())
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self._wait_total / finished * 1000, 2) if finished else 0,
+                'max_wait_ms': round(self._wait_max * 1000, 2),
+                'avg_run_ms': round(self._run_total / finished * 1000, 2) if finished else 0
+            }
+
+
+# 全局图片处理线程池
+image_pool = ImagePool()
+
+
+# 解码并保存一组图片，任一张失败时删除已保存的图片
+def _save_all(images, directory):
+    paths = []
+    try:
+        for image in images:
+            paths.append(save_base64_image(image, directory))
+    except Exception:
+        for path in paths:
+            delete_file(path)
+        raise
+    return [os.path.basename(path) for path in paths]
+
+
+def save_images(images, directory):
+    """在图片线程池中解码并保存base64图片，返回文件名列表；队列已满时抛出 ImagePoolBusy"""
+    return image_pool.run(_save_all, list(images), directory)
+
+
+def busy_response(error):
+    """图片队列已满时的503响应"""
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
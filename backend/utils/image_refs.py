@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+from collections import Counter
+
+from .data_store import DEFAULT_TENANT, CollectionIndex, current_tenant_id, register_index
+
+# 图片根目录（/static/images/...）
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'images')
+
+# 其他家庭的图片目录：static/images/households/<家庭ID>/<类别>（默认家庭使用 static/images/<类别>）
+TENANT_IMAGES = 'households'
+
+# 服务器保存上传图片时生成的文件名（UUID），只有这些图片会被后台删除
+SERVER_IMAGE_NAME = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.jpg$')
+
+
+def image_location(kind, tenant_id=None):
+    """家庭（默认为当前请求所属家庭）某类图片（dishes 或 reviews）的 (文件目录, 网址前缀)"""
+    tenant_id = tenant_id or current_tenant_id()
+    parts = (kind,) if tenant_id == DEFAULT_TENANT else (TENANT_IMAGES, tenant_id, kind)
+    return os.path.join(IMAGES_DIR, *parts), '/static/images/' + '/'.join(parts) + '/'
+
+
+def server_image(path, tenant_id=None):
+    """路径是否为该家庭由服务器保存的上传图片（默认图片和其他家庭的图片都不是）"""
+    if not isinstance(path, str):
+        return False
+    for kind in ('dishes', 'reviews'):
+        prefix = image_location(kind, tenant_id)[1]
+        if path.startswith(prefix) and SERVER_IMAGE_NAME.match(path[len(prefix):]):
+            return True
+    return False
+
+
+# 订单中引用的图片路径（下单时订单项复制了菜品的 image_path）
+def _order_images(order):
+    return [item.get('image_path') for item in order.get('items') or () if item.get('image_path')]
+
+
+@register_index('order_image_refs')
+class OrderImageIndex(CollectionIndex):
+    """图片路径 -> 引用该图片的订单项数，判断图片是否仍被订单使用为 O(1)"""
+
+    collection = 'orders'
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def _add(self, order, sign):
+        for path in _order_images(order):
+            self._counts[path] += sign
+            if self._counts[path] <= 0:
+                del self._counts[path]
+
+    def rebuild(self, records):
+        with self._lock:
+            self._counts = Counter()
+            for order in records:
+                self._add(order, 1)
+
+    def on_insert(self, record):
+        with self._lock:
+            self._add(record, 1)
+
+    def on_update(self, old, new):
+        if _order_images(old) == _order_images(new):
+            return
+        with self._lock:
+            self._add(old, -1)
+            self._add(new, 1)
+
+    def on_delete(self, old):
+        with self._lock:
+            self._add(old, -1)
+
+    def referenced(self, path):
+        with self._lock:
+            return path in self._counts
+
+
+def unreferenced_images(store, paths):
+    """
+    返回可以删除的图片路径（在菜品或评价的修改写入之后调用）
+
+    只保留当前家庭由服务器保存的上传图片（默认图片、其他家庭的图片和其他路径不删除），
+    并去掉仍被菜品、评价或订单引用的路径。图片目录按家庭分开，只需检查当前家庭的引用。
+    """
+    paths = [path for path in dict.fromkeys(paths) if server_image(path)]
+    if not paths:
+        return []
+    orders = store.index('order_image_refs')
+    used = {dish.get('image_path') for dish in store.load('dishes')}
+    for review in store.load('reviews'):
+        used.update(review.get('image_paths') or ())
+    return [path for path in paths if path not in used and not orders.referenced(path)]
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from .data_store import DATA_DIR, DEFAULT_TENANT, current_tenant_id
+from .image_refs import IMAGES_DIR, image_location, server_image
+from .uploads import upload_manager
+
+# 任务表（SQLite，多个工作进程共享，同一任务只会被一个进程领取）
+JOBS_DB = os.environ.get('JOBS_DB', os.path.join(DATA_DIR, 'jobs.sqlite3'))
+
+# 每个进程的任务线程数
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+
+# 最多尝试次数，失败后按 JOB_BACKOFF_SECONDS * 2^(次数-1) 秒后重试
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_BACKOFF_SECONDS = float(os.environ.get('JOB_BACKOFF_SECONDS', 2))
+
+# 任务执行超过该时间（秒）仍未结束，视为进程已退出，任务可被重新领取
+JOB_LEASE_SECONDS = 300
+
+# 没有任务时的轮询间隔（秒）
+JOB_POLL_SECONDS = 1
+
+# 已完成任务的保留时间（秒）
+JOB_RETENTION_SECONDS = 24 * 3600
+
+# 后端根目录，任务中的图片路径（/static/images/...）相对于该目录
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 超过该边长（像素）的图片在后台缩小
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 1600))
+
+# 已注册的任务处理函数: 任务类型 -> 函数(payload)
+JOB_HANDLERS = {}
+
+
+def job_handler(job_type):
+    """注册任务处理函数的装饰器，处理函数抛出异常时任务会按退避时间重试"""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    """
+    持久化的后台任务队列
+
+    任务保存在SQLite表中，进程重启后未完成的任务会继续执行。
+    请求只负责 enqueue 后立即返回，由后台线程领取执行；
+    任务ID相同的任务只会入队一次，重复提交（例如客户端重试）不会重复执行。
+    """
+
+    def __init__(self, path=JOBS_DB, workers=JOB_WORKERS):
+        self.path = path
+        self.workers = workers
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._last_purge = 0
+
+    def _connect(self):
+        # 每个线程一个连接；fork 后的子进程重新连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    locked_at REAL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """启动任务线程（每个进程只启动一次，预加载后 fork 出的工作进程各自启动）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def enqueue(self, job_type, payload, job_id=None, delay=0):
+        """提交任务并返回任务ID；任务ID已存在时不重复提交"""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"未知的任务类型: {job_type}")
+        now = time.time()
+        job_id = job_id or f'{job_type}:{os.urandom(8).hex()}'
+        self._connect().execute(
+            'INSERT OR IGNORE INTO jobs (id, type, payload, status, run_at, created_at, updated_at) '
+            "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+            (job_id, job_type, json.dumps(payload, ensure_ascii=False), now + delay, now, now))
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def _claim(self):
+        """领取一个到期的任务（或租约已过期的执行中任务）"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'pending' AND run_at <= ?) "
+                "OR (status = 'running' AND locked_at < ?) ORDER BY run_at LIMIT 1",
+                (now, now - JOB_LEASE_SECONDS)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_at = ?, updated_at = ? "
+                    "WHERE id = ?", (now, now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def _run(self, job):
+        attempts = job['attempts'] + 1
+        handler = JOB_HANDLERS.get(job['type'])
+        try:
+            if handler is None:
+                raise ValueError(f"未知的任务类型: {job['type']}")
+            handler(json.loads(job['payload']))
+        except Exception as e:
+            print(f"后台任务 {job['id']} 第{attempts}次执行失败: {str(e)}")
+            now = time.time()
+            if attempts >= JOB_MAX_ATTEMPTS or handler is None:
+                status, run_at = 'failed', job['run_at']
+            else:
+                status, run_at = 'pending', now + JOB_BACKOFF_SECONDS * 2 ** (attempts - 1)
+            self._connect().execute(
+                'UPDATE jobs SET status = ?, run_at = ?, locked_at = NULL, error = ?, updated_at = ? WHERE id = ?',
+                (status, run_at, str(e), now, job['id']))
+            return
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', locked_at = NULL, error = NULL, updated_at = ? WHERE id = ?",
+            (time.time(), job['id']))
+
+    def _purge(self):
+        """删除过期的已完成任务"""
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        self._connect().execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < ?",
+                                (now - JOB_RETENTION_SECONDS,))
+
+    def _worker(self):
+        while True:
+            try:
+                job = self._claim()
+                if job is None:
+                    self._purge()
+                    upload_manager.sweep()  # 清理过期的上传会话（最多每分钟一次），不依赖新的上传请求
+                    self._wake.wait(JOB_POLL_SECONDS)
+                    self._wake.clear()
+                    continue
+                self._run(job)
+            except Exception as e:
+                print(f"后台任务线程错误: {str(e)}")
+                time.sleep(JOB_POLL_SECONDS)
+
+    def get(self, job_id):
+        """查询单个任务，不存在时返回None"""
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def stats(self, failures=10):
+        """各状态的任务数、最早待执行任务的等待时间和最近的失败任务"""
+        conn = self._connect()
+        counts = {status: 0 for status in ('pending', 'running', 'done', 'failed')}
+        for row in conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status'):
+            counts[row['status']] = row['n']
+        oldest = conn.execute("SELECT MIN(run_at) AS t FROM jobs WHERE status = 'pending'").fetchone()['t']
+        retrying = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status = 'pending' AND attempts > 0").fetchone()['n']
+        recent = conn.execute(
+            "SELECT id, type, attempts, error, updated_at FROM jobs WHERE status = 'failed' "
+            'ORDER BY updated_at DESC LIMIT ?', (failures,)).fetchall()
+        return {
+            'counts': counts,
+            'retrying': retrying,
+            'oldest_pending_seconds': round(max(0, time.time() - oldest), 1) if oldest else 0,
+            'recent_failures': [dict(row) for row in recent]
+        }
+
+
+# 全局任务队列
+job_queue = JobQueue()
+
+
+# 把 /static/images/... 路径转换为文件路径，不在图片目录下的路径返回None
+def image_file(web_path):
+    path = os.path.realpath(os.path.join(BACKEND_DIR, str(web_path).lstrip('/')))
+    if not path.startswith(os.path.realpath(IMAGES_DIR) + os.sep):
+        return None
+    return path
+
+
+@job_handler('delete_images')
+def delete_images(payload):
+    """删除家庭不再使用的图片（只删除该家庭图片目录下由服务器保存的上传图片）"""
+    tenant_id = payload.get('tenant') or DEFAULT_TENANT
+    dirs = {os.path.realpath(image_location(kind, tenant_id)[0]) for kind in ('dishes', 'reviews')}
+    for web_path in payload.get('paths', []):
+        path = image_file(web_path)
+        if path is None or not server_image(web_path, tenant_id) or os.path.dirname(path) not in dirs:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@job_handler('shrink_image')
+def shrink_image(payload):
+    """把边长超过 IMAGE_MAX_DIMENSION 的图片等比缩小（原地替换）"""
+    from PIL import Image
+
+    path = image_file(payload.get('path'))
+    if path is None or not os.path.exists(path):
+        return
+    with Image.open(path) as image:
+        if max(image.size) <= IMAGE_MAX_DIMENSION:
+            return
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        image.save(tmp_path, format='JPEG', quality=85)
+    os.replace(tmp_path, path)
+
+
+def discard_images(web_paths, key=None):
+    """为当前家庭不再使用的图片提交删除任务；key（例如 dish:<ID>）相同的任务只提交一次"""
+    tenant_id = current_tenant_id()
+    job_queue.enqueue('delete_images', {'paths': list(web_paths), 'tenant': tenant_id},
+                      job_id=f'delete_images:{tenant_id}:{key}' if key else None)
+
+
+def shrink_images(web_paths):
+    """为新上传的图片提交缩小任务"""
+    for web_path in web_paths:
+        job_queue.enqueue('shrink_image', {'path': web_path}, job_id=f'shrink_image:{web_path}')
@@ -0,0 +1,105 @@
+import heapq
+import itertools
+import threading
+
+from .data_store import CollectionIndex, register_index
+
+# 已结束的订单状态，不再出现在厨房队列中
+FINISHED_STATUSES = ('completed', 'cancelled')
+
+# 菜品未设置 prep_minutes 时使用的默认制作时间（分钟）
+DEFAULT_PREP_MINUTES = 10
+
+
+@register_index('kitchen_queue')
+class KitchenQueue(CollectionIndex):
+    """
+    厨房队列：未完成订单的小顶堆索引
+
+    排序键为 (-priority, timestamp)，优先级高的订单在前，同优先级按下单时间先后。
+    订单状态变化或删除时只从 _entries 中移除（堆中的旧条目在读取时跳过），
+    堆中失效条目超过有效条目时整体压缩，因此新增和移除都是 O(log n)，
+    与历史订单总数无关。
+    """
+
+    collection = 'orders'
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}  # 订单ID -> 堆中的有效条目
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    # itertools.count 不能直接写入启动快照，保存下一个序号
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_counter'] = next(self._counter)
+        return state
+
+    def __setstate__(self, state):
+        state['_counter'] = itertools.count(state['_counter'])
+        super().__setstate__(state)
+
+    @staticmethod
+    def _is_active(order):
+        return order.get('status') not in FINISHED_STATUSES
+
+    def _compact(self):
+        """失效条目过多时只保留有效条目重建堆"""
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    def _push(self, order):
+        entry = (-int(order.get('priority') or 0), order.get('timestamp', ''), next(self._counter), order.get('id'))
+        self._entries[order.get('id')] = entry
+        heapq.heappush(self._heap, entry)
+        self._compact()
+
+    def _discard(self, order_id):
+        if self._entries.pop(order_id, None) is not None:
+            self._compact()
+
+    def rebuild(self, records):
+        with self._lock:
+            self._entries = {}
+            self._heap = []
+            for order in records:
+                if self._is_active(order):
+                    self._push(order)
+
+    def on_insert(self, record):
+        with self._lock:
+            if self._is_active(record):
+                self._push(record)
+
+    def on_update(self, old, new):
+        with self._lock:
+            if not self._is_active(new):
+                self._discard(new.get('id'))
+            elif (not self._is_active(old) or old.get('priority') != new.get('priority')
+                    or old.get('timestamp') != new.get('timestamp')):
+                self._push(new)
+
+    def on_delete(self, old):
+        with self._lock:
+            self._discard(old.get('id'))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def order_ids(self, limit=None):
+        """按队列顺序返回订单ID"""
+        with self._lock:
+            live = [e for e in self._heap if self._entries.get(e[3]) is e]
+            n = len(live) if limit is None else min(limit, len(live))
+            return [e[3] for e in heapq.nsmallest(n, live)]
+
+
+# 估算订单的制作时间（分钟）：各菜品的 prep_minutes × 数量之和
+def estimate_prep_minutes(order, get_dish):
+    total = 0
+    for item in order.get('items', []):
+        dish = get_dish(item.get('dish_id')) or {}
+        total += (dish.get('prep_minutes') or DEFAULT_PREP_MINUTES) * item.get('quantity', 1)
+    return total
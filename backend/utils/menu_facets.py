@@ -0,0 +1,314 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+
+from .data_store import CollectionIndex, register_index
+
+# 价格分面的区间 [下限, 上限)，上限为None表示不设上限
+PRICE_BUCKETS = ((0, 20), (20, 50), (50, 100), (100, None))
+
+# 菜单摘要包含的字段（菜单网格只需要这些，不含做法和食材）
+SUMMARY_FIELDS = ('id', 'name', 'category', 'price', 'description', 'image_path', 'timestamp')
+
+
+class SortedIds:
+    """按数值排序的ID列表（数值和ID分两个列表保存，区间查询用 bisect）"""
+
+    __slots__ = ('values', 'ids')
+
+    def __init__(self):
+        self.values = []
+        self.ids = []
+
+    def add(self, value, record_id):
+        i = bisect_right(self.values, value)
+        self.values.insert(i, value)
+        self.ids.insert(i, record_id)
+
+    def remove(self, value, record_id):
+        i = bisect_left(self.values, value)
+        while i < len(self.values) and self.values[i] == value:
+            if self.ids[i] == record_id:
+                del self.values[i]
+                del self.ids[i]
+                return
+            i += 1
+
+    def span(self, low=None, high=None):
+        """数值在 [low, high] 内的下标范围"""
+        start = 0 if low is None else bisect_left(self.values, low)
+        end = len(self.values) if high is None else bisect_right(self.values, high)
+        return start, max(start, end)
+
+    def between(self, low=None, high=None):
+        """数值在 [low, high] 内的 (数值, ID)，按数值升序"""
+        start, end = self.span(low, high)
+        return list(zip(self.values[start:end], self.ids[start:end]))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# 把价格转换为可比较的数值
+def _price(dish):
+    price = dish.get('price')
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price)
+    return 0.0
+
+
+@register_index('dish_prices')
+class DishPriceIndex(CollectionIndex):
+    """按价格排序的菜品ID：全部菜品一份，每个分类（小写）一份"""
+
+    collection = 'dishes'
+
+    def __init__(self):
+        self._all = SortedIds()
+        self._by_category = {}
+        self._keys = {}  # 菜品ID -> (分类, 价格)
+        self._lock = threading.Lock()
+
+    def _add(self, dish):
+        dish_id = dish.get('id')
+        if dish_id is None:
+            return
+        category = str(dish.get('category') or '').lower()
+        price = _price(dish)
+        self._all.add(price, dish_id)
+        self._by_category.setdefault(category, SortedIds()).add(price, dish_id)
+        self._keys[dish_id] = (category, price)
+
+    def _remove(self, dish_id):
+        key = self._keys.pop(dish_id, None)
+        if key is None:
+            return
+        category, price = key
+        self._all.remove(price, dish_id)
+        self._by_category[category].remove(price, dish_id)
+        if not self._by_category[category]:
+            del self._by_category[category]
+
+    def rebuild(self, records):
+        with self._lock:
+            self._all = SortedIds()
+            self._by_category = {}
+            self._keys = {}
+            for dish in records:
+                self._add(dish)
+
+    def on_insert(self, record):
+        with self._lock:
+            self._add(record)
+
+    def on_update(self, old, new):
+        with self._lock:
+            self._remove(old.get('id'))
+            self._add(new)
+
+    def on_delete(self, old):
+        with self._lock:
+            self._remove(old.get('id'))
+
+    def categories(self):
+        with self._lock:
+            return sorted(self._by_category)
+
+    def between(self, category=None, low=None, high=None):
+        """某个分类（None为全部）中价格在 [low, high] 内的 (价格, 菜品ID)，按价格升序"""
+        with self._lock:
+            ids = self._all if category is None else self._by_category.get(category)
+            return ids.between(low, high) if ids is not None else []
+
+    def count(self, category=None, low=None, high=None):
+        """某个分类中价格在 [low, high] 内的菜品数，只做两次二分查找"""
+        with self._lock:
+            ids = self._all if category is None else self._by_category.get(category)
+            if ids is None:
+                return 0
+            start, end = ids.span(low, high)
+            return end - start
+
+
+@register_index('dish_ratings')
+class DishRatingIndex(CollectionIndex):
+    """
+    按菜品汇总的评价：评分总和、数量和按平均分排序的菜品ID
+
+    平均分变化时从有序列表中移除旧值再插入新值，按最低评分过滤只需一次二分查找。
+    """
+
+    collection = 'reviews'
+
+    def __init__(self):
+        self._reviews = {}  # 菜品ID -> {评价ID: 评价}
+        self._totals = {}   # 菜品ID -> [评分总和, 评价数]
+        self._by_rating = SortedIds()
+        self._lock = threading.Lock()
+
+    def _set(self, dish_id, delta_total, delta_count):
+        totals = self._totals.get(dish_id)
+        if totals is not None:
+            self._by_rating.remove(totals[0] / totals[1], dish_id)
+        else:
+            totals = self._totals[dish_id] = [0, 0]
+        totals[0] += delta_total
+        totals[1] += delta_count
+        if totals[1] > 0:
+            self._by_rating.add(totals[0] / totals[1], dish_id)
+        else:
+            del self._totals[dish_id]
+
+    def _add(self, review):
+        dish_id = review.get('dish_id')
+        if dish_id is None:
+            return
+        self._reviews.setdefault(dish_id, {})[review.get('id')] = review
+        self._set(dish_id, review.get('rating', 0), 1)
+
+    def _remove(self, review):
+        dish_id = review.get('dish_id')
+        reviews = self._reviews.get(dish_id)
+        if reviews is None or reviews.pop(review.get('id'), None) is None:
+            return
+        if not reviews:
+            del self._reviews[dish_id]
+        self._set(dish_id, -review.get('rating', 0), -1)
+
+    def rebuild(self, records):
+        with self._lock:
+            self._reviews = {}
+            self._totals = {}
+            self._by_rating = SortedIds()
+            for review in records:
+                self._add(review)
+
+    def on_insert(self, record):
+        with self._lock:
+            self._add(record)
+
+    def on_update(self, old, new):
+        with self._lock:
+            self._remove(old)
+            self._add(new)
+
+    def on_delete(self, old):
+        with self._lock:
+            self._remove(old)
+
+    def reviewed(self):
+        """有评价的菜品ID"""
+        with self._lock:
+            return set(self._totals)
+
+    def at_least(self, min_rating):
+        """平均评分不低于 min_rating 的菜品ID"""
+        with self._lock:
+            start, end = self._by_rating.span(min_rating)
+            return set(self._by_rating.ids[start:end])
+
+    def average(self, dish_id):
+        with self._lock:
+            totals = self._totals.get(dish_id)
+            return totals[0] / totals[1] if totals else None
+
+    def stats(self, dish_ids):
+        """与 collect_review_stats 格式相同的评分汇总（只包含指定的菜品）"""
+        with self._lock:
+            stats = {}
+            for dish_id in dish_ids:
+                totals = self._totals.get(dish_id)
+                if totals is None:
+                    continue
+                latest = max(self._reviews[dish_id].values(), key=lambda r: r.get('timestamp', ''))
+                stats[dish_id] = {'total': totals[0], 'count': totals[1], 'latest': latest}
+            return stats
+
+
+# 菜品的菜单摘要
+def dish_summary(dish):
+    return {key: dish[key] for key in SUMMARY_FIELDS if key in dish}
+
+
+@register_index('dish_summaries')
+class DishSummaryIndex(CollectionIndex):
+    """
+    菜品ID -> (菜品记录, 菜单摘要)
+
+    数据仓库在更新菜品时会生成新的记录对象，记录对象不同说明请求拿到的快照与索引不一致，此时直接计算摘要。
+    """
+
+    collection = 'dishes'
+
+    def __init__(self):
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self, records):
+        with self._lock:
+            self._summaries = {dish.get('id'): (dish, dish_summary(dish)) for dish in records}
+
+    def on_insert(self, record):
+        with self._lock:
+            self._summaries[record.get('id')] = (record, dish_summary(record))
+
+    def on_update(self, old, new):
+        with self._lock:
+            self._summaries.pop(old.get('id'), None)
+            self._summaries[new.get('id')] = (new, dish_summary(new))
+
+    def on_delete(self, old):
+        with self._lock:
+            self._summaries.pop(old.get('id'), None)
+
+    def summary(self, dish):
+        entry = self._summaries.get(dish.get('id'))
+        if entry is not None and entry[0] is dish:
+            return entry[1]
+        return dish_summary(dish)
+
+
+def facet_search(prices, ratings, categories=None, min_price=None, max_price=None,
+                 min_rating=None, has_reviews=None):
+    """
+    按分类、价格区间、最低评分和是否有评价过滤菜品
+
+    返回 (按价格升序的菜品ID, 分面计数)。每个分面的计数不受该分面自身条件的限制，
+    例如分类计数使用价格和评分条件，价格区间计数使用分类和评分条件。
+    """
+    # 评分条件：最低评分和是否有评价同时给出时两个条件都要满足
+    conditions = []
+    if min_rating is not None:
+        conditions.append(ratings.at_least(min_rating).__contains__)
+    if has_reviews is not None:
+        reviewed = ratings.reviewed()
+        conditions.append(reviewed.__contains__ if has_reviews else (lambda dish_id: dish_id not in reviewed))
+    if not conditions:
+        keep = None
+    elif len(conditions) == 1:
+        keep = conditions[0]
+    else:
+        keep = lambda dish_id: all(condition(dish_id) for condition in conditions)
+
+    def count(category, low, high):
+        if keep is None:
+            return prices.count(category, low, high)
+        return sum(1 for _, dish_id in prices.between(category, low, high) if keep(dish_id))
+
+    # 分类计数（价格和评分条件）
+    category_facet = {category: count(category, min_price, max_price) for category in prices.categories()}
+
+    # 价格区间计数（分类和评分条件），区间为 [下限, 上限)
+    selected = list(dict.fromkeys(categories or ())) or [None]  # 重复的分类只算一次
+    price_facet = []
+    for low, high in PRICE_BUCKETS:
+        n = sum(count(category, low, high) for category in selected)
+        if high is not None:
+            n -= sum(count(category, high, high) for category in selected)
+        price_facet.append({'min': low, 'max': high, 'count': n})
+
+    # 结果：各分类的有序列表归并后按评分条件过滤
+    matches = heapq.merge(*(prices.between(category, min_price, max_price) for category in selected))
+    ids = [dish_id for _, dish_id in matches if keep is None or keep(dish_id)]
+
+    return ids, {'category': category_facet, 'price': price_facet}
@@ -0,0 +1,202 @@
+import sys
+from collections.abc import Mapping
+
+class _Missing:
+    """字段不存在的标记（与值为None区分），序列化后仍是同一个对象"""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_MISSING'
+
+    def __repr__(self):
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+
+class Record(Mapping):
+    """
+    紧凑的只读记录
+
+    固定字段的值按 FIELDS 的顺序存放在一个元组中，不在 FIELDS 中的字段放在 _extra 字典里，
+    比每条记录一个字典占用的内存小得多。INTERNED 中的低基数字符串字段（分类、状态、用户名等）
+    会做字符串驻留，成千上万条记录共享同一个字符串对象。
+
+    记录实现了只读的 Mapping 接口，record.get('name')、dict(record)、{**record} 等用法与字典相同。
+    """
+
+    __slots__ = ('_values', '_extra')
+
+    # 固定字段（按JSON文件中的顺序）
+    FIELDS = ()
+    # 需要字符串驻留的字段
+    INTERNED = frozenset()
+    # 嵌套记录字段: 字段名 -> 记录类（值为列表）
+    NESTED = {}
+    # 必填字段
+    REQUIRED = ()
+    # 字段类型检查: 字段名 -> 允许的类型
+    TYPES = {}
+
+    _INDEX = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._INDEX = {field: i for i, field in enumerate(cls.FIELDS)}
+
+    def __init__(self, values, extra=None):
+        self._values = values
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """从字典（JSON解析结果）创建记录"""
+        if isinstance(data, cls):
+            return data
+        values = [_MISSING] * len(cls.FIELDS)
+        extra = None
+        index = cls._INDEX
+        for key, value in data.items():
+            if key in cls.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            elif key in cls.NESTED and isinstance(value, list):
+                nested = cls.NESTED[key]
+                value = [nested.from_dict(v) if isinstance(v, Mapping) else v for v in value]
+            i = index.get(key)
+            if i is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            else:
+                values[i] = value
+        return cls(tuple(values), extra)
+
+    def to_dict(self):
+        """转换为可以JSON序列化的字典"""
+        return {key: self[key] for key in self}
+
+    @classmethod
+    def validate(cls, data):
+        """快速检查必填字段和字段类型，返回错误信息，没有错误时返回None"""
+        if not isinstance(data, Mapping):
+            return "记录必须是JSON对象"
+        for field in cls.REQUIRED:
+            if data.get(field) is None:
+                return f"缺少必填字段: {field}"
+        for field, types in cls.TYPES.items():
+            value = data.get(field)
+            if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+                return f"字段类型错误: {field}"
+        return None
+
+    def __getitem__(self, key):
+        i = self._INDEX.get(key)
+        if i is not None:
+            value = self._values[i]
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        i = self._INDEX.get(key)
+        if i is not None:
+            value = self._values[i]
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for field, value in zip(self.FIELDS, self._values):
+            if value is not _MISSING:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not _MISSING) + len(self._extra or ())
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def __reduce__(self):
+        # 直接序列化值元组，启动快照载入时不需要重新逐字段构造
+        return (type(self), (self._values, self._extra))
+
+
+class Dish(Record):
+    """菜品"""
+
+    __slots__ = ()
+    FIELDS = ('id', 'name', 'category', 'price', 'description', 'ingredients', 'steps',
+              'image_path', 'timestamp', 'prep_minutes')
+    INTERNED = frozenset(('id', 'category'))
+    REQUIRED = ('name', 'category', 'price')
+    TYPES = {'name': str, 'category': str, 'price': (int, float), 'prep_minutes': (int, float)}
+
+
+class OrderItem(Record):
+    """订单中的一项菜品"""
+
+    __slots__ = ()
+    FIELDS = ('dish_id', 'dish_name', 'quantity', 'price', 'total', 'image_path')
+    INTERNED = frozenset(('dish_id', 'dish_name', 'image_path'))
+
+
+class Order(Record):
+    """订单"""
+
+    __slots__ = ()
+    FIELDS = ('id', 'items', 'total_price', 'status', 'timestamp', 'note', 'priority', 'updated_at')
+    INTERNED = frozenset(('status',))
+    NESTED = {'items': OrderItem}
+    REQUIRED = ('items', 'total_price', 'status')
+    TYPES = {'items': list, 'total_price': (int, float), 'status': str, 'priority': int}
+
+
+class Review(Record):
+    """评价"""
+
+    __slots__ = ()
+    FIELDS = ('id', 'dish_id', 'order_id', 'rating', 'comment', 'image_paths', 'timestamp',
+              'user_name', 'updated_at')
+    INTERNED = frozenset(('dish_id', 'order_id', 'user_name'))
+    REQUIRED = ('dish_id', 'rating', 'comment')
+    TYPES = {'dish_id': str, 'rating': (int, float), 'comment': str}
+
+    @classmethod
+    def validate(cls, data):
+        error = super().validate(data)
+        if error is None and not (1 <= data['rating'] <= 5):
+            return "评分必须在1-5之间"
+        return error
+
+
+# 集合名 -> 记录类
+COLLECTION_MODELS = {
+    'dishes': Dish,
+    'orders': Order,
+    'reviews': Review
+}
+
+
+# json.dump 的 default 参数：把记录编码为字典
+def encode_record(obj):
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# 把JSON解析出的列表转换为记录
+def decode_records(collection, data):
+    model = COLLECTION_MODELS.get(collection)
+    if model is None:
+        return data
+    return [model.from_dict(r) if isinstance(r, Mapping) else r for r in data]
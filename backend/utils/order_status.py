@@ -0,0 +1,82 @@
+import threading
+
+from .data_store import CollectionIndex, register_index
+
+# 订单状态
+ORDER_STATUSES = ('pending', 'cooking', 'ready', 'completed', 'cancelled')
+
+# 允许的状态转换：当前状态 -> 可以变更到的状态
+# 已完成和已取消是终止状态
+STATUS_TRANSITIONS = {
+    'pending': ('cooking', 'ready', 'completed', 'cancelled'),
+    'cooking': ('pending', 'ready', 'completed', 'cancelled'),
+    'ready': ('cooking', 'completed', 'cancelled'),
+    'completed': (),
+    'cancelled': ()
+}
+
+
+class InvalidTransition(Exception):
+    """不允许的订单状态转换"""
+
+    def __init__(self, current, target):
+        self.current = current
+        self.target = target
+        self.allowed = STATUS_TRANSITIONS.get(current, ())
+        super().__init__(f"订单状态不能从 {current} 变更为 {target}")
+
+
+# 检查状态转换，不允许时抛出 InvalidTransition
+def check_transition(current, target):
+    if current in STATUS_TRANSITIONS and target not in STATUS_TRANSITIONS[current]:
+        raise InvalidTransition(current, target)
+
+
+@register_index('order_status')
+class OrderStatusIndex(CollectionIndex):
+    """按状态维护的订单ID集合，计数为 O(1)，按状态列出订单与结果数量成正比"""
+
+    collection = 'orders'
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def _add(self, order):
+        self._ids.setdefault(order.get('status'), set()).add(order.get('id'))
+
+    def _remove(self, order):
+        ids = self._ids.get(order.get('status'))
+        if ids is not None:
+            ids.discard(order.get('id'))
+
+    def rebuild(self, records):
+        with self._lock:
+            self._ids = {}
+            for order in records:
+                self._add(order)
+
+    def on_insert(self, record):
+        with self._lock:
+            self._add(record)
+
+    def on_update(self, old, new):
+        with self._lock:
+            self._remove(old)
+            self._add(new)
+
+    def on_delete(self, old):
+        with self._lock:
+            self._remove(old)
+
+    def ids(self, status):
+        """某个状态下的订单ID"""
+        with self._lock:
+            return list(self._ids.get(status, ()))
+
+    def counts(self):
+        """各状态的订单数量"""
+        with self._lock:
+            counts = {status: len(self._ids.get(status, ())) for status in ORDER_STATUSES}
+            counts['total'] = sum(len(ids) for ids in self._ids.values())
+            return counts
@@ -0,0 +1,276 @@
+import os
+import io
+import sys
+import hmac
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+from flask import g, request
+
+# 调试接口的访问令牌（请求头 X-Debug-Token），未设置时调试接口不可用
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
+
+# 调用栈采样间隔（秒）和最大深度
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+
+# 保留的 tracemalloc 快照数
+MAX_SNAPSHOTS = 2
+
+
+def worker_processes():
+    """服务的工作进程数（由 server.py 和 gunicorn.conf.py 在fork时设置，单进程运行时为1）"""
+    return int(os.environ.get('WEB_WORKER_PROCESSES', 1))
+
+
+def debug_allowed():
+    """请求是否带有正确的调试令牌"""
+    if not DEBUG_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Debug-Token', ''), DEBUG_TOKEN)
+
+
+# 去掉多家庭路由的前缀，例如 household_dishes.get_all_dishes -> dishes.get_all_dishes
+def endpoint_name(endpoint):
+    endpoint = endpoint or ''
+    if endpoint.startswith('household_'):
+        endpoint = endpoint[len('household_'):]
+    return endpoint
+
+
+# 接口是否匹配过滤条件（完整名称 dishes.get_all_dishes 或函数名 get_all_dishes）
+def endpoint_matches(pattern, endpoint):
+    if not pattern:
+        return True
+    name = endpoint_name(endpoint)
+    return pattern == name or pattern == name.rsplit('.', 1)[-1]
+
+
+# 调用栈的折叠格式（从外到内，分号分隔）
+def collapse_stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class ProfileSession:
+    """一次性能分析会话：接下来的 N 个请求或一段时间内匹配接口的请求"""
+
+    def __init__(self, requests=None, seconds=None, endpoint=None):
+        self.remaining = requests
+        self.until = time.time() + seconds if seconds else None
+        self.endpoint = endpoint
+        self.started = time.time()
+        self.profiled = 0
+        self.stats = None           # 合并后的 pstats.Stats
+        self.samples = Counter()    # 折叠调用栈 -> 采样次数
+        self.threads = set()        # 正在被分析的请求线程
+
+    def finished(self):
+        return self.remaining == 0 or (self.until is not None and time.time() >= self.until)
+
+    def info(self):
+        return {
+            'endpoint': self.endpoint,
+            'remaining_requests': self.remaining,
+            'seconds_left': round(max(0, self.until - time.time()), 1) if self.until else None,
+            'profiled_requests': self.profiled,
+            'samples': sum(self.samples.values()),
+            'finished': self.finished(),
+            'pid': os.getpid()
+        }
+
+
+class RequestProfiler:
+    """
+    按需开启的请求性能分析
+
+    会话、分析结果和内存快照都只保存在当前进程中，因此只在单个工作进程时可用（见 routes/debug.py）。
+    关闭时请求钩子只检查 active 一个属性，没有其他开销。
+    cProfile 同一时刻只分析一个请求（并发的其他请求直接跳过），
+    分析期间另有一个采样线程定时记录被分析请求的调用栈，用于生成火焰图（折叠栈格式）。
+    tracemalloc 开启后按接口统计每个请求的内存净增长和峰值（并发请求会互相影响，只作参考）。
+    """
+
+    def __init__(self):
+        self.active = False
+        self.session = None
+        self.tracing = False
+        self.allocations = {}  # 接口 -> {'requests', 'net_bytes', 'max_peak_bytes'}
+        self.snapshots = []
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+
+    def _update_active(self):
+        self.active = self.tracing or (self.session is not None and not self.session.finished())
+
+    # ---- cProfile ----
+
+    def start(self, requests=None, seconds=None, endpoint=None):
+        with self._lock:
+            self.session = ProfileSession(requests, seconds, endpoint)
+            self._update_active()
+        threading.Thread(target=self._sample, args=(self.session,), name='profile-sampler', daemon=True).start()
+        return self.session.info()
+
+    def stop(self):
+        with self._lock:
+            session, self.session = self.session, None
+            self._update_active()
+        return session.info() if session else None
+
+    def _sample(self, session):
+        while self.session is session and not session.finished():
+            frames = sys._current_frames()
+            for thread_id in list(session.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    session.samples[collapse_stack(frame)] += 1
+            time.sleep(SAMPLE_INTERVAL)
+        with self._lock:
+            self._update_active()
+
+    def _claim(self, session):
+        with self._lock:
+            if session.finished():
+                self._update_active()
+                return False
+            if session.remaining is not None:
+                session.remaining -= 1
+            return True
+
+    def begin_request(self):
+        session = self.session
+        if session is not None and endpoint_matches(session.endpoint, request.endpoint):
+            if self._profile_lock.acquire(blocking=False):
+                if self._claim(session):
+                    profile = cProfile.Profile()
+                    try:
+                        profile.enable()
+                        session.threads.add(threading.get_ident())
+                        g._profile = (session, profile)
+                    except ValueError:  # 其他分析工具正在运行
+                        self._profile_lock.release()
+                else:
+                    self._profile_lock.release()
+        if self.tracing and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            g._alloc_start = tracemalloc.get_traced_memory()[0]
+
+    def end_request(self):
+        entry = g.pop('_profile', None)
+        if entry is not None:
+            session, profile = entry
+            profile.disable()
+            session.threads.discard(threading.get_ident())
+            self._profile_lock.release()
+            with self._lock:
+                if session.stats is None:
+                    session.stats = pstats.Stats(profile)
+                else:
+                    session.stats.add(profile)
+                session.profiled += 1
+                self._update_active()
+        start = g.pop('_alloc_start', None)
+        if start is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            with self._lock:
+                entry = self.allocations.setdefault(endpoint_name(request.endpoint),
+                                                    {'requests': 0, 'net_bytes': 0, 'max_peak_bytes': 0})
+                entry['requests'] += 1
+                entry['net_bytes'] += current - start
+                entry['max_peak_bytes'] = max(entry['max_peak_bytes'], peak - start)
+
+    def report(self, fmt='pstats', sort='cumulative', limit=50):
+        """分析结果：pstats 文本或折叠调用栈"""
+        session = self.session
+        if session is None:
+            return None
+        with self._lock:
+            if fmt == 'collapsed':
+                return '\n'.join(f'{stack} {count}' for stack, count in session.samples.most_common())
+            if session.stats is None:
+                return ''
+            stream = io.StringIO()
+            stats = pstats.Stats(stream=stream)
+            stats.add(session.stats)
+            stats.sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+    # ---- tracemalloc ----
+
+    def start_tracing(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        with self._lock:
+            self.tracing = True
+            self.allocations = {}
+            self.snapshots = []
+            self._update_active()
+
+    def stop_tracing(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with self._lock:
+            self.tracing = False
+            self.snapshots = []
+            self._update_active()
+
+    def take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>')
+        ))
+        with self._lock:
+            self.snapshots = (self.snapshots + [snapshot])[-MAX_SNAPSHOTS:]
+            return len(self.snapshots)
+
+    def snapshot_diff(self, key='lineno', limit=20):
+        """最近两个快照的差异（只有一个快照时为该快照的统计）"""
+        with self._lock:
+            snapshots = list(self.snapshots)
+        if not snapshots:
+            return None
+        if len(snapshots) == 1:
+            stats = snapshots[0].statistics(key)[:limit]
+            return [{'trace': str(s.traceback), 'size': s.size, 'count': s.count} for s in stats]
+        stats = snapshots[-1].compare_to(snapshots[-2], key)[:limit]
+        return [{'trace': str(s.traceback), 'size': s.size, 'size_diff': s.size_diff,
+                 'count': s.count, 'count_diff': s.count_diff} for s in stats]
+
+    def tracing_info(self):
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            return {
+                'tracing': tracemalloc.is_tracing(),
+                'traced_bytes': current,
+                'peak_bytes': peak,
+                'snapshots': len(self.snapshots),
+                'pid': os.getpid(),
+                'endpoints': {name: dict(entry) for name, entry in self.allocations.items()}
+            }
+
+
+# 全局请求分析器
+profiler = RequestProfiler()
+
+
+def install_profiling(app):
+    """注册请求钩子，分析器关闭时每个请求只检查一个属性"""
+    @app.before_request
+    def begin_profiling():
+        if profiler.active:
+            profiler.begin_request()
+
+    @app.teardown_request
+    def end_profiling(exc):
+        if '_profile' in g or '_alloc_start' in g:
+            profiler.end_request()
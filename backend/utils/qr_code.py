@@ -1,17 +1,163 @@
-# 这个文件保留原来的函数接口，但不再动态生成二维码
-# 前端会直接使用静态的微信收款码.jpg
+import os
+import io
+import hashlib
+import threading
+from collections import OrderedDict
 
-def generate_qr_code(data, box_size=10, border=4):
+try:
+    import qrcode
+    import qrcode.image.svg
+except ImportError:  # 未安装 qrcode 时不生成二维码，前端退回使用静态的微信收款码.jpg
+    qrcode = None
+
+from .image_pool import image_pool
+
+# 二维码的磁盘缓存目录（按内容哈希命名，可以安全地在多个进程和重启之间共享）
+QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'cache', 'qr'))
+
+# 二维码内存缓存总大小上限（字节）
+QR_CACHE_BYTES = int(os.environ.get('QR_CACHE_BYTES', 4 * 1024 * 1024))
+
+# 支付链接模板，可使用 {order_id} 和 {amount}；未设置时二维码内容为订单号和金额
+PAYMENT_LINK = os.environ.get('PAYMENT_LINK', '')
+
+# 支持的输出格式
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+
+class QRCache:
     """
-    不再动态生成二维码，保留函数接口以兼容现有代码
+    二维码渲染结果缓存
+
+    以“格式 + 尺寸 + 内容”的哈希为键，内存中按LRU保留热点条目，磁盘上保留全部条目。
+    内容不变的二维码只渲染一次。
     """
-    # 返回一个占位符URL，实际上前端会使用静态图片
-    return "占位符，前端将使用静态图片"
+
+    def __init__(self, directory=QR_CACHE_DIR, max_bytes=QR_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 键 -> 字节
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, f'{key}.{fmt}')
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get(self, key, fmt):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        try:
+            with open(self._path(key, fmt), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, fmt, data):
+        self._remember(key, data)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key, fmt)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入二维码缓存失败: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
+
+
+# 全局二维码缓存
+qr_cache = QRCache()
+
+
+# 渲染二维码图片（在图片线程池中执行）
+def _render(data, fmt, box_size, border):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    factory = qrcode.image.svg.SvgPathImage if fmt == 'svg' else None
+    buffer = io.BytesIO()
+    qr.make_image(image_factory=factory).save(buffer)
+    return buffer.getvalue()
+
+
+def qr_key(data, fmt='png', box_size=10, border=4):
+    """二维码缓存键（同时用作ETag），不渲染即可计算"""
+    return hashlib.sha256(f'{fmt}:{box_size}:{border}:{data}'.encode('utf-8')).hexdigest()
+
+
+def render_qr(data, fmt='png', box_size=10, border=4):
+    """
+    生成二维码，返回 (缓存键, 图片字节)
+
+    先查内存和磁盘缓存，未命中时在图片线程池中渲染（队列已满时抛出 ImagePoolBusy）。
+    未安装 qrcode 时图片字节为 None。
+    """
+    key = qr_key(data, fmt, box_size, border)
+    if qrcode is None:
+        return key, None
+    body = qr_cache.get(key, fmt)
+    if body is None:
+        body = image_pool.run(_render, data, fmt, box_size, border)
+        qr_cache.put(key, fmt, body)
+    return key, body
+
+
+def order_payload(order):
+    """订单二维码的内容：配置了支付链接时为支付链接，否则为订单号和金额"""
+    amount = f"{float(order.get('total_price') or 0):.2f}"
+    if PAYMENT_LINK:
+        return PAYMENT_LINK.format(order_id=order.get('id'), amount=amount)
+    return f"订单号: {order.get('id')}\n金额: ¥{amount}"
+
+
+def generate_qr_code(data, box_size=10, border=4):
+    """生成PNG格式的二维码，未安装 qrcode 时返回None"""
+    return render_qr(data, 'png', box_size, border)[1]
 
 def generate_dish_qr_code(dish_data):
-    """为菜品生成二维码（仅保留接口）"""
-    return generate_qr_code(dish_data)
+    """为菜品生成二维码（菜名和价格）"""
+    return generate_qr_code(f"菜品: {dish_data.get('name')}\n价格: ¥{float(dish_data.get('price') or 0):.2f}")
 
 def generate_order_qr_code(order_data):
-    """为订单生成二维码（仅保留接口）"""
-    return generate_qr_code(order_data)
\ No newline at end of file
+    """为订单生成二维码（订单号、金额或支付链接）"""
+    return generate_qr_code(order_payload(order_data))
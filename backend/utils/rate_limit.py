@@ -0,0 +1,199 @@
+import os
+import re
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+# 是否启用限流（RATE_LIMIT=0 关闭）
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT', '1') not in ('0', 'false', 'off')
+
+
+# 解析 "每秒令牌数,桶容量" 格式的配置
+def _budget(name, default):
+    rate, burst = os.environ.get(name, default).split(',')
+    return float(rate), float(burst)
+
+
+# 各类请求的预算: 类别 -> (每秒补充的令牌数, 桶容量即允许的突发请求数)
+# 每个客户端每类请求一个令牌桶，每个请求消耗一个令牌；分块上传的分块按字节数消耗图片令牌（见 IMAGE_TOKEN_BYTES）
+RATE_LIMITS = {
+    'read': _budget('RATE_LIMIT_READS', '20,100'),
+    'write': _budget('RATE_LIMIT_WRITES', '2,30'),
+    'image': _budget('RATE_LIMIT_IMAGES', '0.5,10')
+}
+
+# 请求体超过该大小（字节）的写请求按图片上传计算（base64图片随JSON一起提交）
+IMAGE_BODY_BYTES = 64 * 1024
+
+# 分块上传时每个图片令牌对应的字节数（约一张照片），分块按实际字节数消耗令牌
+IMAGE_TOKEN_BYTES = int(os.environ.get('RATE_LIMIT_IMAGE_BYTES', 1024 * 1024))
+
+# 最多跟踪的客户端数，超过后淘汰最久未访问的客户端（令牌桶已满的客户端淘汰后没有任何区别）
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', 10000))
+
+# 服务部署在反向代理之后时，X-Forwarded-For 中由可信代理追加的地址数；0 表示直接使用连接地址
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))
+
+# 健康检查中统计“最近被限流”的时间窗口（秒）
+RECENT_SECONDS = 60
+
+# 不限流的接口
+EXEMPT_PATHS = ('/api/health',)
+EXEMPT_PREFIXES = ('/api/debug/',)
+
+# 上传分块的路径（PUT /uploads/<id>）
+_UPLOAD_CHUNK_PATH = re.compile(r'^/api/(households/[^/]+/)?uploads/[^/]+/?$')
+
+
+def request_class(method, path, content_length=None):
+    """
+    请求的限流类别：read、write 或 image；不限流的请求返回None
+
+    分块上传的每个分块都按 image 计（消耗的令牌数见 request_cost）；
+    创建会话、完成和取消按 write 计，查询进度按 read 计。
+    """
+    if not path.startswith('/api/') or method == 'OPTIONS':
+        return None
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if method in ('GET', 'HEAD'):
+        return 'read'
+    if (method == 'PUT' and _UPLOAD_CHUNK_PATH.match(path)) or (content_length or 0) > IMAGE_BODY_BYTES:
+        return 'image'
+    return 'write'
+
+
+def request_cost(method, path, content_length=None):
+    """
+    请求消耗的令牌数：上传分块按字节数计（每 IMAGE_TOKEN_BYTES 字节一个令牌），其他请求为1
+
+    分块请求没有 Content-Length（分块传输编码）时按一个令牌计，单个分块不会超过一张照片的大小。
+    """
+    if method == 'PUT' and _UPLOAD_CHUNK_PATH.match(path) and content_length is not None:
+        return content_length / IMAGE_TOKEN_BYTES
+    return 1
+
+
+def client_key(forwarded_for, remote_addr):
+    """
+    客户端标识：客户端IP
+
+    不使用客户端自己提供的标识（例如设备令牌），否则每次请求换一个值就能绕过限流。
+    RATE_LIMIT_PROXY_HOPS 大于0时，客户端IP取 X-Forwarded-For 中倒数第 N 个地址（由最外层可信代理写入）。
+    """
+    if RATE_LIMIT_PROXY_HOPS and forwarded_for:
+        addresses = [a.strip() for a in forwarded_for.split(',') if a.strip()]
+        if len(addresses) >= RATE_LIMIT_PROXY_HOPS:
+            return f'ip:{addresses[-RATE_LIMIT_PROXY_HOPS]}'
+    return f'ip:{remote_addr or ""}'
+
+
+class TokenBucket:
+    """令牌桶：按 rate 每秒补充令牌，最多 burst 个"""
+
+    __slots__ = ('tokens', 'updated', 'rejected_at')
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+        self.rejected_at = None  # 最近一次被限流的时间
+
+    def take(self, rate, burst, now, cost=1):
+        """取 cost 个令牌（不超过桶容量），成功返回0，否则返回需要等待的秒数"""
+        cost = min(cost, burst)
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        self.rejected_at = now
+        return (cost - self.tokens) / rate if rate > 0 else math.inf
+
+
+class RateLimiter:
+    """
+    按客户端和请求类别的令牌桶限流
+
+    令牌桶保存在内存中，以LRU方式最多保留 max_clients 个客户端；
+    多进程部署时每个工作进程各自计数，单个客户端的实际上限约为配置值乘以进程数。
+    """
+
+    def __init__(self, limits=RATE_LIMITS, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # (客户端, 类别) -> TokenBucket
+        self._lock = threading.Lock()
+        self.allowed = {name: 0 for name in limits}
+        self.rejected = {name: 0 for name in limits}
+
+    def acquire(self, client, request_type, cost=1):
+        """为请求取 cost 个令牌，允许时返回0，否则返回建议的 Retry-After 秒数"""
+        rate, burst = self.limits[request_type]
+        now = time.monotonic()
+        key = (client, request_type)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(burst, now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(rate, burst, now, cost)
+            if wait:
+                self.rejected[request_type] += 1
+                return max(1, math.ceil(min(wait, 3600)))
+            self.allowed[request_type] += 1
+            return 0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            throttled = {name: 0 for name in self.limits}
+            for (_, request_type), bucket in self._buckets.items():
+                if bucket.rejected_at is not None and now - bucket.rejected_at < RECENT_SECONDS:
+                    throttled[request_type] += 1
+            return {
+                'enabled': RATE_LIMIT_ENABLED,
+                'tracked': len(self._buckets),
+                'max_tracked': self.max_clients,
+                'overloaded': any(throttled.values()),
+                'classes': {name: {
+                    'rate': rate,
+                    'burst': burst,
+                    'allowed': self.allowed[name],
+                    'rejected': self.rejected[name],
+                    'throttled_clients': throttled[name]  # 最近 RECENT_SECONDS 秒内被限流的客户端数
+                } for name, (rate, burst) in self.limits.items()}
+            }
+
+
+# 全局限流器
+rate_limiter = RateLimiter()
+
+
+def limit_error(retry_after):
+    """超出限流时的响应体和响应头"""
+    return {"error": "请求过于频繁，请稍后重试", "retry_after": retry_after}, {'Retry-After': str(retry_after)}
+
+
+def install_rate_limits(app):
+    """注册限流的请求钩子（RATE_LIMIT=0 时不注册）"""
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    @app.before_request
+    def check_rate_limit():
+        request_type = request_class(request.method, request.path, request.content_length)
+        if request_type is None:
+            return None
+        client = client_key(request.headers.get('X-Forwarded-For'), request.remote_addr)
+        cost = request_cost(request.method, request.path, request.content_length)
+        retry_after = rate_limiter.acquire(client, request_type, cost)
+        if retry_after:
+            body, headers = limit_error(retry_after)
+            return jsonify(body), 429, headers
+        return None
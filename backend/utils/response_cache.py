@@ -0,0 +1,137 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response, Response
+
+from .data_store import get_store, current_tenant_id
+
+# 响应缓存的内存上限（字节）
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 8 * 1024 * 1024))
+
+# 小于该大小的响应不做gzip压缩
+GZIP_MIN_SIZE = 512
+
+
+class CachedResponse:
+    """缓存的响应：原始字节、预压缩的gzip字节和ETag"""
+
+    __slots__ = ('versions', 'body', 'gzip_body', 'mimetype', 'etag')
+
+    def __init__(self, versions, body, mimetype):
+        self.versions = versions
+        self.body = body
+        self.gzip_body = gzip.compress(body, 6) if len(body) >= GZIP_MIN_SIZE else None
+        self.mimetype = mimetype
+        self.etag = hashlib.md5(body).hexdigest()
+
+    @property
+    def size(self):
+        return len(self.body) + (len(self.gzip_body) if self.gzip_body else 0)
+
+
+class ResponseCache:
+    """
+    序列化响应缓存
+
+    以“家庭 + 接口 + 路径参数 + 查询参数”为键缓存响应字节，每个条目记录生成时所依赖集合的版本号，
+    集合一旦被写入（版本号变化）条目即失效并被同一个键的新响应替换。
+    总大小超过上限时按LRU淘汰。
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# 全局响应缓存
+response_cache = ResponseCache()
+
+
+# 把缓存条目转换成响应（按需返回gzip版本，支持If-None-Match）
+def _to_response(entry):
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    elif entry.gzip_body is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(entry.gzip_body, mimetype=entry.mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def cached_response(*collections, extra=None):
+    """
+    读接口缓存装饰器
+
+    collections 为接口依赖的数据集合，例如菜单依赖 'dishes' 和 'reviews'。
+    extra 为可选函数，返回当前请求额外依赖的集合（例如只有按热度排序时才依赖 'orders'）。
+    只缓存状态码为200的响应。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store = get_store()
+            # 版本号必须在执行视图之前读取，视图执行期间发生的写入会让条目在下次请求时失效
+            names = collections + tuple(extra()) if extra is not None else collections
+            versions = tuple(store.version(name) for name in names)
+            key = (current_tenant_id(), request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))))
+
+            entry = response_cache.get(key, versions)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                entry = CachedResponse(versions, response.get_data(), response.mimetype)
+                response_cache.put(key, entry)
+            return _to_response(entry)
+        return wrapper
+    return decorator
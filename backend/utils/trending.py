@@ -0,0 +1,152 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+from .data_store import CollectionIndex, register_index
+
+# 热度的半衰期（小时）：一次点单或评价的贡献每过一个半衰期减半
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 72))
+
+# 评价热度的权重（相对于点一份菜）
+REVIEW_WEIGHT = 2.0
+
+# 热度低于该值的菜品从计数中移除
+MIN_SCORE = 1e-9
+
+
+# 把记录中的ISO时间转换为时间戳，无效时返回None
+def _timestamp(record):
+    try:
+        return datetime.fromisoformat(record.get('timestamp')).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class DecayedCounters:
+    """
+    按指数衰减的计数：每个键保存 [分值, 分值对应的时间]
+
+    增加一次事件只更新该键的分值（先把旧分值衰减到事件时间再加上权重），为 O(1)；
+    早于当前时间的事件（重建时按历史记录顺序不一定有序）把权重衰减到该键的时间后再加。
+    所有键按相同的速率衰减，排序结果只在有新事件时才会变化。
+    """
+
+    __slots__ = ('half_life', '_scores')
+
+    def __init__(self, half_life):
+        self.half_life = half_life
+        self._scores = {}
+
+    def _decay(self, seconds):
+        return 0.5 ** (seconds / self.half_life)
+
+    def add(self, key, weight, at):
+        entry = self._scores.get(key)
+        if entry is None:
+            if weight > 0:
+                self._scores[key] = [weight, at]
+            return
+        if at >= entry[1]:
+            entry[0] = entry[0] * self._decay(at - entry[1]) + weight
+            entry[1] = at
+        else:
+            entry[0] += weight * self._decay(entry[1] - at)
+        if entry[0] < MIN_SCORE:
+            del self._scores[key]
+
+    def value(self, key, now):
+        entry = self._scores.get(key)
+        if entry is None:
+            return 0.0
+        return entry[0] * self._decay(max(0.0, now - entry[1]))
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class TrendIndex(CollectionIndex):
+    """
+    热度索引基类：把每条记录转换为若干 (菜品ID, 权重) 事件计入衰减计数
+
+    删除或修改记录时以负权重抵消原来的贡献。
+    """
+
+    def __init__(self):
+        self._counters = DecayedCounters(TRENDING_HALF_LIFE_HOURS * 3600)
+        self._lock = threading.Lock()
+
+    def events(self, record):
+        raise NotImplementedError
+
+    def _apply(self, record, sign):
+        at = _timestamp(record)
+        if at is None:
+            return
+        for dish_id, weight in self.events(record):
+            self._counters.add(dish_id, sign * weight, at)
+
+    def rebuild(self, records):
+        with self._lock:
+            self._counters = DecayedCounters(TRENDING_HALF_LIFE_HOURS * 3600)
+            for record in records:
+                self._apply(record, 1)
+
+    def on_insert(self, record):
+        with self._lock:
+            self._apply(record, 1)
+
+    def on_update(self, old, new):
+        if self.events(old) == self.events(new) and old.get('timestamp') == new.get('timestamp'):
+            return
+        with self._lock:
+            self._apply(old, -1)
+            self._apply(new, 1)
+
+    def on_delete(self, old):
+        with self._lock:
+            self._apply(old, -1)
+
+    def scores(self, dish_ids, now):
+        with self._lock:
+            return {dish_id: self._counters.value(dish_id, now) for dish_id in dish_ids}
+
+
+@register_index('dish_order_trend')
+class DishOrderTrendIndex(TrendIndex):
+    """按菜品的点单热度：每份计1（已取消的订单不计）"""
+
+    collection = 'orders'
+
+    def events(self, order):
+        if order.get('status') == 'cancelled':
+            return []
+        return [(item.get('dish_id'), item.get('quantity', 1)) for item in order.get('items') or ()
+                if item.get('dish_id') is not None and isinstance(item.get('quantity', 1), (int, float))]
+
+
+@register_index('dish_review_trend')
+class DishReviewTrendIndex(TrendIndex):
+    """按菜品的评价热度：每条评价按 评分/5 计"""
+
+    collection = 'reviews'
+
+    def events(self, review):
+        rating = review.get('rating', 0)
+        if review.get('dish_id') is None or not isinstance(rating, (int, float)):
+            return []
+        return [(review.get('dish_id'), rating / 5)]
+
+
+def trending_scores(orders, reviews, dish_ids, now=None):
+    """菜品ID -> 当前热度（点单热度 + REVIEW_WEIGHT * 评价热度）"""
+    now = time.time() if now is None else now
+    order_scores = orders.scores(dish_ids, now)
+    review_scores = reviews.scores(dish_ids, now)
+    return {dish_id: order_scores[dish_id] + REVIEW_WEIGHT * review_scores[dish_id] for dish_id in dish_ids}
+
+
+def sort_trending(orders, reviews, dishes):
+    """按热度从高到低排列菜品，热度相同时保持原有顺序"""
+    scores = trending_scores(orders, reviews, [dish.get('id') for dish in dishes])
+    return sorted(dishes, key=lambda dish: scores[dish.get('id')], reverse=True)
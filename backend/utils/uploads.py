@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+
+from flask import jsonify
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只做进程内的串行化
+    fcntl = None
+
+# 分块上传的暂存目录（不在 static 下，未完成的上传不会被直接访问）
+UPLOAD_STAGING_DIR = os.environ.get('UPLOAD_STAGING_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tmp', 'uploads'))
+
+# 建议的分块大小（字节），单个分块不能超过 UPLOAD_MAX_CHUNK
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 256 * 1024))
+UPLOAD_MAX_CHUNK = 4 * UPLOAD_CHUNK_SIZE
+
+# 单个文件的大小上限（字节）
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+
+# 上传会话多久没有活动后过期（秒），包括已完成但未被菜品或评价使用的上传
+UPLOAD_TTL = int(os.environ.get('UPLOAD_TTL', 3600))
+
+# 两次清理过期会话的最小间隔（秒）
+SWEEP_INTERVAL = 60
+
+
+class UploadError(Exception):
+    """上传会话不存在、已过期或状态不允许当前操作"""
+
+    def __init__(self, message, status=400, offset=None):
+        self.status = status
+        self.offset = offset
+        super().__init__(message)
+
+
+class UploadManager:
+    """
+    可续传的分块上传
+
+    每个会话在暂存目录下有三个文件：<id>.json 记录总大小，<id>.part 为已接收的数据，
+    完成后 .part 改名为 <id>.done。已接收的字节数就是 .part 文件的大小，不需要额外保存进度。
+    写入分块、完成、使用和删除会话都持有该会话的文件锁（<id>.lock），
+    多个工作进程处理同一会话的分块（例如客户端重发的分块）时依次执行，不会重复追加数据。
+    """
+
+    def __init__(self, directory=UPLOAD_STAGING_DIR, ttl=UPLOAD_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()  # 没有 fcntl 时代替会话文件锁
+        self._last_sweep = 0
+
+    def _path(self, upload_id, suffix):
+        # 上传ID必须是UUID，避免拼接出暂存目录之外的路径
+        try:
+            upload_id = str(uuid.UUID(upload_id))
+        except (ValueError, TypeError, AttributeError):
+            raise UploadError("上传会话不存在", 404)
+        return os.path.join(self.directory, f'{upload_id}.{suffix}')
+
+    def _meta(self, upload_id):
+        try:
+            with open(self._path(upload_id, 'json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise UploadError("上传会话不存在或已过期", 404)
+
+    @contextmanager
+    def _session_lock(self, upload_id, blocking=True):
+        """
+        会话锁（跨进程），会话不存在时抛出 UploadError
+
+        blocking=False 时不等待，拿不到锁返回 False（清理过期会话时跳过正在使用的会话）。
+        """
+        lock_path = self._path(upload_id, 'lock')
+        if not os.path.exists(self._path(upload_id, 'json')):  # 不为不存在的会话创建锁文件
+            raise UploadError("上传会话不存在或已过期", 404)
+        if fcntl is None:
+            if not self._lock.acquire(blocking):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                self._lock.release()
+            return
+        with open(lock_path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _remove(self, upload_id):
+        """删除会话的所有文件（调用方持有会话锁）"""
+        for suffix in ('json', 'part', 'done', 'lock'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def sweep(self, force=False):
+        """删除过期的会话，返回删除的数量"""
+        now = time.time()
+        if not force and now - self._last_sweep < SWEEP_INTERVAL:
+            return 0
+        self._last_sweep = now
+        removed = 0
+        try:
+            names = set(os.listdir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            upload_id, _, suffix = name.partition('.')
+            if suffix == 'lock' and f'{upload_id}.json' not in names:
+                # 会话已删除但残留的锁文件
+                self._remove_stale_lock(upload_id, now)
+                continue
+            if suffix != 'json' or not self._expired(upload_id, now):
+                continue
+            try:
+                with self._session_lock(upload_id, blocking=False) as locked:
+                    # 正在写入的会话跳过；拿到锁后再检查一次，期间可能刚收到分块
+                    if locked and self._expired(upload_id, now):
+                        self._remove(upload_id)
+                        removed += 1
+            except UploadError:  # 已被其他进程删除
+                pass
+        return removed
+
+    def _expired(self, upload_id, now):
+        stamps = []
+        for s in ('json', 'part', 'done'):
+            try:
+                stamps.append(os.path.getmtime(os.path.join(self.directory, f'{upload_id}.{s}')))
+            except OSError:
+                pass
+        return bool(stamps) and now - max(stamps) > self.ttl
+
+    def _remove_stale_lock(self, upload_id, now):
+        path = os.path.join(self.directory, f'{upload_id}.lock')
+        try:
+            if now - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def status(self, upload_id):
+        """会话状态：总大小、已接收字节数（即下一个分块的偏移量）和是否已完成"""
+        meta = self._meta(upload_id)
+        if os.path.exists(self._path(upload_id, 'done')):
+            offset, complete = meta['size'], True
+        else:
+            try:
+                offset = os.path.getsize(self._path(upload_id, 'part'))
+            except FileNotFoundError:
+                raise UploadError("上传会话不存在或已过期", 404)
+            complete = False
+        return {
+            'upload_id': upload_id,
+            'size': meta['size'],
+            'offset': offset,
+            'complete': complete,
+            'chunk_size': UPLOAD_CHUNK_SIZE
+        }
+
+    def create(self, size, content_type=None):
+        """创建上传会话"""
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise UploadError("文件大小无效")
+        if size > UPLOAD_MAX_BYTES:
+            raise UploadError(f"文件不能超过 {UPLOAD_MAX_BYTES // (1024 * 1024)}MB", 413)
+        self.sweep()
+        os.makedirs(self.directory, exist_ok=True)
+        upload_id = str(uuid.uuid4())
+        with open(self._path(upload_id, 'part'), 'wb'):
+            pass
+        with open(self._path(upload_id, 'json'), 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'content_type': content_type, 'created': time.time()}, f)
+        return self.status(upload_id)
+
+    def write_chunk(self, upload_id, offset, data):
+        """
+        写入从 offset 开始的分块，返回新的状态
+
+        offset 小于已接收字节数时视为重发的分块，直接确认；
+        大于已接收字节数时说明中间缺了分块，抛出带当前偏移量的 UploadError，客户端从该位置续传。
+        """
+        if len(data) > UPLOAD_MAX_CHUNK:
+            raise UploadError(f"分块不能超过 {UPLOAD_MAX_CHUNK} 字节", 413)
+        with self._session_lock(upload_id):
+            state = self.status(upload_id)
+            if state['complete']:
+                return state
+            received = state['offset']
+            if offset > received:
+                raise UploadError("分块不连续，请从已接收的位置继续上传", 409, received)
+            data = data[received - offset:]  # 去掉已经接收过的部分
+            if received + len(data) > state['size']:
+                raise UploadError("数据超过了声明的文件大小", 413, received)
+            if data:
+                with open(self._path(upload_id, 'part'), 'ab') as f:
+                    f.write(data)
+            state['offset'] = received + len(data)
+            return state
+
+    def finalize(self, upload_id):
+        """完成上传，所有数据都已接收后才能完成"""
+        with self._session_lock(upload_id):
+            state = self.status(upload_id)
+            if state['complete']:
+                return state
+            if state['offset'] != state['size']:
+                raise UploadError("上传尚未完成", 409, state['offset'])
+            os.replace(self._path(upload_id, 'part'), self._path(upload_id, 'done'))
+            state['complete'] = True
+            return state
+
+    def cancel(self, upload_id):
+        """取消上传并删除已接收的数据"""
+        with self._session_lock(upload_id):
+            self._remove(upload_id)
+
+    def claim(self, upload_id, directory, filename=None):
+        """把已完成的上传移动到目标目录（一个上传只能使用一次），返回文件名"""
+        with self._session_lock(upload_id):
+            if not self.status(upload_id)['complete']:
+                raise UploadError("上传尚未完成", 409)
+            os.makedirs(directory, exist_ok=True)
+            filename = filename or f"{uuid.uuid4()}.jpg"
+            try:
+                shutil.move(self._path(upload_id, 'done'), os.path.join(directory, filename))
+            except FileNotFoundError:  # 已被其他进程使用
+                raise UploadError("上传会话不存在或已过期", 404)
+            self._remove(upload_id)
+            return filename
+
+    def restore(self, upload_id, path, meta):
+        """撤销 claim：把已移动的文件放回暂存目录，恢复为已完成的上传"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(upload_id, 'json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        with self._session_lock(upload_id):
+            shutil.move(path, self._path(upload_id, 'done'))
+
+
+# 全局上传管理器
+upload_manager = UploadManager()
+
+
+def claim_uploads(upload_ids, directory):
+    """
+    把一组已完成的上传移动到目标目录，返回文件名列表
+
+    先检查全部上传再移动；移动过程中某个上传失败时，已经移动的文件放回暂存目录，要么全部使用要么都不使用。
+    """
+    if not isinstance(upload_ids, list) or not all(isinstance(i, str) for i in upload_ids):
+        raise UploadError("upload_ids 必须是上传ID列表")
+    metas = {}
+    for upload_id in upload_ids:
+        if not upload_manager.status(upload_id)['complete']:
+            raise UploadError("上传尚未完成", 409)
+        metas[upload_id] = upload_manager._meta(upload_id)
+    filenames = []
+    try:
+        for upload_id in upload_ids:
+            filenames.append(upload_manager.claim(upload_id, directory))
+    except Exception:
+        for upload_id, filename in zip(upload_ids, filenames):
+            try:
+                upload_manager.restore(upload_id, os.path.join(directory, filename), metas[upload_id])
+            except Exception as e:
+                print(f"恢复上传 {upload_id} 失败: {str(e)}")
+        raise
+    return filenames
+
+
+def upload_error_response(error):
+    """上传错误的响应（分块不连续等情况附带服务器已接收的偏移量）"""
+    body = {"error": str(error)}
+    if error.offset is not None:
+        body["offset"] = error.offset
+    return jsonify(body), error.status
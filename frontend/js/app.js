@@ -139,7 +139,8 @@ new Vue({
             // 先从本地获取菜品数据
             if (this.$refs.menuComponent && this.$refs.menuComponent.dishes) {
                 const dish = this.$refs.menuComponent.dishes.find(d => d.id == dishId);
-                if (dish) {
+                // 菜单中只有摘要信息，缺少做法时从API获取完整详情
+                if (dish && dish.steps) {
                     // 确保菜品对象有reviews属性，防止显示错误
                     if (!dish.reviews) {
                         dish.reviews = [];
@@ -9,7 +9,9 @@ Vue.component('cart-component', {
         return {
             note: '',
             submitting: false,
-            collapseNote: true
+            collapseNote: true,
+            // 当前订单的幂等键，重试同一份订单时复用
+            idempotency: null
         };
     },
     computed: {
@@ -196,12 +198,24 @@ Vue.component('cart-component', {
                 note: this.note
             };
             
+            // 同一份订单重试时复用幂等键，避免网络不稳定时重复下单
+            const payload = JSON.stringify(orderData);
+            if (!this.idempotency || this.idempotency.payload !== payload) {
+                this.idempotency = {
+                    payload,
+                    key: `${Date.now()}-${Math.random().toString(36).slice(2)}`
+                };
+            }
+            
             // 发送创建订单请求
-            axios.post('/api/orders/', orderData)
+            axios.post('/api/orders/', orderData, {
+                headers: { 'Idempotency-Key': this.idempotency.key }
+            })
                 .then(response => {
                     // 订单创建成功
                     this.$emit('checkout', response.data);
                     this.note = '';
+                    this.idempotency = null;
                 })
                 .catch(error => {
                     console.error('下单失败:', error);
@@ -337,12 +337,13 @@ Vue.component('menu-component', {
             this.error = null;
             console.log("开始获取菜品数据");
             
-            let url = '/api/dishes';
+            // 菜单只需要摘要字段，完整做法和食材在详情页再获取
+            let url = '/api/dishes/?view=summary';
             
             // 如果有activeCategory，添加分类过滤参数
             if (this.activeCategory) {
                 console.log("根据分类过滤菜品:", this.activeCategory.id);
-                url = `/api/dishes?category=${this.activeCategory.id}`;
+                url = `/api/dishes/?view=summary&category=${this.activeCategory.id}`;
             }
             
             console.log("请求URL:", url);
@@ -15,27 +15,41 @@ Vue.component('order-detail', {
             isDeleting: false,
             activeViewerType: null, // 'standard', 'qrcode', 'review'
             reviews: {}, // 存储每个菜品的评价
+            dishInfo: {}, // 订单中各菜品的详情（批量获取）
             reviewsLoading: false, // 评价数据加载状态
             dishInfoLoading: false, // 菜品信息加载状态
+            qrCodeFailed: false, // 订单二维码加载失败时退回静态收款码
         };
     },
     computed: {
         statusOptions() {
+            // 与后端的状态转换规则保持一致，只显示当前状态允许变更到的状态
+            const transitions = {
+                pending: ['cooking', 'ready', 'completed', 'cancelled'],
+                cooking: ['pending', 'ready', 'completed', 'cancelled'],
+                ready: ['cooking', 'completed', 'cancelled'],
+                completed: [],
+                cancelled: []
+            };
+            const allowed = transitions[this.order.status];
             return [
                 { value: 'pending', text: '待处理' },
                 { value: 'cooking', text: '制作中' },
                 { value: 'ready', text: '可取餐' },
                 { value: 'completed', text: '已完成' },
                 { value: 'cancelled', text: '已取消' }
-            ];
+            ].filter(option => !allowed || allowed.includes(option.value));
         },
         canReview() {
             // 只有已完成的订单可以评价
             return this.order.status === 'completed';
         },
-        // 使用静态收款码图片
+        // 订单支付二维码（包含订单号和金额），加载失败时使用静态收款码图片
         qrCodeUrl() {
-            return "/static/images/微信收款码.jpg";
+            if (this.qrCodeFailed) {
+                return "/static/images/微信收款码.jpg";
+            }
+            return `/api/orders/${this.order.id}/qr`;
         }
     },
     mounted() {
@@ -116,7 +130,7 @@ Vue.component('order-detail', {
                 <div class="card-body text-center">
                     <h5 class="card-title mb-3"><i class="bi bi-qr-code pulsing-icon"></i> 扫码支付</h5>
                     <div class="qr-code-container" style="cursor: pointer;">
-                        <img :src="qrCodeUrl" alt="微信支付" class="interactive-image" data-action="show-qrcode">
+                        <img :src="qrCodeUrl" alt="微信支付" class="interactive-image" data-action="show-qrcode" @error="qrCodeFailed = true">
                         <div class="mt-2 text-muted small">
                             <i class="bi bi-zoom-in me-1"></i>点击二维码放大
                         </div>
@@ -307,7 +321,7 @@ Vue.component('order-detail', {
                 })
                 .catch(error => {
                     console.error('更新状态失败:', error);
-                    this.showNotification('更新状态失败，请稍后再试', 'error');
+                    this.showNotification(error.response?.data?.error || '更新状态失败，请稍后再试', 'error');
                 })
                 .finally(() => {
                     this.updatingStatus = false;
@@ -315,6 +329,12 @@ Vue.component('order-detail', {
                 });
         },
         addReview(dishId) {
+            // 已批量获取过菜品信息时直接使用
+            if (this.dishInfo[dishId]) {
+                this.$emit('add-review', { ...this.dishInfo[dishId], order_id: this.order.id });
+                return;
+            }
+            
             this.dishInfoLoading = true;
             
             // 获取菜品信息
@@ -354,25 +374,17 @@ Vue.component('order-detail', {
         fetchAllReviews() {
             this.reviewsLoading = true;
             
-            // 获取当前订单的所有评价
-            axios.get(`/api/reviews/order/${this.order.id}`)
+            // 一次请求获取订单中所有菜品的详情和本订单的评价
+            const ids = [...new Set(this.order.items.map(item => item.dish_id))];
+            axios.post('/api/dishes/batch', { ids: ids, order_id: this.order.id })
                 .then(response => {
-                    const orderReviews = response.data;
-                    
-                    // 为每个菜品查找评价
-                    this.order.items.forEach(item => {
-                        const dishReviews = orderReviews.filter(
-                            review => review.dish_id === item.dish_id
-                        );
+                    response.data.dishes.forEach(dish => {
+                        const { order_reviews: dishReviews, ...info } = dish;
+                        this.$set(this.dishInfo, dish.id, info);
                         
+                        // 评价已按时间倒序排列，存储最新的一条
                         if (dishReviews.length > 0) {
-                            // 获取最新的评价（假设已按时间排序）
-                            const latestReview = dishReviews.sort((a, b) => 
-                                new Date(b.timestamp) - new Date(a.timestamp)
-                            )[0];
-                            
-                            // 存储到本地的评价对象中
-                            this.$set(this.reviews, item.dish_id, latestReview);
+                            this.$set(this.reviews, dish.id, dishReviews[0]);
                         }
                     });
                 })
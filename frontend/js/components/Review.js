@@ -13,7 +13,11 @@ Vue.component('review-component', {
             imagePreview: [],
             submitting: false,
             error: '',
-            previewImage: null
+            previewImage: null,
+            // 当前评价的幂等键，重试同一条评价时复用
+            idempotency: null,
+            // 已上传的图片: DataURL -> 上传ID，重试提交时不重复上传
+            uploadIds: {}
         };
     },
     template: `
@@ -188,18 +192,40 @@ Vue.component('review-component', {
             this.submitting = true;
             this.error = '';
             
-            // 准备评价数据
-            const reviewData = {
-                dish_id: this.dish.id,
-                order_id: this.dish.order_id,
-                rating: this.rating,
-                comment: this.comment,
-                images: this.images
-            };
-            
-            // 发送添加评价请求
-            axios.post('/api/reviews/', reviewData)
+            // 先分块上传图片（支持断点续传），评价中只引用上传ID
+            Promise.all(this.images.map(image => this.uploadIds[image]
+                ? this.uploadIds[image]
+                : uploadImageResumable(image).then(uploadId => {
+                    this.uploadIds[image] = uploadId;
+                    return uploadId;
+                })))
+                .then(uploadIds => {
+                    // 准备评价数据
+                    const reviewData = {
+                        dish_id: this.dish.id,
+                        order_id: this.dish.order_id,
+                        rating: this.rating,
+                        comment: this.comment,
+                        upload_ids: uploadIds
+                    };
+                    
+                    // 同一条评价重试时复用幂等键，避免重复提交
+                    const payload = JSON.stringify(reviewData);
+                    if (!this.idempotency || this.idempotency.payload !== payload) {
+                        this.idempotency = {
+                            payload,
+                            key: `${Date.now()}-${Math.random().toString(36).slice(2)}`
+                        };
+                    }
+                    
+                    // 发送添加评价请求
+                    return axios.post('/api/reviews/', reviewData, {
+                        headers: { 'Idempotency-Key': this.idempotency.key }
+                    });
+                })
                 .then(response => {
+                    this.idempotency = null;
+                    this.uploadIds = {};
                     // 提示成功并返回
                     this.$emit('save-review', response.data);
                 })
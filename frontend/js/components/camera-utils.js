@@ -74,4 +74,66 @@ Vue.component('ios-camera', {
             this.photoData = '';
         }
     }
-});
\ No newline at end of file
+});
+
+// 服务器繁忙（429 限流或 503 图片队列已满）时建议等待的毫秒数，其他错误返回 null
+function retryAfterDelay(error) {
+    const response = error && error.response;
+    if (!response || (response.status !== 429 && response.status !== 503)) {
+        return null;
+    }
+    const seconds = parseFloat(response.headers && response.headers['retry-after']);
+    return (isNaN(seconds) ? 1 : seconds) * 1000;
+}
+
+// 发送请求，服务器繁忙时按 Retry-After 等待后重试，最多重试 maxRetries 次
+function requestWithRetryAfter(send, maxRetries = 5) {
+    return send().catch(error => {
+        const delay = retryAfterDelay(error);
+        if (delay === null || maxRetries <= 0) {
+            throw error;
+        }
+        return new Promise(resolve => setTimeout(resolve, delay))
+            .then(() => requestWithRetryAfter(send, maxRetries - 1));
+    });
+}
+
+// 分块上传图片（DataURL），网络中断时从服务器已确认的位置续传，成功后返回上传ID
+// 添加菜品和评价时用 upload_id / upload_ids 引用上传的图片，不需要再内联base64数据
+// 服务器返回429/503时按 Retry-After 等待后重试
+function uploadImageResumable(dataUrl, maxRetries = 5) {
+    return fetch(dataUrl)
+        .then(response => response.blob())
+        .then(blob => requestWithRetryAfter(() => axios.post('/api/uploads', { size: blob.size, content_type: blob.type }), maxRetries)
+            .then(response => {
+                const uploadId = response.data.upload_id;
+                const chunkSize = response.data.chunk_size;
+                let retries = 0;
+                
+                const sendFrom = offset => {
+                    if (offset >= blob.size) {
+                        return requestWithRetryAfter(() => axios.post(`/api/uploads/${uploadId}/finalize`), maxRetries)
+                            .then(() => uploadId);
+                    }
+                    return axios.put(`/api/uploads/${uploadId}?offset=${offset}`, blob.slice(offset, offset + chunkSize), {
+                        headers: { 'Content-Type': 'application/octet-stream' }
+                    })
+                        .then(response => {
+                            retries = 0;
+                            return sendFrom(response.data.offset);
+                        })
+                        .catch(error => {
+                            if (++retries > maxRetries) {
+                                throw error;
+                            }
+                            // 稍等后（服务器繁忙时按 Retry-After）向服务器查询已接收的位置并继续
+                            const delay = retryAfterDelay(error);
+                            return new Promise(resolve => setTimeout(resolve, delay !== null ? delay : 1000 * retries))
+                                .then(() => axios.get(`/api/uploads/${uploadId}`))
+                                .then(response => response.data.offset, () => offset)
+                                .then(sendFrom);
+                        });
+                };
+                return sendFrom(0);
+            }));
+}